@@ -0,0 +1,118 @@
+"""Cold-start budget: import cost and time to the first page of a fresh process.
+
+    python -m benchmarks.cold_start [--import-budget-ms 300] [--first-page-budget-ms 3000]
+
+Runs the app twice in fresh interpreters under `python -X importtime`, with the same stand-ins as
+`benchmarks.run`. With the warm-up thread off, every import after the harness is on the first page's
+critical path; that import time is held to `--import-budget-ms`, and none of FORBIDDEN may be among
+them. With the warm-up on, the home and login pages must render within `--first-page-budget-ms`.
+
+Exits with status 1 when a budget is exceeded, so it can gate a CI job.
+"""
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MARKER = "--- cold start ---"
+# Only the chat and admin pages need these; the warm-up thread loads them
+FORBIDDEN = ("google.genai", "pyarrow", "pandas")
+IMPORT_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+def child(warmup: bool):
+    from streamlit.testing.v1 import AppTest
+    from benchmarks.run import MAIN_SCRIPT, bench_secrets, build_parser, prepare_process
+
+    secrets = bench_secrets(build_parser().parse_args([]), "cold_start")
+    secrets["WARMUP"] = warmup
+    prepare_process(secrets, in_memory=True)
+
+    print(MARKER, file=sys.stderr, flush=True)
+    started = time.perf_counter()
+    at = AppTest.from_file(MAIN_SCRIPT, default_timeout=60).run()
+    home_ms = (time.perf_counter() - started) * 1000
+    at.switch_page("src/pages/auth/login.py").run()
+    login_ms = (time.perf_counter() - started) * 1000
+    print(MARKER, file=sys.stderr, flush=True)
+
+    result = {"home_ms": home_ms, "login_ms": login_ms, "errors": [str(e.value) for e in at.exception]}
+    if warmup:
+        from src.config.warmup import warmup as state
+        state.ready.wait(60)
+        result["warmup"] = state.status()
+    print(json.dumps(result))
+
+
+def parse_imports(stderr: str) -> list[dict]:
+    """The importtime entries between the two markers, i.e. those made while the pages ran."""
+    _, _, window = stderr.partition(MARKER)
+    window, _, _ = window.partition(MARKER)
+    imports = []
+    for line in window.splitlines():
+        match = IMPORT_LINE.match(line)
+        if match:
+            imports.append({"module": match[4], "self_us": int(match[1]), "cumulative_us": int(match[2]),
+                            "top_level": len(match[3]) == 1})
+    return imports
+
+
+def measure(warmup: bool) -> tuple[dict, list[dict]]:
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-m", "benchmarks.cold_start", "--child",
+         "--warmup" if warmup else "--no-warmup"],
+        cwd=ROOT, capture_output=True, text=True
+    )
+    if proc.returncode:
+        sys.exit(f"cold start run failed:\n{proc.stderr[-4000:]}")
+    return json.loads(proc.stdout.strip().splitlines()[-1]), parse_imports(proc.stderr)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check cold-start import time and first page latency")
+    parser.add_argument("--import-budget-ms", type=float, default=300)
+    parser.add_argument("--first-page-budget-ms", type=float, default=3000)
+    parser.add_argument("--top", type=int, default=15, help="Heaviest imports to list")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--warmup", action=argparse.BooleanOptionalAction, default=True, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        child(args.warmup)
+        return
+
+    cold, imports = measure(warmup=False)
+    import_ms = sum(entry["self_us"] for entry in imports) / 1000
+    forbidden = sorted({entry["module"] for entry in imports if entry["module"].startswith(FORBIDDEN)})
+    print(f"critical-path imports: {len(imports)} modules, {import_ms:.0f} ms (budget {args.import_budget_ms:.0f} ms)")
+    for entry in sorted((e for e in imports if e["top_level"]), key=lambda e: -e["cumulative_us"])[:args.top]:
+        print(f"  {entry['cumulative_us'] / 1000:>8.1f} ms  {entry['module']}")
+    print(f"without warm-up: home {cold['home_ms']:.0f} ms, login {cold['login_ms']:.0f} ms")
+
+    warm, _ = measure(warmup=True)
+    print(f"with warm-up:    home {warm['home_ms']:.0f} ms, login {warm['login_ms']:.0f} ms "
+          f"(budget {args.first_page_budget_ms:.0f} ms)")
+    for step, seconds in warm.get("warmup", {}).get("steps", {}).items():
+        print(f"  warm-up {step:<12}{seconds * 1000:>8.0f} ms")
+
+    failures = []
+    if import_ms > args.import_budget_ms:
+        failures.append(f"critical-path imports took {import_ms:.0f} ms")
+    if forbidden:
+        failures.append(f"first page imported {', '.join(forbidden)}")
+    if warm["login_ms"] > args.first_page_budget_ms:
+        failures.append(f"first pages took {warm['login_ms']:.0f} ms")
+    for errors in (cold["errors"], warm["errors"], warm.get("warmup", {}).get("errors")):
+        if errors:
+            failures.append(f"errors: {errors}")
+    for failure in failures:
+        print(f"FAILED: {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""Compares two benchmark result files and flags latency regressions.
+
+    python -m benchmarks.compare benchmarks/baselines/main.json benchmarks/results/latest.json [--threshold 0.1]
+
+Exits with status 1 when any metric regressed, so it can gate a CI job.
+"""
+import argparse
+import json
+import sys
+
+QUANTILES = ("p50", "p95", "p99")
+# Differences below this many milliseconds are treated as noise, whatever the ratio
+MIN_DELTA_MS = 5.0
+
+
+def load_results(path: str) -> dict:
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def compare(baseline: dict, current: dict, threshold: float = 0.10, min_delta_ms: float = MIN_DELTA_MS) -> list[dict]:
+    rows = []
+    for name, base in baseline["metrics"].items():
+        now = current["metrics"].get(name)
+        if not now or not base["count"] or not now["count"]:
+            continue
+        for quantile in QUANTILES:
+            before, after = base[quantile], now[quantile]
+            change = (after - before) / before if before else 0.0
+            rows.append({
+                "metric": name,
+                "quantile": quantile,
+                "baseline_ms": before,
+                "current_ms": after,
+                "change": change,
+                "regressed": change > threshold and after - before > min_delta_ms,
+            })
+        if now["errors"] > base["errors"]:
+            rows.append({"metric": name, "quantile": "errors", "baseline_ms": base["errors"],
+                         "current_ms": now["errors"], "change": 0.0, "regressed": True})
+    return rows
+
+
+def print_report(rows: list[dict], baseline: dict, current: dict):
+    print(f"baseline {baseline['meta'].get('commit')}  vs  current {current['meta'].get('commit')}")
+    print(f"{'metric':<16}{'stat':<8}{'baseline':>12}{'current':>12}{'change':>10}")
+    for row in rows:
+        flag = "  REGRESSED" if row["regressed"] else ""
+        print(f"{row['metric']:<16}{row['quantile']:<8}{row['baseline_ms']:>12.1f}{row['current_ms']:>12.1f}"
+              f"{row['change']:>+10.1%}{flag}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Flag regressions between two benchmark runs")
+    parser.add_argument("baseline")
+    parser.add_argument("current")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Allowed relative slowdown per quantile")
+    args = parser.parse_args(argv)
+
+    baseline, current = load_results(args.baseline), load_results(args.current)
+    rows = compare(baseline, current, args.threshold)
+    print_report(rows, baseline, current)
+    sys.exit(1 if any(row["regressed"] for row in rows) else 0)
+
+
+if __name__ == "__main__":
+    main()
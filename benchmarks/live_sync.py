@@ -0,0 +1,144 @@
+"""End-to-end check of the change feed against a local single-node replica set (change streams need one).
+
+    mongod --replSet rs0 --dbpath /tmp/rs0 --port 27017 &
+    mongosh --quiet --eval 'rs.initiate()'
+    python -m benchmarks.live_sync --mongo "mongodb://localhost:27017/?replicaSet=rs0"
+
+Writes a chat and a turn through the app's own repositories and writer and waits for a subscriber to
+see both; checks that a new chat's greeting and first prompt land in its history once; then stops the
+feed, writes another turn and checks that a new feed resumes from the stored token and delivers it. Prints the delivery latencies and exits with status 1 on any failure.
+"""
+import argparse
+import sys
+import time
+import uuid
+from datetime import datetime, UTC
+from types import SimpleNamespace
+from benchmarks.run import bench_secrets, prepare_process
+
+
+def wait_for(subscription, predicate, timeout: float):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        events, _ = subscription.drain()
+        for event in events:
+            if predicate(event):
+                return event
+        time.sleep(0.02)
+    return None
+
+
+def check(name: str, subscription, predicate, started: float, timeout: float) -> bool:
+    event = wait_for(subscription, predicate, timeout)
+    if event is None:
+        print(f"{name:<18}MISSING after {timeout:.0f}s")
+        return False
+    print(f"{name:<18}{(time.perf_counter() - started) * 1000:>8.1f} ms")
+    return True
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check change-feed delivery and resume on a replica set")
+    parser.add_argument("--mongo", required=True, help="Replica-set URI, e.g. mongodb://localhost:27017/?replicaSet=rs0")
+    parser.add_argument("--buckets", action="store_true", help='Write turns with MESSAGE_STORAGE = "buckets"')
+    parser.add_argument("--timeout", type=float, default=10, help="Seconds to wait for each change")
+    parser.add_argument("--keep-db", action="store_true")
+    args = parser.parse_args(argv)
+
+    db_name = f"live_{uuid.uuid4().hex[:8]}"
+    defaults = SimpleNamespace(mongo=args.mongo, bcrypt_rounds=4, bcrypt_workers=1, reply_chars=17, chunk_size=16,
+                               first_token_latency=0, chunk_delay=0, error_rate=0, model_concurrency=1,
+                               requests_per_minute=100_000)
+    secrets = bench_secrets(defaults, db_name)
+    secrets["MESSAGE_STORAGE"] = "buckets" if args.buckets else "documents"
+    prepare_process(secrets, in_memory=False)
+
+    from bson import ObjectId
+    from src.config.db import get_db
+    from src.repos.change_feed import ChangeFeed
+    from src.repos.chat_repo import ChatRepository
+    from src.repos.turn_writer import TurnWriter
+    from src.utils.chat_history import ChatHistory
+    from src.utils.context_window import ContextWindow, message_cursor
+    from src.utils.event_bus import EventBus
+
+    db = get_db()
+    bus = EventBus()
+    user_id = ObjectId()
+    subscription = bus.subscribe(user_id)
+    write = TurnWriter(db, buckets=args.buckets)
+
+    def message_doc(chat_id, content, role="user"):
+        return {"_id": ObjectId(), "chat_id": chat_id, "user_id": user_id, "created_at": datetime.now(UTC),
+                "message": {"role": role, "content": content}}
+
+    def turn(chat_id, content):
+        doc = message_doc(chat_id, content)
+        write([doc])
+        return str(doc["_id"])
+
+    def new_chat_check() -> bool:
+        # As the chat page does it: the greeting is in history before the chat exists and is saved with the
+        # first prompt under the same id, so applying their changes must not append either a second time
+        chat_id = ObjectId(ChatRepository().create_chat({"user_id": user_id, "title": "New chat check",
+                                                         "created_at": datetime.now(UTC),
+                                                         "updated_at": datetime.now(UTC)}))
+        greeting, prompt = message_doc(chat_id, "Hi!", role="model"), message_doc(chat_id, "first prompt")
+        history = ChatHistory(ContextWindow())
+        for doc in (greeting, prompt):
+            history.append(doc["message"], message_cursor(doc), str(doc["_id"]))
+
+        started = time.perf_counter()
+        write([greeting, prompt])
+        delivered = set()
+        deadline = time.monotonic() + args.timeout
+        while str(prompt["_id"]) not in delivered and time.monotonic() < deadline:
+            events, _ = subscription.drain()
+            for event in events:
+                if event["type"] == "message" and event["chat_id"] == str(chat_id):
+                    history.append_doc(event["doc"])
+                    delivered.add(str(event["doc"]["_id"]))
+            time.sleep(0.02)
+
+        if str(prompt["_id"]) not in delivered:
+            print(f"{'new chat':<18}MISSING after {args.timeout:.0f}s")
+            return False
+        if len(history.ids) != 2:
+            print(f"{'new chat':<18}FAILED: {len(history.ids)} messages in history, expected 2")
+            return False
+        print(f"{'new chat':<18}{(time.perf_counter() - started) * 1000:>8.1f} ms")
+        return True
+
+    ok = True
+    feed = ChangeFeed(db, bus, db_name).start()
+    try:
+        if not feed.ready.wait(args.timeout):
+            print(f"Error: change stream did not open ({feed.error or 'timed out'})")
+            sys.exit(1)
+
+        started = time.perf_counter()
+        chat_id = ChatRepository().create_chat({"user_id": user_id, "title": "Live sync check",
+                                                "created_at": datetime.now(UTC), "updated_at": datetime.now(UTC)})
+        ok &= check("chat", subscription, lambda event: event["type"] == "chat" and event["chat_id"] == chat_id,
+                    started, args.timeout)
+
+        started = time.perf_counter()
+        ok &= check("message", subscription, is_message(turn(ObjectId(chat_id), "first")), started, args.timeout)
+
+        ok &= new_chat_check()
+
+        feed.stop()
+        missed = turn(ObjectId(chat_id), "written while stopped")
+        started = time.perf_counter()
+        feed = ChangeFeed(db, bus, db_name).start()
+        ok &= check("resumed message", subscription, is_message(missed), started, args.timeout)
+    finally:
+        feed.stop()
+        if not args.keep_db:
+            db.client.drop_database(db_name)
+
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,307 @@
+"""Load test for the chat pipeline, driving the real pages through Streamlit's AppTest harness.
+
+    python -m benchmarks.run --users 8 --turns 3
+    python -m benchmarks.run --mongo mongodb://localhost:27017 --users 32 --save-baseline main
+    python -m benchmarks.run --users 8 --compare benchmarks/baselines/main.json
+
+Each virtual user signs up, logs in, renders the chat page, sends `--turns` prompts and reloads the chat
+from the sidebar, all in one process like sessions on a single Streamlit server. Mongo is an in-memory
+stand-in unless `--mongo` points at a mongod; Gemini is always the local fake client.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from datetime import datetime, UTC
+from unittest.mock import MagicMock
+import streamlit as st
+from streamlit.runtime import Runtime
+from streamlit.runtime.caching.storage.dummy_cache_storage import MemoryCacheStorageManager
+from streamlit.runtime.media_file_manager import MediaFileManager
+from streamlit.runtime.memory_media_file_storage import MemoryMediaFileStorage
+from streamlit.runtime.secrets import Secrets
+from streamlit.testing.v1 import AppTest, app_test
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MAIN_SCRIPT = os.path.join(ROOT, "main.py")
+RESULTS_DIR = os.path.join(ROOT, "benchmarks", "results")
+BASELINES_DIR = os.path.join(ROOT, "benchmarks", "baselines")
+METRICS = ("signup", "login", "sidebar_render", "turn", "chat_load")
+PASSWORD = "benchmark-password"
+
+
+def bench_secrets(args, db_name: str) -> dict:
+    in_memory = args.mongo == "memory"
+    return {
+        "SECRET_KEY": uuid.uuid4().hex,
+        "COOKIE_PREFIX": "bench",
+        "COOKIE_BACKEND": "memory",
+        "API_KEY": "unused",
+        "MONGO_URI": "mongodb://standin" if in_memory else args.mongo,
+        "DB_NAME": db_name,
+        # mongomock has no $text support
+        "SEARCH_BACKEND": "inverted" if in_memory else "text",
+        "BCRYPT_ROUNDS": args.bcrypt_rounds,
+        "BCRYPT_WORKERS": args.bcrypt_workers,
+        "GEMINI_FAKE": True,
+        "GEMINI_FAKE_OPTIONS": {
+            "reply": "Benchmark reply. " * max(1, args.reply_chars // 17),
+            "chunk_size": args.chunk_size,
+            "first_token_latency": args.first_token_latency,
+            "chunk_delay": args.chunk_delay,
+            "error_rate": args.error_rate,
+            "seed": 7,
+        },
+        "GEMINI_MAX_CONCURRENCY": args.model_concurrency,
+        "GEMINI_REQUESTS_PER_MINUTE": args.requests_per_minute,
+    }
+
+
+def prepare_process(secrets: dict, in_memory: bool):
+    """Everything here must happen before the first `src` import, which reads secrets and binds clients."""
+    if in_memory:
+        from benchmarks.standins import install_mongo_standin
+        install_mongo_standin()
+
+    loaded = Secrets()
+    loaded._secrets = secrets
+    st.secrets = loaded
+
+    # AppTest installs a fresh mock Runtime per run and clears it afterwards, which breaks runs that
+    # overlap in one process. Its writes go to a subclass; one shared mock stays on Runtime itself.
+    runtime = MagicMock(spec=Runtime)
+    runtime.media_file_mgr = MediaFileManager(MemoryMediaFileStorage("/mock/media"))
+    runtime.cache_storage_manager = MemoryCacheStorageManager()
+    Runtime._instance = runtime
+    app_test.Runtime = type("PinnedRuntime", (Runtime,), {})
+
+
+def seed_history(email: str, chats: int, messages: int):
+    from bson import ObjectId
+    from src.config.db import get_db
+    from src.repos.chat_cache import invalidate_user_chats
+
+    db = get_db()
+    user_id = db.users.find_one({"email": email})["_id"]
+    now = datetime.now(UTC)
+    for c in range(chats):
+        chat_id = ObjectId()
+        db.chats.insert_one({"_id": chat_id, "user_id": user_id, "title": f"Seeded chat {c}",
+                             "created_at": now, "updated_at": now})
+        if messages:
+            db.messages.insert_many([{
+                "chat_id": chat_id, "user_id": user_id, "created_at": now, "updated_at": now,
+                "message": {"role": "user" if m % 2 else "model", "content": f"Seeded message {m} about topic {c}"}
+            } for m in range(messages)])
+    # Signing up already rendered (and cached) the empty sidebar
+    invalidate_user_chats(user_id)
+
+
+class Recorder:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples = {name: [] for name in METRICS}
+        self.errors = {name: 0 for name in METRICS}
+
+    def timed(self, name: str, at: AppTest, check=None):
+        started = time.perf_counter()
+        at.run()
+        elapsed = (time.perf_counter() - started) * 1000
+        ok = not at.exception and (check is None or check(at))
+        with self._lock:
+            if ok:
+                self.samples[name].append(elapsed)
+            else:
+                self.errors[name] += 1
+        return ok
+
+    def summary(self) -> dict:
+        metrics = {}
+        for name, samples in self.samples.items():
+            samples = sorted(samples)
+            if len(samples) > 1:
+                cuts = statistics.quantiles(samples, n=100, method="inclusive")
+                p50, p95, p99 = cuts[49], cuts[94], cuts[98]
+            else:
+                p50 = p95 = p99 = samples[0] if samples else 0.0
+            metrics[name] = {
+                "count": len(samples), "errors": self.errors[name],
+                "mean": statistics.fmean(samples) if samples else 0.0,
+                "p50": p50, "p95": p95, "p99": p99, "max": samples[-1] if samples else 0.0,
+            }
+        return metrics
+
+
+def new_session(timeout: float) -> AppTest:
+    return AppTest.from_file(MAIN_SCRIPT, default_timeout=timeout)
+
+
+def has_reply(at: AppTest) -> bool:
+    return bool(at.chat_message) and at.chat_message[-1].markdown[0].value.startswith("Benchmark reply.")
+
+
+def virtual_user(n: int, args, recorder: Recorder):
+    email = f"bench-{n}-{uuid.uuid4().hex[:8]}@example.com"
+
+    at = new_session(args.timeout)
+    at.switch_page("src/pages/auth/sign_up.py").run()
+    for field, value in zip(at.text_input, ("Bench User", email, PASSWORD, PASSWORD)):
+        field.set_value(value)
+    at.button[0].click()
+    if not recorder.timed("signup", at):
+        return
+
+    if args.seed_chats:
+        seed_history(email, args.seed_chats, args.seed_messages)
+
+    # A fresh session, as a returning user would have
+    at = new_session(args.timeout)
+    at.switch_page("src/pages/auth/login.py").run()
+    at.text_input[0].set_value(email)
+    at.text_input[1].set_value(PASSWORD)
+    at.button[0].click()
+    if not recorder.timed("login", at, lambda at: at.session_state["session_id"] is not None):
+        return
+
+    # The login run already landed on the chat page; AppTest only follows switch_page when told to
+    at.switch_page("src/pages/ajax_chat.py")
+    if not recorder.timed("sidebar_render", at, lambda at: len(at.chat_input) == 1):
+        return
+
+    for turn in range(args.turns):
+        time.sleep(args.think_time)
+        at.chat_input[0].set_value(f"Question {turn} from user {n}: how does keyset pagination work?")
+        recorder.timed("turn", at, has_reply)
+
+    at.run()
+    load_buttons = [button for button in at.sidebar.button if (button.key or "").startswith("load_")]
+    if load_buttons:
+        load_buttons[0].click()
+        recorder.timed("chat_load", at, lambda at: len(at.chat_message) > 0)
+
+
+def fragment_summary() -> dict:
+    """Per-fragment render cost from the app's own `fragment_seconds` spans (bucket estimates, in ms).
+
+    AppTest always reruns the whole script, so this is what a browser session pays when a prompt or a
+    sidebar click reruns only that fragment.
+    """
+    from src.utils.instrumentation import registry
+    fragments = {}
+    for h in registry.snapshot()["histograms"]:
+        if h["name"] == "fragment_seconds" and h["labels"].get("status") == "ok":
+            fragments[h["labels"]["fragment"]] = {
+                "count": h["count"], "mean": h["sum"] / h["count"] * 1000 if h["count"] else 0.0,
+                **{q: (h[q] or 0.0) * 1000 for q in ("p50", "p95", "p99")},
+            }
+    return fragments
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def write_json(path: str, data: dict):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2)
+    print(f"wrote {path}")
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Load-test the chat pages with local stand-ins")
+    parser.add_argument("--users", type=int, default=8, help="Concurrent virtual users")
+    parser.add_argument("--turns", type=int, default=3, help="Prompts each user sends")
+    parser.add_argument("--think-time", type=float, default=0.0, help="Seconds between a user's prompts")
+    parser.add_argument("--seed-chats", type=int, default=20, help="Existing chats per user")
+    parser.add_argument("--seed-messages", type=int, default=40, help="Messages per seeded chat")
+    parser.add_argument("--mongo", default="memory", help='"memory" or a mongod URI')
+    parser.add_argument("--keep-db", action="store_true", help="Keep the mongod benchmark database")
+    parser.add_argument("--chunk-size", type=int, default=16, help="Fake Gemini characters per chunk")
+    parser.add_argument("--reply-chars", type=int, default=600, help="Fake Gemini reply length")
+    parser.add_argument("--first-token-latency", type=float, default=0.3)
+    parser.add_argument("--chunk-delay", type=float, default=0.02)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Injected 429/503 rate")
+    parser.add_argument("--model-concurrency", type=int, default=8)
+    parser.add_argument("--requests-per-minute", type=int, default=100_000)
+    parser.add_argument("--bcrypt-rounds", type=int, default=10)
+    parser.add_argument("--bcrypt-workers", type=int, default=os.cpu_count() or 2)
+    parser.add_argument("--timeout", type=float, default=120, help="Seconds allowed per page run")
+    parser.add_argument("--output", help="Result file (default: benchmarks/results/<commit>-<time>.json)")
+    parser.add_argument("--save-baseline", metavar="NAME", help="Also store as benchmarks/baselines/NAME.json")
+    parser.add_argument("--compare", metavar="BASELINE", help="Compare against a baseline and fail on regressions")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Allowed relative slowdown for --compare")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+
+    db_name = f"bench_{uuid.uuid4().hex[:8]}"
+    prepare_process(bench_secrets(args, db_name), args.mongo == "memory")
+
+    recorder = Recorder()
+    started = time.perf_counter()
+    users = [threading.Thread(target=virtual_user, args=(n, args, recorder), name=f"user-{n}")
+             for n in range(args.users)]
+    for user in users:
+        user.start()
+    for user in users:
+        user.join()
+    wall_seconds = time.perf_counter() - started
+
+    from src.config.db import get_db
+    from src.repos.message_repo import get_message_write_queue
+    get_message_write_queue().shutdown()
+    if args.mongo != "memory" and not args.keep_db:
+        get_db().client.drop_database(db_name)
+
+    commit = git_commit()
+    results = {
+        "meta": {
+            "commit": commit,
+            "created_at": datetime.now(UTC).isoformat(),
+            "python": platform.python_version(),
+            "streamlit": st.__version__,
+            "wall_seconds": wall_seconds,
+            "turns_per_second": len(recorder.samples["turn"]) / wall_seconds if wall_seconds else 0.0,
+            "config": {key: value for key, value in vars(args).items()
+                       if key not in ("output", "save_baseline", "compare")},
+        },
+        "metrics": recorder.summary(),
+        "fragments": fragment_summary(),
+    }
+
+    print(f"{'metric':<16}{'count':>7}{'errors':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for name, m in results["metrics"].items():
+        print(f"{name:<16}{m['count']:>7}{m['errors']:>8}{m['p50']:>10.1f}{m['p95']:>10.1f}{m['p99']:>10.1f}")
+    for name, m in results["fragments"].items():
+        print(f"{'[' + name + ']':<16}{m['count']:>7}{'':>8}{m['p50']:>10.1f}{m['p95']:>10.1f}{m['p99']:>10.1f}")
+    print(f"{results['meta']['turns_per_second']:.2f} turns/s over {wall_seconds:.1f}s")
+
+    stamp = datetime.now(UTC).strftime("%Y%m%dT%H%M%S")
+    write_json(args.output or os.path.join(RESULTS_DIR, f"{commit or 'unknown'}-{stamp}.json"), results)
+    if args.save_baseline:
+        write_json(os.path.join(BASELINES_DIR, f"{args.save_baseline}.json"), results)
+
+    if args.compare:
+        from benchmarks.compare import compare, load_results, print_report
+        baseline = load_results(args.compare)
+        rows = compare(baseline, results, args.threshold)
+        print_report(rows, baseline, results)
+        if any(row["regressed"] for row in rows):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""Checks the Gemini scheduler's fairness, backoff and bookkeeping against the fake client.
+
+    python -m benchmarks.scheduler_check
+
+- fairness: with one slot, a user who queues two calls behind another user's burst of six is served
+  second and fourth, not after the burst.
+- backoff: calls that keep failing with 429 are attempted max_attempts times and every attempt is
+  charged to the requests bucket; calls that fail now and then all succeed.
+- bookkeeping: per-user rounds do not outlive the served round.
+
+Exits with status 1 when a check fails.
+"""
+import argparse
+import sys
+import threading
+import time
+from benchmarks.run import bench_secrets, build_parser, prepare_process
+
+
+def check(name: str, ok: bool, detail: str) -> bool:
+    print(f"{name:<14}{'ok' if ok else 'FAILED':<8}{detail}")
+    return ok
+
+
+def served_order(scheduler, calls: list[tuple[str, float]]) -> list[str]:
+    order, lock = [], threading.Lock()
+
+    def call(user_id: str):
+        scheduler.generate_content(user_id, model="fake", contents="hi")
+        with lock:
+            order.append(user_id)
+
+    threads = []
+    for user_id, delay in calls:
+        time.sleep(delay)
+        thread = threading.Thread(target=call, args=(user_id,))
+        thread.start()
+        threads.append(thread)
+    for thread in threads:
+        thread.join()
+    return order
+
+
+def main(argv=None):
+    argparse.ArgumentParser(description="Check scheduler fairness and backoff with the fake Gemini client").parse_args(argv)
+    # Only the secrets are needed; nothing here touches Mongo
+    prepare_process(bench_secrets(build_parser().parse_args([]), "scheduler_check"), in_memory=True)
+
+    from google.genai import errors
+    from src.utils.fake_gemini import FakeGeminiClient
+    from src.utils.gemini_scheduler import GeminiScheduler
+
+    ok = True
+
+    client = FakeGeminiClient(first_token_latency=0.05, chunk_delay=0)
+    scheduler = GeminiScheduler(client, max_concurrency=1, requests_per_minute=100_000)
+    order = served_order(scheduler, [("a", 0)] * 6 + [("b", 0.01)] * 2)
+    ok &= check("fairness", [i for i, user in enumerate(order) if user == "b"] == [1, 3], " ".join(order))
+
+    client = FakeGeminiClient(first_token_latency=0, chunk_delay=0, error_rate=1.0, error_codes=(429,), seed=1)
+    scheduler = GeminiScheduler(client, max_concurrency=1, requests_per_minute=6, max_attempts=3)
+    try:
+        scheduler.generate_content("a", model="fake", contents="hi")
+        failed = False
+    except errors.APIError:
+        failed = True
+    charged = scheduler._requests.capacity - scheduler._requests.tokens
+    ok &= check("backoff", failed and client.calls == 3 and charged > 2.5,
+                f"{client.calls} attempts, {charged:.1f} requests charged")
+
+    client = FakeGeminiClient(first_token_latency=0, chunk_delay=0, error_rate=0.3, seed=7)
+    scheduler = GeminiScheduler(client, max_concurrency=4, requests_per_minute=100_000, max_attempts=8)
+    order = served_order(scheduler, [(f"user-{n}", 0) for n in range(20)])
+    ok &= check("flaky", len(order) == 20, f"{len(order)}/20 served in {client.calls} attempts")
+
+    order = served_order(scheduler, [("a", 0)] * 3 + [("b", 0)] * 3)
+    ok &= check("rounds", len(scheduler._user_rounds) <= 2, f"{len(scheduler._user_rounds)} users tracked after 26 calls")
+
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
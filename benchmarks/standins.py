@@ -0,0 +1,246 @@
+"""In-process stand-ins so the benchmarks run without a mongod or a Gemini key.
+
+mongomock is not thread-safe and has no async client, so every call is serialised behind one lock
+and the async API is a thin coroutine wrapper over the same in-memory store.
+"""
+import threading
+import mongomock
+import pymongo
+
+_lock = threading.RLock()
+_client = mongomock.MongoClient()
+
+
+class StandinSession:
+    """mongomock has no sessions; a single in-memory node is causally consistent anyway."""
+
+    cluster_time = None
+    operation_time = None
+
+    def advance_cluster_time(self, cluster_time):
+        pass
+
+    def advance_operation_time(self, operation_time):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+class LockedCursor:
+    """Collects `sort`/`limit`/`skip` and only touches the store once, under the lock, when read."""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def _chain(self, name, *args, **kwargs):
+        with _lock:
+            getattr(self._cursor, name)(*args, **kwargs)
+        return self
+
+    def sort(self, *args, **kwargs):
+        return self._chain("sort", *args, **kwargs)
+
+    def limit(self, *args):
+        return self._chain("limit", *args)
+
+    def skip(self, *args):
+        return self._chain("skip", *args)
+
+    def batch_size(self, *args):
+        return self
+
+    def explain(self):
+        # mongomock has no query planner, so the hot-query check has nothing to verify
+        return {"queryPlanner": {"winningPlan": {}}}
+
+    def to_list(self, length=None):
+        with _lock:
+            return list(self._cursor)
+
+    def __iter__(self):
+        return iter(self.to_list())
+
+
+class LockedCollection:
+    def __init__(self, collection):
+        self._collection = collection
+
+    @property
+    def name(self):
+        return self._collection.name
+
+    def find(self, *args, session=None, **kwargs):
+        with _lock:
+            return LockedCursor(self._collection.find(*args, **kwargs))
+
+    def bulk_write(self, requests, ordered=True, **kwargs):
+        # mongomock's bulk builder predates the arguments current pymongo passes, so operations are replayed
+        errors = []
+        with _lock:
+            for index, request in enumerate(requests):
+                try:
+                    if isinstance(request, pymongo.InsertOne):
+                        self._collection.insert_one(request._doc)
+                    elif isinstance(request, pymongo.UpdateOne):
+                        self._collection.update_one(request._filter, request._doc, upsert=bool(request._upsert))
+                    elif isinstance(request, pymongo.UpdateMany):
+                        self._collection.update_many(request._filter, request._doc, upsert=bool(request._upsert))
+                    else:
+                        raise NotImplementedError(type(request).__name__)
+                except pymongo.errors.DuplicateKeyError as e:
+                    errors.append({"index": index, "code": e.code, "errmsg": str(e)})
+                    if ordered:
+                        break
+        if errors:
+            raise pymongo.errors.BulkWriteError({"writeErrors": errors, "writeConcernErrors": []})
+
+    @property
+    def database(self):
+        return LockedDatabase(self._collection.database)
+
+    def aggregate(self, *args, session=None, **kwargs):
+        with _lock:
+            return LockedCursor(iter(list(self._collection.aggregate(*args, **kwargs))))
+
+    def __getattr__(self, name):
+        attr = getattr(self._collection, name)
+        if not callable(attr):
+            return attr
+
+        def call(*args, session=None, **kwargs):
+            with _lock:
+                return attr(*args, **kwargs)
+        return call
+
+
+class LockedDatabase:
+    def __init__(self, database):
+        self._database = database
+        self.client = MockMongoClient()
+
+    def get_collection(self, name, **kwargs):
+        return LockedCollection(self._database.get_collection(name))
+
+    def command(self, command, *args, **kwargs):
+        if isinstance(command, dict) and "explain" in command:
+            # Same as LockedCursor.explain: no planner, nothing to verify
+            return {"queryPlanner": {"winningPlan": {}}}
+        with _lock:
+            return self._database.command(command, *args, **kwargs)
+
+    def __getitem__(self, name):
+        return self.get_collection(name)
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        attr = getattr(self._database, name)
+        return self.get_collection(name) if isinstance(attr, mongomock.Collection) else attr
+
+
+class MockMongoClient:
+    """Drop-in for `pymongo.MongoClient`; every instance shares the same in-memory server."""
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def bulk_write(self, *args, **kwargs):
+        # Behaves like a pre-8.0 server, so callers take their per-collection path
+        raise pymongo.errors.InvalidOperation("MongoClient.bulk_write requires MongoDB server version 8.0+.")
+
+    def start_session(self, **kwargs):
+        return StandinSession()
+
+    def get_database(self, name, **kwargs):
+        return LockedDatabase(_client.get_database(name))
+
+    def __getitem__(self, name):
+        return self.get_database(name)
+
+    def close(self):
+        pass
+
+
+class AsyncCursor:
+    def __init__(self, cursor: LockedCursor):
+        self._cursor = cursor
+
+    def sort(self, *args, **kwargs):
+        self._cursor.sort(*args, **kwargs)
+        return self
+
+    def limit(self, *args):
+        self._cursor.limit(*args)
+        return self
+
+    def skip(self, *args):
+        self._cursor.skip(*args)
+        return self
+
+    def batch_size(self, *args):
+        return self
+
+    async def to_list(self, length=None):
+        return self._cursor.to_list()
+
+    async def __aiter__(self):
+        for doc in self._cursor.to_list():
+            yield doc
+
+
+class AsyncCollection:
+    def __init__(self, collection: LockedCollection):
+        self._collection = collection
+
+    def find(self, *args, **kwargs):
+        return AsyncCursor(self._collection.find(*args, **kwargs))
+
+    async def aggregate(self, *args, **kwargs):
+        return AsyncCursor(self._collection.aggregate(*args, **kwargs))
+
+    def __getattr__(self, name):
+        attr = getattr(self._collection, name)
+        if not callable(attr):
+            return attr
+
+        async def call(*args, **kwargs):
+            return attr(*args, **kwargs)
+        return call
+
+
+class AsyncDatabase:
+    def __init__(self, database: LockedDatabase):
+        self._database = database
+        self.client = AsyncMockMongoClient()
+
+    def get_collection(self, name, **kwargs):
+        return AsyncCollection(self._database.get_collection(name))
+
+    def __getitem__(self, name):
+        return self.get_collection(name)
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return self.get_collection(name)
+
+
+class AsyncMockMongoClient(MockMongoClient):
+    def get_database(self, name, **kwargs):
+        return AsyncDatabase(super().get_database(name))
+
+
+def install_mongo_standin():
+    """Must run before `src.config.db` is imported, which binds the client classes at import time."""
+    pymongo.MongoClient = MockMongoClient
+    pymongo.AsyncMongoClient = AsyncMockMongoClient
@@ -1,17 +1,19 @@
 import streamlit as st
 
-from src.repos.chat_repo import ChatRepository
-from src.repos.user_repo import UserRepository
+from src.config import METRICS_HOST, METRICS_PORT
+from src.config.warmup import start_warmup
+from src.utils.instrumentation import span, start_metrics_server
 
-def create_indexes():
-    user_repo = UserRepository()
-    chat_repo = ChatRepository()
 
-    user_repo.create_indexes()
-    chat_repo.create_indexes()
+st.set_page_config(page_title="Ajax AI", layout="wide")
 
+# Clients, migrations and caches are prepared in the background; the first page renders meanwhile
+warmup = start_warmup()
+# A failed migration or hot-query check stops every page; pages that write also wait for them to finish
+warmup.require_database(wait=False)
 
-st.set_page_config(page_title="Ajax AI", layout="wide")
+if METRICS_PORT:
+    start_metrics_server(METRICS_PORT, METRICS_HOST)
 
 
 
@@ -24,9 +26,14 @@ nav = st.navigation(
             st.Page("src/pages/auth/sign_up.py", title="📝 Sign Up")
         ],
         "Chat": [st.Page("src/pages/ajax_chat.py", title="💬 Chat")],
+        "Admin": [
+            st.Page("src/pages/admin/usage.py", title="📊 Usage"),
+            st.Page("src/pages/admin/metrics.py", title="⏱️ Metrics")
+        ],
     },
     # position="top"  # 👈 This puts it as a top navbar
 )
 
-# Run the selected page
-nav.run()
+# Run the selected page; each rerun is one span in the rerun_seconds histogram
+with span("rerun", page=nav.url_path or "home"):
+    nav.run()
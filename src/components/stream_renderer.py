@@ -0,0 +1,75 @@
+import time
+
+
+class StreamRenderer:
+    """Renders a model stream into a placeholder at a bounded frame rate.
+
+    Chunks are buffered and the placeholder is only redrawn every `interval` seconds or once
+    `flush_bytes` of new text have arrived, instead of re-sending the whole answer per chunk.
+    """
+
+    def __init__(self, placeholder, interval: float = 0.08, flush_bytes: int = 4096, cursor: str = "▌"):
+        self.placeholder = placeholder
+        self.interval = interval
+        self.flush_bytes = flush_bytes
+        self.cursor = cursor
+
+        self.text = ""
+        self.chunk_count = 0
+        self.flush_count = 0
+        self.time_to_first_token = None
+        self.total_time = None
+        self.usage = None
+
+    def render(self, chunks) -> str:
+        """Consumes `chunks` (SDK chunks with `.text`, or plain strings) and returns the full text."""
+        start = time.perf_counter()
+        last_flush = start
+        buffer = []
+        buffered_bytes = 0
+
+        for chunk in chunks:
+            if not isinstance(chunk, str) and getattr(chunk, "usage_metadata", None):
+                # The SDK reports cumulative usage; the last chunk that carries it wins
+                self.usage = chunk.usage_metadata
+            text = chunk if isinstance(chunk, str) else chunk.text
+            if not text:
+                continue
+
+            now = time.perf_counter()
+            if self.time_to_first_token is None:
+                self.time_to_first_token = now - start
+
+            self.chunk_count += 1
+            buffer.append(text)
+            buffered_bytes += len(text.encode("utf-8"))
+
+            if now - last_flush >= self.interval or buffered_bytes >= self.flush_bytes:
+                self._flush(buffer, self.cursor)
+                buffer, buffered_bytes, last_flush = [], 0, now
+
+        self._flush(buffer, "")
+        self.total_time = time.perf_counter() - start
+        return self.text
+
+    def _flush(self, buffer: list[str], cursor: str):
+        self.text += "".join(buffer)
+        self.placeholder.markdown(self.text + cursor)
+        self.flush_count += 1
+
+    def stats(self) -> dict:
+        return {
+            "chunks": self.chunk_count,
+            "flushes": self.flush_count,
+            "time_to_first_token": self.time_to_first_token,
+            "total_time": self.total_time,
+            "usage": self.usage_counts(),
+        }
+
+    def usage_counts(self) -> dict:
+        usage = self.usage
+        return {
+            "prompt_tokens": getattr(usage, "prompt_token_count", None) or 0,
+            "output_tokens": getattr(usage, "candidates_token_count", None) or 0,
+            "total_tokens": getattr(usage, "total_token_count", None) or 0,
+        }
@@ -0,0 +1,55 @@
+import hashlib
+import streamlit as st
+
+
+def content_hash(content: str) -> str:
+    return hashlib.blake2b(content.encode("utf-8"), digest_size=16).hexdigest()
+
+
+@st.cache_data(max_entries=5000, show_spinner=False)
+def render_message(message_id: str | None, digest: str, role: str, _content: str):
+    """Draws one message; later reruns replay the cached elements for the same id and content hash.
+
+    The content itself is not hashed by the cache (leading underscore); `digest` stands in for it.
+    """
+    # Map 'model' role to 'assistant' for the Streamlit icon
+    with st.chat_message(role if role != "model" else "assistant"):
+        st.markdown(_content)
+
+
+class Transcript:
+    """Renders only the newest `window` messages of a `ChatHistory`.
+
+    The window grows by `window` on each "load earlier" click: first over messages already in the
+    history, then through `load_page`, which prepends the next older page from the repository.
+    """
+
+    def __init__(self, history, window: int, load_page, state_key: str = "transcript_visible"):
+        self.history = history
+        self.window = window
+        self.load_page = load_page
+        self.state_key = state_key
+
+    @property
+    def visible(self) -> int:
+        return st.session_state.get(self.state_key, self.window)
+
+    def reset(self):
+        st.session_state[self.state_key] = self.window
+
+    def hidden(self) -> int:
+        return max(0, len(self.history.messages) - self.visible)
+
+    def load_earlier(self):
+        if self.hidden() < self.window:
+            self.load_page()
+        st.session_state[self.state_key] = self.visible + self.window
+
+    def render(self, has_older_pages: bool):
+        hidden = self.hidden()
+        if hidden or has_older_pages:
+            label = f"⬆️ Load earlier messages ({hidden} hidden)" if hidden else "⬆️ Load earlier messages"
+            st.button(label, use_container_width=True, on_click=self.load_earlier)
+
+        for message_id, msg in zip(self.history.ids[hidden:], self.history.messages[hidden:]):
+            render_message(message_id, content_hash(msg["content"]), msg["role"], msg["content"])
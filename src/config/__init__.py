@@ -1,6 +1,50 @@
+from importlib.util import find_spec
 import streamlit as st
 
 SECRET_KEY = st.secrets["SECRET_KEY"]
 COOKIE_PREFIX = st.secrets["COOKIE_PREFIX"]
+# "memory" keeps cookies server-side for headless runs (benchmarks); anything else uses the browser component
+COOKIE_BACKEND = st.secrets.get("COOKIE_BACKEND", "browser")
 API_KEY = st.secrets["API_KEY"]
 
+GEMINI_MODEL = st.secrets.get("GEMINI_MODEL", "gemini-2.5-flash")
+
+# Token budget for a single Gemini request and how many recent turns are always sent verbatim
+CONTEXT_TOKEN_BUDGET = int(st.secrets.get("CONTEXT_TOKEN_BUDGET", 8000))
+CONTEXT_KEEP_TURNS = int(st.secrets.get("CONTEXT_KEEP_TURNS", 12))
+
+# "text" uses Mongo text indexes; "inverted" uses the in-process index for stand-ins without $text
+SEARCH_BACKEND = st.secrets.get("SEARCH_BACKEND", "text")
+
+# Accounts allowed to open the admin pages
+ADMIN_EMAILS = set(st.secrets.get("ADMIN_EMAILS", []))
+
+# Mongo commands slower than this are kept in the slow-query log (0 disables it)
+SLOW_QUERY_MS = float(st.secrets.get("SLOW_QUERY_MS", 0))
+# Serves /metrics (Prometheus text), /metrics.json and the /ready probe on this port when set
+METRICS_PORT = int(st.secrets.get("METRICS_PORT", 0))
+# The endpoints have no authentication; bind to an address only the scraper can reach
+METRICS_HOST = st.secrets.get("METRICS_HOST", "127.0.0.1")
+
+# "documents" stores one document per message; "buckets" packs up to MESSAGE_BUCKET_SIZE per document
+MESSAGE_STORAGE = st.secrets.get("MESSAGE_STORAGE", "documents")
+MESSAGE_BUCKET_SIZE = int(st.secrets.get("MESSAGE_BUCKET_SIZE", 100))
+
+# Chats idle this many days are moved to archived_chats by src.jobs.archive_chats (0 disables it)
+ARCHIVE_AFTER_DAYS = int(st.secrets.get("ARCHIVE_AFTER_DAYS", 90))
+# "zstd" needs the zstandard package; "zlib" always works. Each archive records its own codec
+ARCHIVE_CODEC = st.secrets.get("ARCHIVE_CODEC", "zstd" if find_spec("zstandard") else "zlib")
+
+# Messages drawn per rerun; older ones stay behind "Load earlier messages"
+TRANSCRIPT_WINDOW = int(st.secrets.get("TRANSCRIPT_WINDOW", 30))
+
+# Change-stream watcher that refreshes sidebars and open chats across tabs and replicas (needs a replica set)
+LIVE_SYNC = bool(st.secrets.get("LIVE_SYNC", False))
+# How often an open chat page applies the changes published to it
+LIVE_SYNC_SECONDS = float(st.secrets.get("LIVE_SYNC_SECONDS", 2))
+# Keys this replica's stored resume token; must stay the same across restarts and differ between replicas
+# (a StatefulSet pod name, say). Required when LIVE_SYNC is on: a hostname changes with every restart
+CHANGE_FEED_NAME = st.secrets.get("CHANGE_FEED_NAME")
+
+# Creates clients, runs migrations and primes caches on a background thread at start-up
+WARMUP = bool(st.secrets.get("WARMUP", True))
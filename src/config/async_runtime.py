@@ -0,0 +1,46 @@
+import asyncio
+import logging
+import threading
+import streamlit as st
+
+logger = logging.getLogger(__name__)
+
+
+@st.cache_resource
+def get_event_loop():
+    # One long-lived loop per process; every session schedules its async I/O here
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, name="async-runtime", daemon=True).start()
+    return loop
+
+
+def submit(coro):
+    """Schedules `coro` on the shared loop and returns a concurrent.futures.Future."""
+    return asyncio.run_coroutine_threadsafe(coro, get_event_loop())
+
+
+def log_failure(what: str):
+    """Done-callback for a submitted future whose result nobody waits on; a failure is logged, not lost."""
+    def callback(future):
+        if not future.cancelled() and future.exception() is not None:
+            error = future.exception()
+            logger.error("%s failed: %s - %s", what, type(error).__name__, error)
+    return callback
+
+
+def run(coro, timeout: float | None = None):
+    return submit(coro).result(timeout)
+
+
+def iterate(async_iterator):
+    """Consumes an async iterator from a sync caller, one item at a time."""
+    try:
+        while True:
+            try:
+                yield run(anext(async_iterator))
+            except StopAsyncIteration:
+                return
+    finally:
+        aclose = getattr(async_iterator, "aclose", None)
+        if aclose:
+            run(aclose())
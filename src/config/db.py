@@ -1,13 +1,118 @@
+from contextlib import asynccontextmanager, contextmanager
+from importlib.util import find_spec
+from threading import Lock
 import streamlit as st
-from pymongo import MongoClient
+from cachetools import TTLCache
+from pymongo import AsyncMongoClient, MongoClient, ReadPreference, WriteConcern
+from pymongo.read_preferences import SecondaryPreferred
+from src.config.async_runtime import run
+from src.utils.instrumentation import get_mongo_listener
 
 MONGO_URI = st.secrets["MONGO_URI"]
 DB_NAME = st.secrets["DB_NAME"]
 
+
+def available_compressors() -> str:
+    # pymongo warns about and drops compressors whose library is missing; zlib ships with Python
+    optional = [name for name, module in (("zstd", "zstandard"), ("snappy", "snappy")) if find_spec(module)]
+    return ",".join(optional + ["zlib"])
+
+
+# Pool, timeouts and wire compression; any URI option in the MONGO_OPTIONS secret table overrides these
+MONGO_OPTIONS = {
+    "maxPoolSize": 100,
+    "minPoolSize": 5,
+    "maxIdleTimeMS": 300_000,
+    "waitQueueTimeoutMS": 10_000,
+    "connectTimeoutMS": 5_000,
+    "serverSelectionTimeoutMS": 10_000,
+    "compressors": available_compressors(),
+    **st.secrets.get("MONGO_OPTIONS", {}),
+}
+
+# How far behind the primary a secondary may be and still serve history reads (the server minimum is 90)
+MAX_STALENESS_SECONDS = int(st.secrets.get("MONGO_MAX_STALENESS_SECONDS", 90))
+
+# Collection options per kind of operation; see `collection_for`
+ACCESS = {
+    # Sidebar, search and chat history: any member that is not too far behind
+    "history": {"read_preference": SecondaryPreferred(max_staleness=MAX_STALENESS_SECONDS)},
+    # Chat turns: acknowledged by the primary; the write-behind queue retries what fails
+    "turns": {"write_concern": WriteConcern(w=1)},
+    # Accounts and sessions must survive a failover and are read back from the primary
+    "auth": {"write_concern": WriteConcern(w="majority"), "read_preference": ReadPreference.PRIMARY},
+}
+
+
 @st.cache_resource
 def get_db():
-    client = MongoClient(MONGO_URI)
+    # Created on first use (usually by the warm-up thread), never at import
+    client = MongoClient(MONGO_URI, event_listeners=[get_mongo_listener()], **MONGO_OPTIONS)
     return client[DB_NAME]
 
 
-db = get_db()
+async def _create_async_db():
+    client = AsyncMongoClient(MONGO_URI, event_listeners=[get_mongo_listener()], **MONGO_OPTIONS)
+    return client[DB_NAME]
+
+
+@st.cache_resource
+def get_async_db():
+    # Created on the shared loop, which is the only loop allowed to use it
+    return run(_create_async_db())
+
+
+def collection_for(name: str, access: str, database=None):
+    """`name` from `database` (the sync database by default) with the options of one ACCESS kind."""
+    database = get_db() if database is None else database
+    return database.get_collection(name, **ACCESS[access])
+
+
+class CausalClock:
+    """The newest cluster and operation time each user's writes reached.
+
+    A causally consistent session advanced to those times makes a secondary wait until it has applied
+    the user's own writes, so history reads on secondaries still show a turn that was just written.
+    """
+
+    def __init__(self, maxsize: int = 10_000, ttl: float = 3600):
+        self._times = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._lock = Lock()
+
+    def observe(self, keys, session):
+        if session.cluster_time is None or session.operation_time is None:
+            return
+        with self._lock:
+            for key in {str(key) for key in keys if key is not None}:
+                known = self._times.get(key)
+                if known is None or known[1] < session.operation_time:
+                    self._times[key] = (session.cluster_time, session.operation_time)
+
+    def advance(self, key, session):
+        with self._lock:
+            known = self._times.get(str(key))
+        if known:
+            session.advance_cluster_time(known[0])
+            session.advance_operation_time(known[1])
+
+
+causal_clock = CausalClock()
+
+
+@contextmanager
+def causal_session(client, key=None, writes=()):
+    """Session that reads after `key`'s last write and records the writes made for the users in `writes`."""
+    with client.start_session(causal_consistency=True) as session:
+        if key is not None:
+            causal_clock.advance(key, session)
+        yield session
+        causal_clock.observe(writes, session)
+
+
+@asynccontextmanager
+async def async_causal_session(client, key=None, writes=()):
+    async with client.start_session(causal_consistency=True) as session:
+        if key is not None:
+            causal_clock.advance(key, session)
+        yield session
+        causal_clock.observe(writes, session)
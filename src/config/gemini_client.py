@@ -1,9 +1,23 @@
-from google import genai
 from src.config import API_KEY
+from src.utils.gemini_scheduler import GeminiScheduler
 import streamlit as st
 
 @st.cache_resource
 def get_gemini_client():
+    # GEMINI_FAKE swaps in the local stand-in for development and load tests
+    if st.secrets.get("GEMINI_FAKE", False):
+        from src.utils.fake_gemini import FakeGeminiClient
+        return FakeGeminiClient(**st.secrets.get("GEMINI_FAKE_OPTIONS", {}))
+    # The SDK is the slowest import in the app; only the chat path (or the warm-up thread) pays for it
+    from google import genai
     return genai.Client(api_key=API_KEY)
 
-client = get_gemini_client()
\ No newline at end of file
+
+@st.cache_resource
+def get_gemini_scheduler():
+    return GeminiScheduler(
+        get_gemini_client(),
+        max_concurrency=int(st.secrets.get("GEMINI_MAX_CONCURRENCY", 8)),
+        requests_per_minute=int(st.secrets.get("GEMINI_REQUESTS_PER_MINUTE", 60)),
+        tokens_per_minute=int(st.secrets.get("GEMINI_TOKENS_PER_MINUTE", 1_000_000))
+    )
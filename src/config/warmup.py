@@ -0,0 +1,153 @@
+"""Start-up work: Mongo and Gemini clients, migrations and hot-query checks, and cache priming.
+
+main.py runs it on a background thread. With WARMUP = false nothing runs at start-up and each client is
+created by the first page that needs it; migrations then have to be applied as a deploy step:
+
+    python -m src.config.warmup
+"""
+import logging
+import sys
+import threading
+import time
+import streamlit as st
+from src.config import WARMUP
+
+
+# Steps whose failure leaves the process unable to serve: writes rely on the unique indexes the
+# migrations build, and a hot query without its index must not reach production traffic
+DATABASE_STEPS = ("mongo", "migrations")
+
+
+class WarmUp:
+    """Start-up work that runs on a background thread so the first page does not wait for it.
+
+    `ready` is set once every step has run; the process is healthy when that happened without errors.
+    `migrated` is set as soon as the database steps are done, for pages that must not write before.
+    """
+
+    def __init__(self):
+        self.ready = threading.Event()
+        self.migrated = threading.Event()
+        self.started_at = None
+        self.steps = {}
+        self.errors = {}
+
+    def run(self, steps):
+        self.started_at = time.time()
+        for name, step in steps:
+            started = time.perf_counter()
+            try:
+                step()
+            except Exception as e:
+                self.errors[name] = f"{type(e).__name__} - {str(e)}"
+                print(f"Error: {type(e).__name__} - {str(e)}")
+            finally:
+                self.steps[name] = time.perf_counter() - started
+            if name == DATABASE_STEPS[-1]:
+                self.migrated.set()
+        # Without a database step (WARMUP = false) migrations are a deploy step, so there is nothing to wait for
+        self.migrated.set()
+        self.ready.set()
+
+    def database_errors(self) -> dict:
+        return {name: self.errors[name] for name in DATABASE_STEPS if name in self.errors}
+
+    def require_database(self, wait: bool = True):
+        """Stops the page when the database steps failed; with `wait`, first blocks until they have run."""
+        if wait and not self.migrated.is_set():
+            with st.spinner("Preparing the database..."):
+                self.migrated.wait()
+        errors = self.database_errors()
+        if errors:
+            st.error("The app could not prepare its database: "
+                     + "; ".join(f"{name}: {error}" for name, error in errors.items()))
+            st.stop()
+
+    def healthy(self) -> bool:
+        return self.ready.is_set() and not self.errors
+
+    def status(self) -> dict:
+        return {"ready": self.ready.is_set(), "healthy": self.healthy(), "started_at": self.started_at,
+                "steps": dict(self.steps), "errors": dict(self.errors)}
+
+
+def connect_mongo():
+    from src.config.db import get_async_db, get_db
+    get_db().command("ping")
+    get_async_db()
+
+
+def prepare_database():
+    from src.config.db import get_db
+    from src.repos.migrations import check_hot_queries, run_migrations
+    # Importing the repositories registers their migrations and hot queries
+    import src.repos.change_feed
+    import src.repos.chat_archive
+    import src.repos.chat_repo
+    import src.repos.message_buckets
+    import src.repos.message_repo
+    import src.repos.response_cache
+    import src.repos.session_repo
+    import src.repos.user_repo
+    import src.jobs.usage_rollup
+
+    db = get_db()
+    run_migrations(db)
+    check_hot_queries(db)
+
+
+def load_gemini():
+    from src.config.gemini_client import get_gemini_scheduler
+    # The chat page's own imports; the SDK is by far the slowest of them
+    import src.utils.chat_history
+    get_gemini_scheduler()
+
+
+def prime_caches():
+    from src.repos.change_feed import get_change_feed
+    from src.repos.message_repo import get_message_write_queue
+    from src.repos.response_cache import get_response_cache
+    from src.utils.password_util import get_password_service
+    get_message_write_queue()
+    get_response_cache()
+    # Calibrates the bcrypt cost and starts the hashing pool before the first login
+    get_password_service()
+    get_change_feed()
+
+
+STEPS = (
+    ("mongo", connect_mongo),
+    ("migrations", prepare_database),
+    ("gemini", load_gemini),
+    ("caches", prime_caches),
+)
+
+warmup = WarmUp()
+
+
+class _WarmUpThreadFilter(logging.Filter):
+    # Cached resources built off the script thread log "missing ScriptRunContext" on every call
+    def filter(self, record):
+        return record.threadName != "warmup"
+
+
+@st.cache_resource
+def start_warmup():
+    # Once per process
+    if WARMUP:
+        logging.getLogger("streamlit.runtime.scriptrunner_utils.script_run_context").addFilter(_WarmUpThreadFilter())
+        threading.Thread(target=warmup.run, args=(STEPS,), name="warmup", daemon=True).start()
+    else:
+        warmup.run(())
+    return warmup
+
+
+def main():
+    # Clients and caches are per process; only the database steps outlast this one
+    warmup.run(STEPS[:2])
+    print(warmup.status())
+    sys.exit(1 if warmup.errors else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""Moves chats idle for ARCHIVE_AFTER_DAYS into archived_chats, and archived chats that got a new turn back.
+
+    python -m src.jobs.archive_chats [--older-than-days 90] [--batch-size 50] [--pause 0.2] [--codec zstd]
+
+Safe to run while the app serves: a chat that receives a turn while it is being archived is left hot, and
+reads merge the hot layouts with the archive throughout. Reruns pick up where a stopped run left off.
+"""
+import argparse
+import time
+from datetime import datetime, timedelta, UTC
+from src.config import ARCHIVE_AFTER_DAYS, ARCHIVE_CODEC
+from src.config.db import get_db
+from src.repos.chat_archive import archive_chat, archive_terms, decode_messages, is_reactivated, promote_chat
+
+db = get_db()
+
+
+def run_promotion(batch_size: int = 50) -> int:
+    promoted = 0
+    last_id = None
+    while True:
+        query = {"archived": True, **({"_id": {"$gt": last_id}} if last_id else {})}
+        chats = db.chats.find(query, {"updated_at": 1, "archived": 1, "archived_at": 1}).sort("_id", 1).limit(batch_size).to_list()
+        if not chats:
+            return promoted
+        for chat in chats:
+            if is_reactivated(chat):
+                promote_chat(db, chat["_id"])
+                promoted += 1
+        last_id = chats[-1]["_id"]
+
+
+def run_terms_backfill(batch_size: int = 50) -> int:
+    # Archives written before they carried `terms` are invisible to search until they get them
+    filled = 0
+    last_id = None
+    while True:
+        query = {"terms": {"$exists": False}, **({"_id": {"$gt": last_id}} if last_id else {})}
+        archives = db.archived_chats.find(query).sort("_id", 1).limit(batch_size).to_list()
+        if not archives:
+            return filled
+        for archive in archives:
+            db.archived_chats.update_one({"_id": archive["_id"], "archived_at": archive["archived_at"]},
+                                         {"$set": {"terms": archive_terms(decode_messages(archive))}})
+        filled += len(archives)
+        last_id = archives[-1]["_id"]
+
+
+def run_archive(older_than_days: int = ARCHIVE_AFTER_DAYS, batch_size: int = 50, pause: float = 0.2,
+                codec: str = ARCHIVE_CODEC) -> dict:
+    totals = {"promoted": run_promotion(batch_size), "terms": run_terms_backfill(batch_size), "chats": 0, "messages": 0}
+    cutoff = datetime.now(UTC) - timedelta(days=older_than_days)
+
+    last_id = None
+    while True:
+        query = {"archived": {"$ne": True}, "updated_at": {"$lt": cutoff}}
+        if last_id:
+            query["_id"] = {"$gt": last_id}
+        chats = db.chats.find(query, {"user_id": 1, "updated_at": 1}).sort("_id", 1).limit(batch_size).to_list()
+        if not chats:
+            break
+
+        for chat in chats:
+            archived = archive_chat(db, chat, codec)
+            totals["messages"] += archived
+            totals["chats"] += bool(archived)
+        last_id = chats[-1]["_id"]
+        print(f"archived {totals['messages']} messages from {totals['chats']} chats")
+        # Yields the primary to live traffic between batches
+        time.sleep(pause)
+
+    return totals
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Archive idle chats and promote reactivated ones")
+    parser.add_argument("--older-than-days", type=int, default=ARCHIVE_AFTER_DAYS)
+    parser.add_argument("--batch-size", type=int, default=50, help="Chats per batch")
+    parser.add_argument("--pause", type=float, default=0.2, help="Seconds to wait between batches")
+    parser.add_argument("--codec", choices=["zstd", "zlib"], default=ARCHIVE_CODEC)
+    args = parser.parse_args(argv)
+
+    if args.older_than_days <= 0:
+        print("Error: archiving is disabled (ARCHIVE_AFTER_DAYS = 0)")
+        return
+    print(run_archive(args.older_than_days, args.batch_size, args.pause, args.codec))
+
+
+if __name__ == "__main__":
+    main()
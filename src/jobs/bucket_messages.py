@@ -0,0 +1,76 @@
+"""Moves per-message documents into message_buckets, one chat at a time, while the app keeps serving.
+
+    python -m src.jobs.bucket_messages [--batch-size 50] [--pause 0.2]
+
+Run it only after the app is on MESSAGE_STORAGE = "buckets": reads then merge both layouts, so a chat
+is readable before, during and after its move. Progress is checkpointed by chat `_id`; a rerun resumes.
+"""
+import argparse
+import time
+from datetime import datetime, UTC
+from src.config import MESSAGE_BUCKET_SIZE, MESSAGE_STORAGE
+from src.config.db import get_db
+from src.repos.message_buckets import bucket_doc, bucketed_ids
+
+db = get_db()
+
+STATE_ID = "bucket_messages"
+
+
+def migrate_chat(chat: dict, size: int = MESSAGE_BUCKET_SIZE) -> int:
+    docs = db.messages.find({"chat_id": chat["_id"]}).sort([("created_at", 1), ("_id", 1)]).to_list()
+    if not docs:
+        return 0
+
+    # A crash between insert and delete leaves messages in both layouts; those are not bucketed twice
+    present = bucketed_ids(db.message_buckets, docs)
+    fresh = [doc for doc in docs if doc["_id"] not in present]
+    buckets = [bucket_doc(chat["_id"], chat.get("user_id"), fresh[start:start + size])
+               for start in range(0, len(fresh), size)]
+    if buckets:
+        db.message_buckets.insert_many(buckets, ordered=True)
+    db.messages.delete_many({"_id": {"$in": [doc["_id"] for doc in docs]}})
+    return len(fresh)
+
+
+def run_migration(batch_size: int = 50, pause: float = 0.2) -> dict:
+    state = db.job_state.find_one({"_id": STATE_ID}) or {}
+    last_chat_id = state.get("last_chat_id")
+    totals = {"chats": state.get("chats", 0), "messages": state.get("messages", 0)}
+
+    while True:
+        query = {"_id": {"$gt": last_chat_id}} if last_chat_id else {}
+        chats = db.chats.find(query, {"user_id": 1}).sort("_id", 1).limit(batch_size).to_list()
+        if not chats:
+            break
+
+        for chat in chats:
+            totals["messages"] += migrate_chat(chat)
+        totals["chats"] += len(chats)
+        last_chat_id = chats[-1]["_id"]
+        db.job_state.update_one(
+            {"_id": STATE_ID},
+            {"$set": {"last_chat_id": last_chat_id, **totals, "updated_at": datetime.now(UTC)}},
+            upsert=True
+        )
+        print(f"bucketed {totals['messages']} messages from {totals['chats']} chats")
+        # Yields the primary to live traffic between batches
+        time.sleep(pause)
+
+    return totals
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Pack per-message documents into message buckets")
+    parser.add_argument("--batch-size", type=int, default=50, help="Chats per batch")
+    parser.add_argument("--pause", type=float, default=0.2, help="Seconds to wait between batches")
+    args = parser.parse_args(argv)
+
+    if MESSAGE_STORAGE != "buckets":
+        print('Error: set MESSAGE_STORAGE = "buckets" for the app before migrating')
+        return
+    print(run_migration(args.batch_size, args.pause))
+
+
+if __name__ == "__main__":
+    main()
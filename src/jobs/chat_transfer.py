@@ -0,0 +1,207 @@
+"""Streams chats and messages to and from NDJSON or Parquet in fixed-size batches.
+
+    python -m src.jobs.chat_transfer export --format ndjson --path chats.ndjson [--user USER_ID]
+    python -m src.jobs.chat_transfer export --format parquet --path export_dir/
+    python -m src.jobs.chat_transfer import --format ndjson --path chats.ndjson --checkpoint chats.ckpt
+"""
+import argparse
+import json
+import os
+import time
+from itertools import islice
+import pyarrow as pa
+import pyarrow.parquet as pq
+from bson import ObjectId, json_util
+from pymongo.errors import BulkWriteError
+from src.config.db import get_db
+
+db = get_db()
+
+COLLECTIONS = ("chats", "messages", "message_buckets", "archived_chats")
+DUPLICATE_KEY = 11000
+
+# Flat columns for analytics; `doc` keeps the full extended-JSON document for lossless re-import
+SCHEMAS = {
+    "chats": pa.schema([
+        ("_id", pa.string()), ("user_id", pa.string()), ("title", pa.string()),
+        ("created_at", pa.timestamp("ms", tz="UTC")), ("updated_at", pa.timestamp("ms", tz="UTC")),
+        ("doc", pa.string()),
+    ]),
+    "messages": pa.schema([
+        ("_id", pa.string()), ("chat_id", pa.string()), ("user_id", pa.string()), ("role", pa.string()),
+        ("content", pa.string()), ("created_at", pa.timestamp("ms", tz="UTC")), ("doc", pa.string()),
+    ]),
+    "message_buckets": pa.schema([
+        ("_id", pa.string()), ("chat_id", pa.string()), ("user_id", pa.string()), ("count", pa.int32()),
+        ("first_at", pa.timestamp("ms", tz="UTC")), ("last_at", pa.timestamp("ms", tz="UTC")), ("doc", pa.string()),
+    ]),
+    # The compressed blob stays inside `doc`
+    "archived_chats": pa.schema([
+        ("_id", pa.string()), ("user_id", pa.string()), ("codec", pa.string()), ("count", pa.int32()),
+        ("first_at", pa.timestamp("ms", tz="UTC")), ("last_at", pa.timestamp("ms", tz="UTC")),
+        ("archived_at", pa.timestamp("ms", tz="UTC")), ("doc", pa.string()),
+    ]),
+}
+
+
+def batched(iterable, size: int):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def _str(value):
+    return None if value is None else str(value)
+
+
+def to_row(name: str, doc: dict) -> dict:
+    row = {"_id": str(doc["_id"]), "user_id": _str(doc.get("user_id")), "created_at": doc.get("created_at"),
+           "doc": json_util.dumps(doc)}
+    if name == "chats":
+        row.update(title=doc.get("title"), updated_at=doc.get("updated_at"))
+    elif name == "message_buckets":
+        row.pop("created_at")
+        row.update(chat_id=_str(doc.get("chat_id")), count=doc.get("count"), first_at=doc.get("first_at"),
+                   last_at=doc.get("last_at"))
+    elif name == "archived_chats":
+        row.pop("created_at")
+        row.update(codec=doc.get("codec"), count=doc.get("count"), first_at=doc.get("first_at"),
+                   last_at=doc.get("last_at"), archived_at=doc.get("archived_at"))
+    else:
+        message = doc.get("message", {})
+        row.update(chat_id=_str(doc.get("chat_id")), role=message.get("role"), content=message.get("content"))
+    return row
+
+
+def iter_docs(name: str, user_id: str | None, batch_size: int):
+    query = {"user_id": ObjectId(user_id)} if user_id else {}
+    return db.get_collection(name).find(query).sort("_id", 1).batch_size(batch_size)
+
+
+class Throughput:
+    def __init__(self, label: str):
+        self.label = label
+        self.rows = 0
+        self.started = time.perf_counter()
+
+    def add(self, rows: int):
+        self.rows += rows
+
+    def report(self):
+        elapsed = time.perf_counter() - self.started
+        rate = self.rows / elapsed if elapsed else 0.0
+        print(f"{self.label}: {self.rows} rows in {elapsed:.1f}s ({rate:,.0f} rows/s)")
+
+
+def export_ndjson(path: str, user_id: str | None, batch_size: int):
+    throughput = Throughput("export")
+    with open(path, "w", encoding="utf-8") as out:
+        for name in COLLECTIONS:
+            for batch in batched(iter_docs(name, user_id, batch_size), batch_size):
+                out.writelines(json_util.dumps({"collection": name, "doc": doc}) + "\n" for doc in batch)
+                throughput.add(len(batch))
+    throughput.report()
+
+
+def export_parquet(path: str, user_id: str | None, batch_size: int):
+    throughput = Throughput("export")
+    os.makedirs(path, exist_ok=True)
+    for name in COLLECTIONS:
+        with pq.ParquetWriter(os.path.join(path, f"{name}.parquet"), SCHEMAS[name], compression="zstd") as writer:
+            for batch in batched(iter_docs(name, user_id, batch_size), batch_size):
+                writer.write_batch(pa.RecordBatch.from_pylist([to_row(name, doc) for doc in batch], schema=SCHEMAS[name]))
+                throughput.add(len(batch))
+    throughput.report()
+
+
+def load_checkpoint(path: str | None) -> dict:
+    if path and os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    return {}
+
+
+def save_checkpoint(path: str | None, checkpoint: dict):
+    if not path:
+        return
+    # Written to a temp file and renamed so a crash never leaves a torn checkpoint
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(checkpoint, f)
+    os.replace(path + ".tmp", path)
+
+
+def insert_batch(name: str, docs: list[dict]):
+    try:
+        db.get_collection(name).insert_many(docs, ordered=False)
+    except BulkWriteError as e:
+        # Rows that already exist (from a previous, interrupted run) are fine
+        if any(error["code"] != DUPLICATE_KEY for error in e.details.get("writeErrors", [])):
+            raise
+
+
+def import_ndjson(path: str, checkpoint_path: str | None, batch_size: int):
+    checkpoint = load_checkpoint(checkpoint_path)
+    done = checkpoint.get("lines", 0)
+    throughput = Throughput("import")
+
+    with open(path, encoding="utf-8") as f:
+        for lines in batched(islice(f, done, None), batch_size):
+            grouped = {}
+            for line in lines:
+                record = json_util.loads(line)
+                grouped.setdefault(record["collection"], []).append(record["doc"])
+            for name, docs in grouped.items():
+                insert_batch(name, docs)
+
+            done += len(lines)
+            throughput.add(len(lines))
+            save_checkpoint(checkpoint_path, {"lines": done})
+    throughput.report()
+
+
+def import_parquet(path: str, checkpoint_path: str | None, batch_size: int):
+    checkpoint = load_checkpoint(checkpoint_path)
+    throughput = Throughput("import")
+
+    for name in COLLECTIONS:
+        file_path = os.path.join(path, f"{name}.parquet")
+        if not os.path.exists(file_path):
+            # Older exports have no message_buckets or archived_chats file
+            continue
+        done = checkpoint.get(name, 0)
+        parquet_file = pq.ParquetFile(file_path)
+        seen = 0
+        for record_batch in parquet_file.iter_batches(batch_size=batch_size, columns=["doc"]):
+            rows = record_batch.column(0).to_pylist()
+            skip = max(0, min(len(rows), done - seen))
+            seen += len(rows)
+            if skip == len(rows):
+                continue
+
+            insert_batch(name, [json_util.loads(doc) for doc in rows[skip:]])
+            throughput.add(len(rows) - skip)
+            checkpoint[name] = seen
+            save_checkpoint(checkpoint_path, checkpoint)
+    throughput.report()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export or import chats and messages")
+    parser.add_argument("action", choices=["export", "import"])
+    parser.add_argument("--format", choices=["ndjson", "parquet"], default="ndjson")
+    parser.add_argument("--path", required=True, help="NDJSON file, or directory for Parquet")
+    parser.add_argument("--user", help="Only export this user's chats")
+    parser.add_argument("--checkpoint", help="Resumable import progress file")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args(argv)
+
+    if args.action == "export":
+        exporter = export_ndjson if args.format == "ndjson" else export_parquet
+        exporter(args.path, args.user, args.batch_size)
+    else:
+        importer = import_ndjson if args.format == "ndjson" else import_parquet
+        importer(args.path, args.checkpoint, args.batch_size)
+
+
+if __name__ == "__main__":
+    main()
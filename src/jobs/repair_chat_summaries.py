@@ -0,0 +1,94 @@
+"""Recomputes the denormalised chat fields (message_count, last_message_preview, last_model,
+last_message_at, last_message_id, updated_at) from the messages themselves.
+
+    python -m src.jobs.repair_chat_summaries [--batch-size 200] [--user USER_ID]
+
+Safe to run while the app serves: counts are overwritten with what is stored at the time of the batch.
+Archived chats are skipped; their messages are no longer in either hot layout.
+"""
+import argparse
+from bson import ObjectId
+from pymongo import UpdateOne
+from src.config.db import get_db
+from src.repos.turn_writer import PREVIEW_CHARS
+
+db = get_db()
+
+
+def chat_messages_pipeline(chat_ids: list) -> list[dict]:
+    # Both storage layouts, unpacked into per-message documents
+    return [
+        {"$match": {"chat_id": {"$in": chat_ids}}},
+        {"$unionWith": {"coll": "message_buckets", "pipeline": [
+            {"$match": {"chat_id": {"$in": chat_ids}}},
+            {"$unwind": "$messages"},
+            {"$set": {"messages.chat_id": "$chat_id"}},
+            {"$replaceRoot": {"newRoot": "$messages"}},
+        ]}},
+        {"$sort": {"created_at": 1, "_id": 1}},
+    ]
+
+
+def summarise_chats(chat_ids: list) -> dict:
+    stats = db.messages.aggregate(chat_messages_pipeline(chat_ids) + [
+        {"$group": {
+            "_id": "$chat_id",
+            "message_count": {"$sum": 1},
+            "last_message_preview": {"$last": {"$substrCP": ["$message.content", 0, PREVIEW_CHARS]}},
+            "last_message_at": {"$last": "$created_at"},
+            # Live sync compares it with the ids a session shows
+            "last_message_id": {"$last": "$_id"},
+        }}
+    ])
+    summaries = {doc.pop("_id"): doc for doc in stats}
+
+    models = db.messages.aggregate(chat_messages_pipeline(chat_ids) + [
+        {"$match": {"model": {"$exists": True}}},
+        {"$group": {"_id": "$chat_id", "last_model": {"$last": "$model"}}}
+    ])
+    for doc in models:
+        summaries.setdefault(doc["_id"], {})["last_model"] = doc["last_model"]
+    return summaries
+
+
+def repair_batch(chats: list[dict]) -> int:
+    summaries = summarise_chats([chat["_id"] for chat in chats])
+    ops = []
+    for chat in chats:
+        summary = summaries.get(chat["_id"], {})
+        update = {"$set": {"message_count": summary.get("message_count", 0)}}
+        for field in ("last_message_preview", "last_model", "last_message_at", "last_message_id"):
+            if field in summary:
+                update["$set"][field] = summary[field]
+        if "last_message_at" in summary:
+            update["$max"] = {"updated_at": summary["last_message_at"]}
+        ops.append(UpdateOne({"_id": chat["_id"]}, update))
+    if ops:
+        db.chats.bulk_write(ops, ordered=False)
+    return len(ops)
+
+
+def run_repair(batch_size: int = 200, user_id: str | None = None) -> int:
+    query = {"archived": {"$ne": True}, **({"user_id": ObjectId(user_id)} if user_id else {})}
+    repaired = 0
+    last_id = None
+    while True:
+        page_query = {**query, "_id": {"$gt": last_id}} if last_id else query
+        chats = db.chats.find(page_query, {"_id": 1}).sort("_id", 1).limit(batch_size).to_list()
+        if not chats:
+            return repaired
+        repaired += repair_batch(chats)
+        last_id = chats[-1]["_id"]
+        print(f"repaired {repaired} chats")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Backfill denormalised chat summary fields")
+    parser.add_argument("--batch-size", type=int, default=200)
+    parser.add_argument("--user", help="Only repair this user's chats")
+    args = parser.parse_args(argv)
+    print(run_repair(args.batch_size, args.user))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""Folds new messages into per-user, per-day usage totals in `usage_daily`.
+
+Each run recomputes whole days, from the start of the day the last run stopped in, and replaces them,
+so a run that overlaps another or crashes before saving its high-water mark never counts twice.
+
+    python -m src.jobs.usage_rollup
+"""
+from datetime import datetime, timedelta, UTC
+from src.config.db import get_db
+from src.repos.migrations import migration
+
+STATE_ID = "usage_daily"
+# Messages reach Mongo through the write-behind queue, so the newest few minutes are left for the next run
+SETTLE_DELAY = timedelta(minutes=2)
+COUNTERS = ("messages", "user_messages", "model_messages", "cached_responses",
+            "prompt_tokens", "output_tokens", "total_tokens", "latency_ms")
+
+
+def _role_count(role: str) -> dict:
+    return {"$sum": {"$cond": [{"$eq": ["$message.role", role]}, 1, 0]}}
+
+
+def _sum_of(field: str) -> dict:
+    return {"$sum": {"$ifNull": [f"${field}", 0]}}
+
+
+def day_start(moment: datetime) -> datetime:
+    return moment.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def rollup_pipeline(since: datetime | None, until: datetime) -> list[dict]:
+    """Totals of the whole days from `since`'s day through `until`, merged over the stored ones."""
+    created_at = {"$lte": until}
+    if since:
+        created_at["$gte"] = day_start(since)
+
+    bucket_match = {"last_at": {"$gte": day_start(since)}} if since else {}
+    return [
+        {"$match": {"created_at": created_at, "user_id": {"$exists": True}}},
+        # Bucketed messages (MESSAGE_STORAGE = "buckets") are unpacked into the same shape
+        {"$unionWith": {"coll": "message_buckets", "pipeline": [
+            {"$match": bucket_match},
+            {"$unwind": "$messages"},
+            {"$set": {"messages.user_id": "$user_id"}},
+            {"$replaceRoot": {"newRoot": "$messages"}},
+            {"$match": {"created_at": created_at}},
+        ]}},
+        {"$group": {
+            "_id": {"user_id": "$user_id", "day": {"$dateTrunc": {"date": "$created_at", "unit": "day"}}},
+            "messages": {"$sum": 1},
+            "user_messages": _role_count("user"),
+            "model_messages": _role_count("model"),
+            "cached_responses": {"$sum": {"$cond": ["$cached", 1, 0]}},
+            "prompt_tokens": _sum_of("usage.prompt_tokens"),
+            "output_tokens": _sum_of("usage.output_tokens"),
+            "total_tokens": _sum_of("usage.total_tokens"),
+            "latency_ms": _sum_of("latency_ms"),
+        }},
+        {"$set": {"user_id": "$_id.user_id", "day": "$_id.day"}},
+        {"$merge": {
+            "into": "usage_daily",
+            "on": "_id",
+            # Every day in the window is recomputed in full, so replacing it is idempotent
+            "whenMatched": "replace",
+            "whenNotMatched": "insert"
+        }}
+    ]
+
+
+def run_rollup(now: datetime | None = None) -> dict:
+    db = get_db()
+    state = db.rollup_state.find_one({"_id": STATE_ID}) or {}
+    since = state.get("high_water")
+    until = (now or datetime.now(UTC)) - SETTLE_DELAY
+
+    if since and since.replace(tzinfo=UTC) >= until:
+        return {"since": since, "until": until, "skipped": True}
+
+    db.messages.aggregate(rollup_pipeline(since, until))
+    # $max: a slower overlapping run never moves the mark back
+    db.rollup_state.update_one(
+        {"_id": STATE_ID},
+        {"$max": {"high_water": until}, "$set": {"updated_at": datetime.now(UTC)}},
+        upsert=True
+    )
+    return {"since": since, "until": until, "skipped": False}
+
+
+@migration(9, "messages(created_at) and usage_daily(day, user_id) for rollups")
+def _create_usage_indexes(db):
+    db.messages.create_index("created_at")
+    db.usage_daily.create_index([("day", 1), ("user_id", 1)])
+
+
+if __name__ == "__main__":
+    print(run_rollup())
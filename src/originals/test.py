@@ -1,6 +1,7 @@
 import streamlit as st
 from google import genai
 from google.genai import types
+from src.components.stream_renderer import StreamRenderer
 
 # Use an empty string for the API key in this canvas environment.
 api_key = ""
@@ -140,14 +141,9 @@ if prompt := st.chat_input("Type your message..."):
                 contents=contents,  # Pass the entire conversation history
             )
 
-            # Iterate through the stream and update the placeholder
-            for chunk in response_stream:
-                full_response += chunk.text
-                # Display the partial response with a cursor effect
-                placeholder.markdown(full_response + "▌")
-
-            # Final display without the cursor
-            placeholder.markdown(full_response)
+            # Buffered, frame-rate-limited rendering with a final flush without the cursor
+            renderer = StreamRenderer(placeholder)
+            full_response = renderer.render(response_stream)
 
         except Exception as e:
             st.error(f"Error: {type(e).__name__} - {str(e)}")
@@ -0,0 +1,78 @@
+import pyarrow as pa
+import streamlit as st
+from src.config import ADMIN_EMAILS
+from src.config.gemini_client import get_gemini_scheduler
+from src.config.warmup import warmup
+from src.repos.message_repo import get_message_write_queue
+from src.utils.instrumentation import registry
+from src.utils.session_manager import get_session_manager
+
+st.set_page_config(page_title="Metrics", page_icon="⏱️", layout="wide")
+
+session_manager = get_session_manager()
+
+if not session_manager.ready():
+    st.stop()
+
+current_user = session_manager.current_user()
+
+if current_user is None or current_user.get("email") not in ADMIN_EMAILS:
+    st.warning("This page is only available to administrators.")
+    st.stop()
+
+st.title("⏱️ Hot-path Metrics")
+
+if st.button("🔄 Refresh"):
+    st.rerun()
+
+snapshot = registry.snapshot()
+scheduler = get_gemini_scheduler()
+
+status = warmup.status()
+if not status["healthy"]:
+    st.warning(f"Warm-up {'failed' if status['errors'] else 'still running'}: {status['errors'] or status['steps']}")
+
+col1, col2, col3 = st.columns(3)
+col1.metric("Model queue", scheduler.stats()["queued"])
+col2.metric("Model calls in flight", scheduler.stats()["active"])
+col3.metric("Pending message writes", get_message_write_queue().depth())
+
+
+def to_frame(rows):
+    return pa.Table.from_pylist(rows).to_pandas() if rows else None
+
+
+# Latencies are shown in milliseconds; rates stay as they are
+histograms = []
+for h in snapshot["histograms"]:
+    scale = 1 if h["name"] == "model_tokens_per_second" else 1000
+    histograms.append({
+        "metric": h["name"],
+        "labels": ", ".join(f"{key}={value}" for key, value in h["labels"].items()),
+        "count": h["count"],
+        "mean": h["sum"] / h["count"] * scale if h["count"] else None,
+        **{q: h[q] * scale if h[q] is not None else None for q in ("p50", "p95", "p99")}
+    })
+
+st.subheader("Histograms (ms, tokens/s for rates)")
+if histograms:
+    st.dataframe(to_frame(sorted(histograms, key=lambda row: (row["metric"], row["labels"]))),
+                 use_container_width=True, hide_index=True)
+else:
+    st.info("Nothing recorded yet.")
+
+if snapshot["counters"]:
+    st.subheader("Counters")
+    st.dataframe(to_frame([{**c, "labels": str(c["labels"])} for c in snapshot["counters"]]),
+                 use_container_width=True, hide_index=True)
+
+st.subheader("Slow queries")
+if snapshot["slow_queries"]:
+    st.dataframe(to_frame(list(reversed(snapshot["slow_queries"]))), use_container_width=True, hide_index=True)
+else:
+    st.caption("None recorded (set SLOW_QUERY_MS to enable).")
+
+with st.expander("Prometheus text"):
+    st.code(registry.prometheus_text(), language="text")
+
+st.download_button("⬇️ Download JSON", registry.to_json(), file_name="metrics.json", mime="application/json")
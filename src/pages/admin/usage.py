@@ -0,0 +1,72 @@
+from datetime import datetime, timedelta, UTC
+import pyarrow as pa
+import streamlit as st
+from src.config import ADMIN_EMAILS
+from src.config.db import get_db
+from src.config.warmup import warmup
+from src.jobs.usage_rollup import COUNTERS, run_rollup
+from src.utils.session_manager import get_session_manager
+
+st.set_page_config(page_title="Usage", page_icon="📊", layout="wide")
+
+session_manager = get_session_manager()
+
+if not session_manager.ready():
+    st.stop()
+
+current_user = session_manager.current_user()
+
+if current_user is None or current_user.get("email") not in ADMIN_EMAILS:
+    st.warning("This page is only available to administrators.")
+    st.stop()
+
+st.title("📊 Model Usage")
+
+
+@st.cache_data(ttl=60)
+def load_usage(start: datetime):
+    # Rollups are tiny compared to messages, so months of them load in one indexed read
+    rows = list(get_db().usage_daily.find(
+        {"day": {"$gte": start}},
+        {"_id": 0, "user_id": 1, "day": 1, **{counter: 1 for counter in COUNTERS}}
+    ))
+    for row in rows:
+        row["user_id"] = str(row["user_id"])
+    return pa.Table.from_pylist(rows).to_pandas() if rows else None
+
+
+col1, col2 = st.columns([3, 1])
+with col1:
+    days = st.slider("Days", min_value=7, max_value=365, value=30)
+with col2:
+    if st.button("🔄 Run rollup now", use_container_width=True):
+        warmup.require_database()
+        result = run_rollup()
+        load_usage.clear()
+        st.success(f"Rolled up messages until {result['until']:%Y-%m-%d %H:%M} UTC")
+
+usage = load_usage(datetime.now(UTC).replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=days))
+
+if usage is None:
+    st.info("No usage has been rolled up yet.")
+    st.stop()
+
+daily = usage.groupby("day")[list(COUNTERS)].sum()
+daily["avg_latency_ms"] = daily["latency_ms"] / daily["model_messages"].where(daily["model_messages"] > 0)
+
+metric1, metric2, metric3 = st.columns(3)
+metric1.metric("Messages", f"{int(daily['messages'].sum()):,}")
+metric2.metric("Tokens", f"{int(daily['total_tokens'].sum()):,}")
+metric3.metric("Active users", f"{usage['user_id'].nunique():,}")
+
+st.subheader("Tokens per day")
+st.line_chart(daily[["prompt_tokens", "output_tokens"]])
+
+st.subheader("Average model latency (ms)")
+st.line_chart(daily[["avg_latency_ms"]])
+
+st.subheader("Top users")
+st.dataframe(
+    usage.groupby("user_id")[list(COUNTERS)].sum().sort_values("total_tokens", ascending=False).head(50),
+    use_container_width=True
+)
@@ -1,201 +1,485 @@
-import json
+import asyncio
+from functools import partial
 import streamlit as st
 from bson import ObjectId
 from google.genai import types
-from pymongo import DESCENDING
-from datetime import datetime, UTC
-from src.config import COOKIE_PREFIX, SECRET_KEY
-from src.config.gemini_client import client
+from datetime import datetime, timedelta, UTC
+from src.config import (CONTEXT_KEEP_TURNS, CONTEXT_TOKEN_BUDGET, GEMINI_MODEL, LIVE_SYNC, LIVE_SYNC_SECONDS,
+                        TRANSCRIPT_WINDOW)
+from src.components.stream_renderer import StreamRenderer
+from src.components.transcript import Transcript
+from src.config.async_runtime import log_failure, run, submit
+from src.config.gemini_client import get_gemini_scheduler
+from src.config.warmup import warmup
+from src.repos.async_chat_repo import AsyncChatRepository
+from src.repos.change_feed import get_change_feed
 from src.repos.chat_repo import ChatRepository
 from src.repos.message_repo import MessageRepository
-from src.utils.cookie_manager import CookieManger
+from src.repos.response_cache import get_response_cache, replay_chunks
+from src.utils.chat_history import ChatHistory
+from src.utils.context_window import ContextWindow, message_cursor, model_summarizer
+from src.utils.event_bus import get_event_bus
+from src.utils.instrumentation import fragment_span
+from src.utils.session_manager import get_session_manager
 
 st.set_page_config(page_title="Chat", page_icon="💬", layout="centered")
 
-cookie_manager = CookieManger(COOKIE_PREFIX, SECRET_KEY)
+session_manager = get_session_manager()
 
-if not cookie_manager.ready():
+if not session_manager.ready():
     st.stop()
 
 # --- Page Layout ---
-current_user = cookie_manager.get("user")
+current_user = session_manager.current_user()
 
-if current_user == "":
+if current_user is None:
     st.warning("You’re not logged in! Go to the Login page.")
     st.switch_page("src/pages/auth/login.py")
 
-current_user = json.loads(current_user)
+warmup.require_database()
+
 chat_repo = ChatRepository()
+async_chat_repo = AsyncChatRepository()
 message_repo = MessageRepository()
+response_cache = get_response_cache()
+scheduler = get_gemini_scheduler()
 default_message = {"role": "model", "content": "Hi! I'm Ajax. Ask me anything!"}
+MESSAGE_PAGE_SIZE = 50
+CHAT_PAGE_SIZE = 20
+SEARCH_PAGE_SIZE = 10
+# Live messages older than the chat's load by more than this are moves between tiers, not new turns
+LIVE_GRACE = timedelta(seconds=60)
+
+
+def new_history(docs=(), chat=None):
+    chat = chat or {}
+    window = ContextWindow(
+        summary=chat.get("summary", ""),
+        summary_cursor=chat.get("summary_cursor"),
+        keep_turns=CONTEXT_KEEP_TURNS,
+        token_budget=CONTEXT_TOKEN_BUDGET
+    )
+    return ChatHistory.from_docs(list(docs), window)
+
+
+def new_message_doc(message: dict):
+    # _id and created_at are fixed up front so the doc doubles as a context-window cursor
+    now = datetime.now(UTC)
+    return {
+        "_id": ObjectId(),
+        "user_id": ObjectId(current_user['_id']),
+        "message": message,
+        "created_at": now,
+        "updated_at": now
+    }
+
+
+def fresh_history():
+    history = new_history()
+    # The greeting is saved with the chat's first prompt under this same id, so live sync knows it is here
+    greeting = new_message_doc(default_message)
+    history.append(default_message, message_cursor(greeting), str(greeting["_id"]))
+    st.session_state.greeting_doc = greeting
+    return history
+
 
 # --- State Initialization ---
 # Initialize chat history (current session)
-if "messages" not in st.session_state:
-    st.session_state.messages = [default_message]
+# The history keeps display dicts and built Gemini Content together; it is only rebuilt on chat switch
+if "history" not in st.session_state:
+    st.session_state.history = fresh_history()
     st.session_state.current_chat_id = ""
+    st.session_state.messages_cursor = None
+    st.session_state.chat_archived = False
+    st.session_state.live_since = datetime.now(UTC).replace(tzinfo=None)
 
-# Initialize past chat storage
-if "past_chats" not in st.session_state:
-    st.session_state.past_chats = []
 # Initialize a title for the current chat session
 if "current_chat_title" not in st.session_state:
     st.session_state.current_chat_title = "New Chat"
 
 def start_new_chat():
-    st.session_state.messages = [default_message]
+    st.session_state.history = fresh_history()
     st.session_state.current_chat_title = "New Chat"
+    st.session_state.messages_cursor = None
+    st.session_state.chat_archived = False
+    st.session_state.live_since = datetime.now(UTC).replace(tzinfo=None)
+    transcript().reset()
     st.rerun()
 
 
 def load_past_chat(loaded_chat_id):
     try:
-        loaded_chat = chat_repo.chat_with_messages(loaded_chat_id)[0]
-
-        st.session_state.messages = []
-
-        for message in loaded_chat['messages']:
-            st.session_state.messages.append(message['message'])
+        loaded_chat = run(async_chat_repo.chat_with_messages(
+            loaded_chat_id, limit=MESSAGE_PAGE_SIZE, user_id=current_user['_id']
+        ))
+        docs, cursor = loaded_chat['messages'], loaded_chat['messages_cursor']
+
+        # Messages newer than the summary but older than the first page would reach the model neither
+        # verbatim nor summarized, so the window is filled back to the summary; the fold below catches up
+        covered = ContextWindow(summary_cursor=loaded_chat.get("summary_cursor")).covers
+        while cursor and not covered(docs[0]):
+            older, cursor = message_repo.list_messages(
+                loaded_chat_id, limit=MESSAGE_PAGE_SIZE, before=cursor, user_id=current_user['_id'],
+                archived=bool(loaded_chat.get("archived"))
+            )
+            docs[:0] = older
 
+        st.session_state.history = new_history(docs, loaded_chat)
+        st.session_state.messages_cursor = cursor
+        st.session_state.chat_archived = bool(loaded_chat.get("archived"))
+        st.session_state.live_since = datetime.now(UTC).replace(tzinfo=None)
         st.session_state.current_chat_title = loaded_chat["title"]
         st.session_state.current_chat_id = loaded_chat_id
+        transcript().reset()
+        start_fold(current_user['_id'], loaded_chat_id)
         st.rerun()
 
     except Exception as e:
         print(f"Error: {type(e).__name__} - {str(e)}")
 
 
-# --- Sidebar: History & Settings ---
-with (st.sidebar):
-    st.markdown("## Current Session")
-    # Button to start a new chat
-    if st.button("➕ Start New Chat", use_container_width=True):
-        start_new_chat()
-
-    st.markdown("---")
-    st.markdown("## Chat History")
-    past_chats = []
-
+def load_earlier_messages():
+    # Runs as a button callback, before the rerun that draws the grown window
+    if not st.session_state.get("messages_cursor"):
+        return
     try:
-        past_chats = chat_repo.collection.find(
-            {"user_id": ObjectId(current_user['_id'])}
-        ).sort("updated_at", DESCENDING).to_list()
+        older, cursor = message_repo.list_messages(
+            st.session_state.current_chat_id,
+            limit=MESSAGE_PAGE_SIZE,
+            before=st.session_state.messages_cursor,
+            user_id=current_user['_id'],
+            archived=st.session_state.get("chat_archived", False)
+        )
 
-        for chat in past_chats:
-            chat['_id'] = str(chat['_id'])
-            chat['user_id'] = str(chat['user_id'])
+        st.session_state.history.prepend_docs(older)
+        st.session_state.messages_cursor = cursor
 
     except Exception as e:
         st.error(f"Error: {type(e).__name__} - {str(e)}")
 
-    st.session_state.past_chats = past_chats
 
-    if st.session_state.past_chats:
-        for i, chat in enumerate(st.session_state.past_chats):
-            display_title = chat["title"]
-            chat_id = chat['_id']
+def transcript():
+    return Transcript(st.session_state.history, TRANSCRIPT_WINDOW, load_earlier_messages)
 
-            col1, col2 = st.columns([4, 2])
-            with col1:
-                st.markdown(f"**{display_title}**", )
-            with col2:
-                if st.button("Load", key=f"load_{i}"):
-                    load_past_chat(chat_id)
-    else:
-        st.info("No past chats saved yet.")
 
-# --- App UI ---
-st.title("Ajax Chat AI")
-st.caption(f"Powered by Sly • **Session: {st.session_state.current_chat_title}**")
+def show_more(state_key: str):
+    # Button callback; the click's own (fragment) rerun then draws the extra page
+    st.session_state[state_key] += 1
+
+
+async def fold_summary(chat_id: str, summarize, summary: str, turns: list[dict], summary_cursor: str | None):
+    # The summary is a blocking model call, so it runs on a worker thread instead of on the loop
+    summary = await asyncio.to_thread(summarize, summary, turns)
+    await async_chat_repo.update_summary(chat_id, summary, summary_cursor)
+    return summary
+
+
+def start_fold(user_id: str, chat_id: str):
+    """Folds the window's pending turns into its summary on the background loop; `apply_fold` takes the
+    result on a later run. One fold per session at a time."""
+    apply_fold()
+    history = st.session_state.history
+    window = history.window
+    if "folding" in st.session_state or not window.needs_fold():
+        return
+
+    turns = list(window.pending)
+    summarizer = model_summarizer(partial(scheduler.generate_content, user_id), GEMINI_MODEL)
+    folding = submit(fold_summary(chat_id, summarizer, window.summary, turns, window.fold_cursor(turns)))
+    folding.add_done_callback(log_failure(f"fold_summary {chat_id}"))
+    st.session_state.folding = (folding, history, turns)
+
 
-# Display history
-for msg in st.session_state.messages:
-    # Map 'model' role to 'assistant' for the Streamlit icon
-    with st.chat_message(msg["role"] if msg["role"] != "model" else "assistant"):
-        st.markdown(msg["content"])
+def apply_fold():
+    folding = st.session_state.get("folding")
+    if not folding or not folding[0].done():
+        return
+    del st.session_state.folding
+    future, history, turns = folding
+    # A failed fold leaves its turns pending for the next one; a chat switched away from keeps its own window
+    if history is st.session_state.history and not future.cancelled() and future.exception() is None:
+        history.window.folded(future.result(), turns)
+
+
+def send_prompt(prompt: str, user_id: str):
+    apply_fold()
+    history = st.session_state.history
+    window = history.window
+    is_new_chat = st.session_state.current_chat_title == "New Chat"
+    messages = [dict(st.session_state.greeting_doc)] if is_new_chat else []
 
-# Chat input
-if prompt := st.chat_input("Type your message..."):
     new_user_message = {"role": "user", "content": prompt}
-    st.session_state.messages.append(new_user_message)
+    user_doc = new_message_doc(new_user_message)
+    messages.append(user_doc)
+    history.append(new_user_message, message_cursor(user_doc), str(user_doc["_id"]))
 
     with st.chat_message("user"):
         st.markdown(prompt)
 
+    # The prompt is queued for persistence before the model call, so a failed stream never loses it;
+    # a new chat's first messages wait for the chat insert, so they never point at a chat that does not exist
+    new_chat_future = None
+    try:
+        current_chat_id = st.session_state.current_chat_id
+
+        if is_new_chat:
+            # The chat insert runs on the event loop while the model streams
+            new_title = prompt[:30].strip() + "..."
+            st.session_state.current_chat_title = new_title
+            current_chat_id = str(ObjectId())
+            new_chat_future = submit(async_chat_repo.create_chat({
+                "_id": ObjectId(current_chat_id),
+                "user_id": ObjectId(user_id),
+                "title": new_title,
+                "created_at": datetime.now(UTC),
+                "updated_at": datetime.now(UTC)
+            }))
+            new_chat_future.add_done_callback(log_failure(f"create_chat {current_chat_id}"))
+            st.session_state.current_chat_id = current_chat_id
+
+        for message in messages:
+            message["chat_id"] = ObjectId(current_chat_id)
+        if not new_chat_future:
+            message_repo.enqueue_messages(messages, user_id)
+        if st.session_state.get("chat_archived"):
+            # A new turn makes an archived chat active again
+            async_chat_repo.promote(current_chat_id)
+
+    except Exception as e:
+        st.error(f"Error: {type(e).__name__} - {str(e)}")
+        st.stop()
+
     # Stream response
     with st.chat_message("assistant"):
         placeholder = st.empty()
         full_response = ""
+        renderer = StreamRenderer(placeholder)
+        cached = None
 
         try:
-            # Convert Streamlit's simple history format into the SDK's expected Content/Part format
-            contents = []
-            for m in st.session_state.messages:
-                # Map Streamlit role ('user', 'model') to the SDK's role ('user', 'model')
-                role = m['role'] if m['role'] != 'assistant' else 'model'
-                contents.append(
-                    types.Content(
-                        role=role,
-                        parts=[types.Part.from_text(text=m['content'])]
-                    )
+            # Only the budgeted window is sent; older turns reach the model through the rolling summary
+            turns = window.request_turns()
+            system_instruction = window.system_instruction()
+
+            cached = response_cache.lookup(GEMINI_MODEL, turns, system_instruction, user_id)
+            if cached:
+                # Cache hits replay through the same renderer as a live stream
+                full_response = renderer.render(replay_chunks(cached["text"]))
+            else:
+                # The shared scheduler queues fairly across users and retries 429/503 with backoff
+                response_stream = scheduler.generate_content_stream_aio(
+                    user_id,
+                    tokens=sum(turn["tokens"] for turn in turns),
+                    on_wait=lambda position, waited: placeholder.info(
+                        f"⏳ Waiting for a model slot: position {position} in queue ({waited:.0f}s)"
+                    ),
+                    model=GEMINI_MODEL,
+                    contents=history.request_contents(turns),
+                    config=types.GenerateContentConfig(system_instruction=system_instruction)
                 )
 
-            # Use generate_content_stream for real-time output
-            response_stream = client.models.generate_content_stream(
-                model="gemini-2.5-flash",
-                contents=contents,  # Pass the entire conversation history
-            )
-
-            # Iterate through the stream and update the placeholder
-            for chunk in response_stream:
-                full_response += chunk.text
-                # Display the partial response with a cursor effect
-                placeholder.markdown(full_response + "▌")
+                # Buffered, frame-rate-limited rendering with a final flush without the cursor
+                full_response = renderer.render(response_stream)
+                response_cache.store(GEMINI_MODEL, turns, system_instruction, full_response, renderer.total_time,
+                                     user_id)
 
-            # Final display without the cursor
-            placeholder.markdown(full_response)
+            st.session_state.last_stream_stats = renderer.stats()
 
         except Exception as e:
             st.error(f"Error: {type(e).__name__} - {str(e)}")
             full_response = "Sorry, something went wrong. Try again!"
 
     try:
-        current_chat_id = st.session_state.current_chat_id
-        messages = []
-
-        if st.session_state.current_chat_title == "New Chat":
-            new_title = prompt[:30].strip() + "..."
-            st.session_state.current_chat_title = new_title
-            current_chat_id = chat_repo.create_chat({
-                "user_id": ObjectId(current_user['_id']),
-                "title": new_title,
-                "created_at": datetime.now(UTC),
-                "updated_at": datetime.now(UTC)
-            })
-
-            messages.append({
-                "chat_id": ObjectId(current_chat_id),
-                "message": default_message,
-                "created_at": datetime.now(UTC),
-                "updated_at": datetime.now(UTC)
-            })
+        if new_chat_future:
+            new_chat_future.result()
+            message_repo.enqueue_messages(messages, user_id)
 
         new_ajax_message = {"role": "model", "content": full_response}
-        st.session_state.messages.append(new_ajax_message)
-
-        messages.append({
-            "chat_id": ObjectId(current_chat_id),
-            "message": new_user_message,
-            "created_at": datetime.now(UTC),
-            "updated_at": datetime.now(UTC)
+        ajax_doc = new_message_doc(new_ajax_message)
+        ajax_doc["chat_id"] = ObjectId(current_chat_id)
+        # Usage and latency feed the usage_daily rollup
+        ajax_doc.update({
+            "model": GEMINI_MODEL,
+            "cached": bool(cached),
+            "usage": renderer.usage_counts(),
+            "latency_ms": round((renderer.total_time or 0) * 1000),
+            "ttft_ms": round((renderer.time_to_first_token or 0) * 1000)
         })
-        messages.append({
-            "chat_id": ObjectId(current_chat_id),
-            "message": new_ajax_message,
-            "created_at": datetime.now(UTC),
-            "updated_at": datetime.now(UTC)
-        })
-        message_repo.collection.insert_many(messages)
+        history.append(new_ajax_message, message_cursor(ajax_doc), str(ajax_doc["_id"]))
+        message_repo.enqueue_messages([ajax_doc], user_id)
+
+        # Folding starts after the reply is on screen and runs in the background, so it never holds up a turn
+        start_fold(user_id, current_chat_id)
 
     except Exception as e:
         st.error(f"Error: {type(e).__name__} - {str(e)}")
+
+    if is_new_chat:
+        # The sidebar fragment only lists the new chat after an app rerun
+        st.rerun()
+
+
+# --- Sidebar: History & Settings ---
+# Searching and paging rerun only this fragment; Load and New Chat change the conversation, so they rerun the app
+@st.fragment
+def sidebar_history(user_id: str):
+    with fragment_span("sidebar"):
+        st.markdown("## Current Session")
+        # Button to start a new chat
+        if st.button("➕ Start New Chat", use_container_width=True):
+            start_new_chat()
+
+        st.markdown("---")
+        search_query = st.text_input("🔍 Search chats", key="chat_search_query").strip()
+
+        if search_query:
+            if st.session_state.get("search_for") != search_query:
+                st.session_state.search_for = search_query
+                st.session_state.search_pages_shown = 1
+
+            search_hits = []
+            search_cursor = None
+
+            try:
+                for _ in range(st.session_state.search_pages_shown):
+                    page, search_cursor = chat_repo.search_chats(
+                        user_id, search_query, limit=SEARCH_PAGE_SIZE, cursor=search_cursor
+                    )
+                    search_hits.extend(page)
+                    if not search_cursor:
+                        break
+
+            except Exception as e:
+                st.error(f"Error: {type(e).__name__} - {str(e)}")
+
+            for hit in search_hits:
+                col1, col2 = st.columns([4, 2])
+                with col1:
+                    st.markdown(f"**{hit['title']}**")
+                    st.caption(hit["snippet"])
+                with col2:
+                    if st.button("Load", key=f"search_load_{hit['_id']}"):
+                        load_past_chat(hit['_id'])
+
+            if not search_hits:
+                st.info("No matching chats.")
+            elif search_cursor:
+                st.button("More results", use_container_width=True, on_click=show_more, args=("search_pages_shown",))
+
+        st.markdown("---")
+
+
+# --- Live sync: turns and chats written in other tabs, devices or replicas ---
+def live_subscription(user_id: str):
+    subscription = st.session_state.get("live_subscription")
+    if subscription is None or subscription.topic != user_id:
+        subscription = st.session_state.live_subscription = get_event_bus().subscribe(user_id)
+    return subscription
+
+
+def apply_live_events(user_id: str) -> bool:
+    """Applies the changes published since the last run; returns whether the chat list needs reading again.
+
+    A message appended to the open chat reruns the app, since the conversation is another fragment.
+    """
+    events, overflowed = live_subscription(user_id).drain()
+    current_chat_id = st.session_state.current_chat_id
+    if overflowed and current_chat_id:
+        # Some changes were dropped; reloading is the only way to be sure nothing is missing
+        load_past_chat(current_chat_id)
+
+    history = st.session_state.history
+    stale, appended = overflowed, False
+    for event in events:
+        if event["type"] == "chat":
+            # This session's own turns, and the summaries folded from them, need no refresh
+            stale |= event["chat_id"] != current_chat_id or event.get("last_message_id") not in history.ids
+        elif (event["chat_id"] == current_chat_id
+              and event["doc"]["created_at"] > st.session_state.live_since - LIVE_GRACE
+              and history.append_doc(event["doc"])):
+            appended = True
+    if appended:
+        st.rerun()
+    return stale
+
+
+# With LIVE_SYNC the list polls for changes on its own; it is only read again when one is not on screen yet
+@st.fragment(run_every=LIVE_SYNC_SECONDS if LIVE_SYNC else None)
+def chat_list(user_id: str):
+    with fragment_span("chat_list"):
+        st.markdown("## Chat History")
+
+        if "chat_pages_shown" not in st.session_state:
+            st.session_state.chat_pages_shown = 1
+
+        stale = st.session_state.pop("chat_list_stale", False)
+        if LIVE_SYNC:
+            stale |= apply_live_events(user_id)
+        shown = st.session_state.get("chat_list")
+        if stale or shown is None or shown[0] != st.session_state.chat_pages_shown:
+            past_chats = []
+            next_cursor = None
+
+            try:
+                for _ in range(st.session_state.chat_pages_shown):
+                    page, next_cursor = run(async_chat_repo.list_chats(user_id, limit=CHAT_PAGE_SIZE, after=next_cursor))
+                    past_chats.extend(page)
+                    if not next_cursor:
+                        break
+                st.session_state.chat_list = (st.session_state.chat_pages_shown, past_chats, next_cursor)
+
+            except Exception as e:
+                st.error(f"Error: {type(e).__name__} - {str(e)}")
+        else:
+            _, past_chats, next_cursor = shown
+
+        if past_chats:
+            for chat in past_chats:
+                display_title = chat["title"]
+                chat_id = chat['_id']
+
+                col1, col2 = st.columns([4, 2])
+                with col1:
+                    st.markdown(f"**{display_title}**", )
+                    # Summary fields come with the sidebar page itself; no per-chat query
+                    if chat.get("last_message_preview"):
+                        st.caption(f"{chat.get('message_count', 0)} messages · {chat['last_message_preview']}")
+                with col2:
+                    if st.button("Load", key=f"load_{chat_id}"):
+                        load_past_chat(chat_id)
+
+            if next_cursor:
+                st.button("Show more", use_container_width=True, on_click=show_more, args=("chat_pages_shown",))
+        else:
+            st.info("No past chats saved yet.")
+
+
+if LIVE_SYNC:
+    get_change_feed()
+
+with st.sidebar:
+    sidebar_history(current_user['_id'])
+    # An app rerun always reads the list again; its own reruns only when something changed
+    st.session_state.chat_list_stale = True
+    chat_list(current_user['_id'])
+
+
+# --- App UI ---
+st.title("Ajax Chat AI")
+
+
+# A prompt or "Load earlier messages" reruns only this fragment, not the session check and sidebar
+@st.fragment
+def conversation(user_id: str):
+    with fragment_span("conversation"):
+        st.caption(f"Powered by Sly • **Session: {st.session_state.current_chat_title}**")
+
+        # Only the newest TRANSCRIPT_WINDOW messages are drawn; older pages are fetched on demand
+        transcript().render(has_older_pages=bool(st.session_state.get("messages_cursor")))
+
+        if prompt := st.chat_input("Type your message..."):
+            send_prompt(prompt, user_id)
+
+
+conversation(current_user['_id'])
+
@@ -1,29 +1,37 @@
 import streamlit as st
 from src.components.modal import alert_modal
-from src.config import SECRET_KEY, COOKIE_PREFIX
-from src.config.db import db
+from src.config.warmup import warmup
 from src.repos.user_repo import UserRepository
-from src.utils.password_util import verify_password
-import json
-from src.utils.cookie_manager import CookieManger
+from src.utils.password_util import get_login_limiter, get_password_service
+from src.utils.session_manager import get_session_manager
 
 st.set_page_config(page_title="Login", page_icon="🔑", layout="centered")
 
-cookie_manager = CookieManger(COOKIE_PREFIX, SECRET_KEY)
+session_manager = get_session_manager()
 
-if not cookie_manager.ready():
+if not session_manager.ready():
     st.stop()
 
 st.title("🔑 Login To Your Account")
 
 def login_user(email: str, password: str):
     user_repo = UserRepository()
+    password_service = get_password_service()
+    limiter = get_login_limiter()
+
+    # Checked before any bcrypt work, so brute-force traffic cannot tie up the hashing pool
+    if not limiter.allow(email.lower()):
+        return {"error": True, "message": "Too many login attempts. Try again in a few minutes."}
 
     try:
-        # collection = db["admins"]
         user = user_repo.collection.find_one({"email": email})
         if user:
-            valid_password = verify_password(password, user['password'])
+            valid_password = password_service.verify_password(password, user['password'])
+            if valid_password:
+                limiter.reset(email.lower())
+                # Hashes made at an older, cheaper cost are upgraded while we have the plain password
+                if password_service.needs_rehash(user['password']):
+                    user_repo.update_password(str(user["_id"]), password_service.hash_password(password))
             user["_id"] = str(user["_id"])
             del user['password']
             return {"error": False, "message": None, "user": user} if valid_password else {"error": True, "message": "Invalid password"}
@@ -46,11 +54,12 @@ with st.form("login", clear_on_submit=False):
         if not email or not password:
             alert_modal("Please fill in all fields.")
         else:
+            warmup.require_database()
             result = login_user(email, password)
 
             if result['error']:
                 alert_modal(result['message'], level="error")
             else:
-                cookie_manager.set("user", json.dumps(result['user']))
+                session_manager.login(result['user'])
                 st.session_state.was_loaded = True
                 st.switch_page("src/pages/ajax_chat.py")
@@ -1,18 +1,17 @@
-import json
 import streamlit as st
 from src.components.modal import alert_modal
-from src.config import SECRET_KEY, COOKIE_PREFIX
+from src.config.warmup import warmup
 from src.repos.user_repo import UserRepository
-from src.utils.cookie_manager import CookieManger
 from src.utils.password_util import hash_password
+from src.utils.session_manager import get_session_manager
 
 st.set_page_config(page_title="Sign Up", page_icon="📝", layout="centered")
 
 st.title("📝 Create Your Account")
 
-cookie_manager = CookieManger(COOKIE_PREFIX, SECRET_KEY)
+session_manager = get_session_manager()
 
-if not cookie_manager.ready():
+if not session_manager.ready():
     st.stop()
 
 
@@ -55,10 +54,11 @@ with st.form("signup_form", clear_on_submit=False):
         elif password != confirm_password:
             alert_modal("Passwords do not match.", level="error")
         else:
+            warmup.require_database()
             result = create_user(full_name, email, password)
             if result['error']:
                 alert_modal(result['message'], level="error")
             else:
-                cookie_manager.set("user", json.dumps(result["user"]))
+                session_manager.login(result["user"])
                 st.session_state.was_loaded = True
                 st.switch_page("src/pages/ajax_chat.py")
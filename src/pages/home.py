@@ -1,7 +1,6 @@
 import streamlit as st
 from src.components.modal import alert_modal
-from src.config import SECRET_KEY, COOKIE_PREFIX
-from src.utils.cookie_manager import CookieManger
+from src.utils.session_manager import get_session_manager
 
 st.set_page_config(page_title="Home", page_icon="🏠")
 
@@ -14,9 +13,9 @@ st.set_page_config(
     layout="centered"
 )
 
-cookie_manager = CookieManger(COOKIE_PREFIX, SECRET_KEY)
+session_manager = get_session_manager()
 
-if not cookie_manager.ready():
+if not session_manager.ready():
     st.stop()
 
 # --- Landing Page Content ---
@@ -39,7 +38,7 @@ with col1:
 
 with col2:
     if st.button("🏃 Logout"):
-        cookie_manager.delete("user")
+        session_manager.logout()
         alert_modal("You have been logged out successfully", "success")
 
 with col3:
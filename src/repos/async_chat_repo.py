@@ -0,0 +1,75 @@
+import asyncio
+from bson import ObjectId
+from src.config.db import async_causal_session, collection_for, get_async_db, get_db
+from src.repos.async_message_repo import AsyncMessageRepository
+from src.repos.chat_archive import is_reactivated, promote_in_background
+from src.repos.chat_cache import get_chat_page, invalidate_user_chats, put_chat_page
+from src.repos.chat_repo import CHAT_LIST_PROJECTION, CHAT_LIST_SORT, chat_list_query, chat_upsert
+from src.repos.cursor import split_page
+
+class AsyncChatRepository:
+
+    def __init__(self):
+        db = get_async_db()
+        self.client = db.client
+        # Writes go through `collection`; listing and history reads through `history`
+        self.collection = collection_for("chats", "turns", db)
+        self.history = collection_for("chats", "history", db)
+        self.message_repo = AsyncMessageRepository()
+
+    async def create_chat(self, data: dict):
+        data.setdefault("_id", ObjectId())
+        async with async_causal_session(self.client, writes=[data["user_id"]]) as session:
+            await self.collection.update_one(*chat_upsert(data), upsert=True, session=session)
+        invalidate_user_chats(data["user_id"])
+        return str(data["_id"])
+
+    async def list_chats(self, user_id: str, limit: int = 20, after: str | None = None):
+        """One sidebar page (`_id`, `title`, `updated_at` and the message summary fields), newest first,
+        plus a cursor for the next page."""
+        page = get_chat_page(user_id, limit, after)
+        if page is not None:
+            return page
+
+        async with async_causal_session(self.client, user_id) as session:
+            chats = await self.history.find(
+                chat_list_query(user_id, after), CHAT_LIST_PROJECTION, session=session
+            ).sort(CHAT_LIST_SORT).limit(limit + 1).to_list()
+        chats, next_cursor = split_page(chats, limit, "updated_at")
+
+        for chat in chats:
+            chat["_id"] = str(chat["_id"])
+
+        page = (chats, next_cursor)
+        put_chat_page(user_id, limit, after, page)
+        return page
+
+    async def update_summary(self, chat_id: str, summary: str, summary_cursor: str | None):
+        await self.collection.update_one(
+            {"_id": ObjectId(chat_id)},
+            {"$set": {"summary": summary, "summary_cursor": summary_cursor}}
+        )
+
+    async def chat_with_messages(self, chat_id: str, limit: int = 50, user_id: str | None = None):
+        # The chat header and its latest page are independent reads, so they run concurrently; not knowing
+        # yet whether the chat is archived, the page also looks up its archive
+        chat, (messages, cursor) = await asyncio.gather(
+            self._chat(chat_id, user_id),
+            self.message_repo.list_messages(chat_id, limit=limit, user_id=user_id)
+        )
+        if not chat:
+            return None
+        if is_reactivated(chat):
+            promote_in_background(get_db(), chat["_id"])
+
+        chat["messages"] = messages
+        chat["messages_cursor"] = cursor
+        return chat
+
+    def promote(self, chat_id: str):
+        """Moves an archived chat back to the hot tier in the background, e.g. when a turn is sent in it."""
+        promote_in_background(get_db(), ObjectId(chat_id))
+
+    async def _chat(self, chat_id: str, user_id: str | None):
+        async with async_causal_session(self.client, user_id) as session:
+            return await self.history.find_one({"_id": ObjectId(chat_id)}, session=session)
@@ -0,0 +1,61 @@
+import asyncio
+from bson import ObjectId
+from src.config import MESSAGE_STORAGE
+from src.config.db import async_causal_session, collection_for, get_async_db
+from src.repos.chat_archive import ARCHIVE_HEADER, archive_page, cached_messages, decode_messages
+from src.repos.cursor import split_page
+from src.repos.message_buckets import (
+    NewestBuckets, bucket_headers_query, bucket_page_pipeline, merge_message_pages
+)
+from src.repos.message_repo import MESSAGE_PAGE_SORT, message_page_query
+
+class AsyncMessageRepository:
+
+    def __init__(self):
+        db = get_async_db()
+        self.client = db.client
+        self.collection = collection_for("messages", "history", db)
+        self.buckets = collection_for("message_buckets", "history", db)
+        self.archives = collection_for("archived_chats", "history", db)
+
+    async def list_messages(self, chat_id: str, limit: int = 50, before: str | None = None, user_id: str | None = None,
+                            archived: bool | None = None):
+        # A session serves one operation at a time, so each layout is read in its own causal session
+        reads = [self._documents(chat_id, before, limit, user_id)]
+        if MESSAGE_STORAGE == "buckets":
+            reads.append(self._bucketed(chat_id, before, limit, user_id))
+        if archived is not False:
+            reads.append(self._archived(chat_id, before, limit, user_id))
+        if len(reads) > 1:
+            docs, next_cursor = merge_message_pages(await asyncio.gather(*reads), limit)
+        else:
+            docs, next_cursor = split_page(await reads[0], limit, "created_at")
+        docs.reverse()
+        return docs, next_cursor
+
+    async def _documents(self, chat_id: str, before: str | None, limit: int, user_id: str | None):
+        async with async_causal_session(self.client, user_id) as session:
+            return await self.collection.find(
+                message_page_query(chat_id, before), session=session
+            ).sort(MESSAGE_PAGE_SORT).limit(limit + 1).to_list()
+
+    async def _bucketed(self, chat_id: str, before: str | None, limit: int, user_id: str | None):
+        async with async_causal_session(self.client, user_id) as session:
+            newest = NewestBuckets(before, limit)
+            headers = self.buckets.find(*bucket_headers_query(chat_id, before), session=session)
+            async for header in headers.sort("last_at", -1):
+                if not newest.add(header):
+                    break
+            pipeline = bucket_page_pipeline(chat_id, before, limit, newest.since)
+            cursor = await self.buckets.aggregate(pipeline, session=session)
+            return await cursor.to_list()
+
+    async def _archived(self, chat_id: str, before: str | None, limit: int, user_id: str | None):
+        # As load_archive: the blob is only read when the messages are not decoded already
+        async with async_causal_session(self.client, user_id) as session:
+            archive = await self.archives.find_one({"_id": ObjectId(chat_id)}, ARCHIVE_HEADER, session=session)
+            messages = cached_messages(archive) if archive else []
+            if messages is None:
+                archive = await self.archives.find_one({"_id": ObjectId(chat_id)}, {"terms": 0}, session=session)
+                messages = decode_messages(archive) if archive else []
+        return archive_page(messages, before, limit)
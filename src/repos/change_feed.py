@@ -0,0 +1,169 @@
+"""One change stream per process on chats, messages and message_buckets (change streams need a replica set).
+
+Each change drops the owner's cached sidebar pages and is published on the event bus under the owner's
+user id, so every open session of that user, on any replica, sees turns written elsewhere. The resume
+token is stored per CHANGE_FEED_NAME, so a restarted process carries on where the last one stopped.
+"""
+import atexit
+import threading
+import time
+from datetime import datetime, UTC
+import streamlit as st
+from pymongo.errors import OperationFailure, PyMongoError
+from src.config import CHANGE_FEED_NAME, LIVE_SYNC
+from src.config.db import get_db
+from src.repos.chat_cache import invalidate_user_chats
+from src.repos.migrations import migration
+from src.utils.event_bus import get_event_bus
+from src.utils.instrumentation import registry
+
+WATCHED = ("chats", "messages", "message_buckets")
+HISTORY_LOST = 286
+NOT_A_REPLICA_SET = 40573
+# The stored token may lag by this much; a restart then replays a few seconds of changes
+TOKEN_SAVE_SECONDS = 5
+MAX_BACKOFF_SECONDS = 30
+# Tokens of feeds that have not saved for this long are dropped (a renamed or retired replica)
+STATE_TTL_SECONDS = 7 * 24 * 3600
+
+
+def change_pipeline() -> list[dict]:
+    return [{"$match": {"ns.coll": {"$in": list(WATCHED)}, "operationType": {"$in": ["insert", "update", "replace"]}}}]
+
+
+def _bucket_entries(change: dict) -> list[dict]:
+    # An append shows up as `messages.<n>` fields; a first insert (or a rewritten array) as the whole list
+    if change["operationType"] != "update":
+        return change["fullDocument"]["messages"]
+    fields = change.get("updateDescription", {}).get("updatedFields", {})
+    if "messages" in fields:
+        return fields["messages"]
+    return [value for key, value in fields.items() if key.startswith("messages.") and key.count(".") == 1]
+
+
+def change_events(change: dict) -> list[tuple[str, dict]]:
+    """(user id, event) pairs for one change: `{"type": "chat", ...}` or `{"type": "message", "doc": ...}`."""
+    doc = change.get("fullDocument")
+    if not doc or not doc.get("user_id"):
+        # Deleted before the lookup, or written without an owner
+        return []
+
+    user_id = str(doc["user_id"])
+    collection = change["ns"]["coll"]
+    if collection == "chats":
+        # The newest message id lets a session that wrote it tell the change is already on screen
+        last_message_id = doc.get("last_message_id")
+        return [(user_id, {"type": "chat", "chat_id": str(doc["_id"]),
+                           "last_message_id": str(last_message_id) if last_message_id else None})]
+    if collection == "messages":
+        return [(user_id, {"type": "message", "chat_id": str(doc["chat_id"]), "doc": doc})]
+    return [
+        (user_id, {"type": "message", "chat_id": str(doc["chat_id"]),
+                   "doc": {**entry, "chat_id": doc["chat_id"], "user_id": doc["user_id"]}})
+        for entry in _bucket_entries(change)
+    ]
+
+
+class ChangeFeed:
+    """Background thread that tails the change stream and fans changes out to `bus`.
+
+    `ready` is set once the stream is open; changes committed after that are delivered.
+    """
+
+    def __init__(self, db, bus, name: str):
+        self.db = db
+        self.bus = bus
+        self.name = name
+        self.ready = threading.Event()
+        self.error = None
+        self._stopped = threading.Event()
+        self._thread = None
+        state = db.change_feed_state.find_one({"_id": name}) or {}
+        self.token = state.get("token")
+        self._saved_token = self.token
+        self._saved_at = time.monotonic()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="change-feed", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout: float = 5):
+        self._stopped.set()
+        if self._thread:
+            self._thread.join(timeout)
+        self._save_token(force=True)
+
+    def handle(self, change: dict):
+        events = change_events(change)
+        for user_id, event in events:
+            if event["type"] == "chat":
+                invalidate_user_chats(user_id)
+            self.bus.publish(user_id, event)
+        registry.inc("change_feed_events_total", collection=change["ns"]["coll"])
+        if change.get("wallTime"):
+            lag = datetime.now(UTC) - change["wallTime"].replace(tzinfo=UTC)
+            registry.observe("change_feed_lag_seconds", max(0.0, lag.total_seconds()))
+
+    def _handle_safely(self, change: dict):
+        # One malformed change must not stop the feed
+        try:
+            self.handle(change)
+        except Exception as e:
+            print(f"Error: {type(e).__name__} - {str(e)}")
+
+    def _save_token(self, force: bool = False):
+        if self.token is None or self.token == self._saved_token:
+            return
+        if not force and time.monotonic() - self._saved_at < TOKEN_SAVE_SECONDS:
+            return
+        self.db.change_feed_state.update_one(
+            {"_id": self.name}, {"$set": {"token": self.token, "updated_at": datetime.now(UTC)}}, upsert=True
+        )
+        self._saved_token = self.token
+        self._saved_at = time.monotonic()
+
+    def _run(self):
+        backoff = 1
+        while not self._stopped.is_set():
+            try:
+                with self.db.watch(change_pipeline(), full_document="updateLookup", start_after=self.token,
+                                   max_await_time_ms=1000) as stream:
+                    self.ready.set()
+                    backoff = 1
+                    while stream.alive and not self._stopped.is_set():
+                        change = stream.try_next()
+                        if change is not None:
+                            self._handle_safely(change)
+                        # Advances on empty batches too, so an idle feed does not fall out of the oplog
+                        self.token = stream.resume_token
+                        self._save_token()
+            except OperationFailure as e:
+                print(f"Error: {type(e).__name__} - {str(e)}")
+                if e.code == NOT_A_REPLICA_SET:
+                    self.error = f"{type(e).__name__} - {str(e)}"
+                    return
+                if e.code == HISTORY_LOST:
+                    # The token is older than the oplog; only changes from now on can be delivered
+                    self.token = None
+            except PyMongoError as e:
+                print(f"Error: {type(e).__name__} - {str(e)}")
+            self._stopped.wait(backoff)
+            backoff = min(backoff * 2, MAX_BACKOFF_SECONDS)
+
+
+@st.cache_resource
+def get_change_feed():
+    # One watcher per process, or none when LIVE_SYNC is off
+    if not LIVE_SYNC:
+        return None
+    if not CHANGE_FEED_NAME:
+        raise ValueError("CHANGE_FEED_NAME must be set when LIVE_SYNC is on")
+    feed = ChangeFeed(get_db(), get_event_bus(), CHANGE_FEED_NAME).start()
+    atexit.register(feed.stop)
+    return feed
+
+
+@migration(16, "change_feed_state(updated_at) TTL, so tokens of retired replicas expire")
+def _create_change_feed_state_ttl(db):
+    db.change_feed_state.create_index("updated_at", expireAfterSeconds=STATE_TTL_SECONDS)
@@ -0,0 +1,241 @@
+"""Cold tier for chats nobody has touched in ARCHIVE_AFTER_DAYS: all their messages in one compressed
+`archived_chats` document. The chat itself stays in `chats` (the sidebar lists it) with `archived: True`.
+
+Archiving and promotion only ever add the new copy before removing the old one, and reads merge the hot
+layouts with the archive, dropping duplicates, so a chat stays readable at every step. Each archive also
+keeps the distinct words of its messages in `terms`, under a text index, so search still finds the chat.
+"""
+import logging
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, UTC
+from threading import Lock
+import bson
+from bson import Binary
+from cachetools import TTLCache
+from pymongo.errors import BulkWriteError
+from src.config import ARCHIVE_CODEC, MESSAGE_BUCKET_SIZE, MESSAGE_STORAGE
+from src.config.async_runtime import log_failure
+from src.repos.cursor import decode_cursor
+from src.repos.message_buckets import bucket_doc, bucket_entry
+from src.repos.migrations import migration
+from src.utils.inverted_index import tokenize
+
+DUPLICATE_KEY = 11000
+# Stay clear of the 16 MB document limit; bigger chats are left in the hot tier
+MAX_BLOB_BYTES = 15 * 1024 * 1024
+ZSTD_LEVEL = 10
+ZLIB_LEVEL = 6
+# Decoded archives kept in memory, by their decompressed size
+DECODED_CACHE_BYTES = 64 * 1024 * 1024
+# A promotion that has not finished after this long is taken to have died, and another may take over
+PROMOTION_LEASE = timedelta(minutes=10)
+# Everything but the blob and the search terms: enough to tell whether the messages are decoded already
+ARCHIVE_HEADER = {"blob": 0, "terms": 0}
+
+logger = logging.getLogger(__name__)
+
+# Decoded archives, keyed by chat and archive time so a re-archived chat is never served stale.
+# Read and filled from the script threads, the event loop and the promotion worker
+_decoded = TTLCache(maxsize=DECODED_CACHE_BYTES, ttl=600, getsizeof=lambda entry: entry[0])
+_decoded_lock = Lock()
+_promotions = ThreadPoolExecutor(max_workers=1, thread_name_prefix="promote")
+_promoting = set()
+_promoting_lock = Lock()
+
+
+def compress(data: bytes, codec: str) -> bytes:
+    if codec == "zstd":
+        import zstandard
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+    return zlib.compress(data, ZLIB_LEVEL)
+
+
+def decompress(data: bytes, codec: str) -> bytes:
+    if codec == "zstd":
+        import zstandard
+        return zstandard.ZstdDecompressor().decompress(data)
+    return zlib.decompress(data)
+
+
+def archive_doc(chat: dict, docs: list[dict], codec: str = ARCHIVE_CODEC) -> dict | None:
+    """The archive document for `chat`, or None when its compressed messages would not fit in one."""
+    blob = compress(bson.encode({"messages": [bucket_entry(doc) for doc in docs]}), codec)
+    if len(blob) > MAX_BLOB_BYTES:
+        return None
+    return {
+        "_id": chat["_id"],
+        "user_id": chat.get("user_id"),
+        "codec": codec,
+        "count": len(docs),
+        "first_at": docs[0]["created_at"],
+        "last_at": docs[-1]["created_at"],
+        "archived_at": datetime.now(UTC),
+        "blob": Binary(blob),
+        "terms": archive_terms(docs),
+    }
+
+
+def archive_terms(docs: list[dict]) -> str:
+    # Distinct words only: enough for the text index, and far smaller than the messages themselves
+    return " ".join(sorted({term for doc in docs for term in tokenize(doc["message"]["content"])}))
+
+
+def cached_messages(archive: dict) -> list[dict] | None:
+    with _decoded_lock:
+        entry = _decoded.get((archive["_id"], archive["archived_at"]))
+    return entry[1] if entry else None
+
+
+def decode_messages(archive: dict) -> list[dict]:
+    """Messages of an archive document (with its blob), oldest first, with `chat_id` and `user_id` restored."""
+    messages = cached_messages(archive)
+    if messages is None:
+        raw = decompress(archive["blob"], archive["codec"])
+        messages = bson.decode(raw)["messages"]
+        for message in messages:
+            message.update(chat_id=archive["_id"], user_id=archive.get("user_id"))
+        if len(raw) <= _decoded.maxsize:
+            with _decoded_lock:
+                _decoded[(archive["_id"], archive["archived_at"])] = (len(raw), messages)
+    return messages
+
+
+def load_archive(collection, chat_id, session=None) -> tuple[dict | None, list[dict]]:
+    """A chat's archive header (ARCHIVE_HEADER) and messages; the blob is only read when they are not decoded
+    already, since a page of an archived chat needs a few of them, not up to MAX_BLOB_BYTES from Mongo."""
+    archive = collection.find_one({"_id": chat_id}, ARCHIVE_HEADER, session=session)
+    if not archive:
+        return None, []
+    messages = cached_messages(archive)
+    if messages is None:
+        archive = collection.find_one({"_id": chat_id}, {"terms": 0}, session=session)
+        messages = decode_messages(archive) if archive else []
+    return archive, messages
+
+
+def archive_page(messages: list[dict], before: str | None, limit: int) -> list[dict]:
+    """Up to `limit + 1` of an archive's messages older than `before`, newest first (for merge_message_pages)."""
+    if before:
+        cursor = decode_cursor(before)
+        messages = [message for message in messages if (message["created_at"], message["_id"]) < cursor]
+    return [dict(message) for message in reversed(messages[-(limit + 1):])]
+
+
+def is_reactivated(chat: dict) -> bool:
+    # A turn written after the chat was archived moves it back to the hot tier
+    return bool(chat.get("archived")) and chat.get("updated_at", chat["archived_at"]) > chat["archived_at"]
+
+
+def hot_messages(db, chat_id) -> tuple[list[dict], list[dict]]:
+    """Per-message documents and buckets of a chat, read from the primary."""
+    docs = db.messages.find({"chat_id": chat_id}).to_list()
+    buckets = db.message_buckets.find({"chat_id": chat_id}).to_list()
+    return docs, buckets
+
+
+def archive_chat(db, chat: dict, codec: str = ARCHIVE_CODEC) -> int:
+    """Moves one chat's messages into `archived_chats`; returns how many were archived.
+
+    `chat` must carry the `updated_at` read before its messages: a turn written since then makes the
+    flag update miss, and the chat is left hot.
+    """
+    docs, buckets = hot_messages(db, chat["_id"])
+    unpacked = [{**entry, "chat_id": bucket["chat_id"], "user_id": bucket.get("user_id")}
+                for bucket in buckets for entry in bucket["messages"]]
+    merged = {doc["_id"]: doc for doc in unpacked + docs}
+    messages = sorted(merged.values(), key=lambda doc: (doc["created_at"], doc["_id"]))
+    if not messages:
+        return 0
+
+    archive = archive_doc(chat, messages, codec)
+    if archive is None:
+        logger.warning("chat %s is too large to archive", chat["_id"])
+        return 0
+
+    db.archived_chats.replace_one({"_id": chat["_id"]}, archive, upsert=True)
+    flagged = db.chats.update_one(
+        {"_id": chat["_id"], "updated_at": chat.get("updated_at"), "archived": {"$ne": True}},
+        {"$set": {"archived": True, "archived_at": archive["archived_at"]}}
+    )
+    if not flagged.modified_count:
+        db.archived_chats.delete_one({"_id": chat["_id"], "archived_at": archive["archived_at"]})
+        return 0
+
+    # Only what went into the blob; a message or bucket that changed meanwhile stays hot until promotion
+    if docs:
+        db.messages.delete_many({"_id": {"$in": [doc["_id"] for doc in docs]}})
+    for bucket in buckets:
+        db.message_buckets.delete_one({"_id": bucket["_id"], "count": bucket["count"]})
+    return len(messages)
+
+
+def promote_chat(db, chat_id) -> int:
+    """Moves an archived chat's messages back to the hot tier; returns how many were restored.
+
+    The chat is claimed first, so two promoters (two replicas, or the app and the archive job) never both
+    insert the missing messages.
+    """
+    archive, messages = load_archive(db.archived_chats, chat_id)
+    if not archive:
+        db.chats.update_one({"_id": chat_id}, {"$unset": {"archived": "", "archived_at": "", "promoting": ""}})
+        return 0
+
+    now = datetime.now(UTC)
+    claimed = db.chats.find_one_and_update(
+        {"_id": chat_id, "archived_at": archive["archived_at"],
+         "$or": [{"promoting": {"$exists": False}}, {"promoting": {"$lt": now - PROMOTION_LEASE}}]},
+        {"$set": {"promoting": now}}
+    )
+    if not claimed:
+        return 0
+
+    docs, buckets = hot_messages(db, chat_id)
+    present = {doc["_id"] for doc in docs} | {entry["_id"] for bucket in buckets for entry in bucket["messages"]}
+    missing = [dict(message) for message in messages if message["_id"] not in present]
+
+    if missing and MESSAGE_STORAGE == "buckets":
+        db.message_buckets.insert_many([
+            bucket_doc(chat_id, archive.get("user_id"), missing[start:start + MESSAGE_BUCKET_SIZE])
+            for start in range(0, len(missing), MESSAGE_BUCKET_SIZE)
+        ])
+    elif missing:
+        try:
+            db.messages.insert_many(missing, ordered=False)
+        except BulkWriteError as e:
+            if any(error["code"] != DUPLICATE_KEY for error in e.details.get("writeErrors", [])):
+                raise
+
+    db.chats.update_one({"_id": chat_id, "archived_at": archive["archived_at"]},
+                        {"$unset": {"archived": "", "archived_at": "", "promoting": ""}})
+    db.archived_chats.delete_one({"_id": chat_id, "archived_at": archive["archived_at"]})
+    return len(missing)
+
+
+def _promoted(chat_id):
+    def callback(_future):
+        with _promoting_lock:
+            _promoting.discard(chat_id)
+    return callback
+
+
+def promote_in_background(db, chat_id):
+    """Queues `promote_chat` on a single worker thread; a chat already queued is not queued twice."""
+    with _promoting_lock:
+        if chat_id in _promoting:
+            return
+        _promoting.add(chat_id)
+    promoted = _promotions.submit(promote_chat, db, chat_id)
+    promoted.add_done_callback(log_failure(f"promote_chat {chat_id}"))
+    promoted.add_done_callback(_promoted(chat_id))
+
+
+@migration(12, "archived_chats(user_id) and chats(archived_at) for the cold tier")
+def _create_archive_indexes(db):
+    db.archived_chats.create_index("user_id")
+    db.chats.create_index("archived_at", sparse=True)
+
+
+@migration(15, "archived_chats text index on terms, so search covers archived chats")
+def _create_archive_search_index(db):
+    db.archived_chats.create_index([("user_id", 1), ("terms", "text")], name="archive_search")
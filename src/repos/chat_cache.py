@@ -0,0 +1,25 @@
+from threading import Lock
+from cachetools import TTLCache
+
+# Per-user sidebar pages: {user_id: {(limit, after): (chats, next_cursor)}}
+CHAT_LIST_TTL_SECONDS = 60
+_chat_lists = TTLCache(maxsize=4096, ttl=CHAT_LIST_TTL_SECONDS)
+_lock = Lock()
+
+
+def get_chat_page(user_id, limit: int, after: str | None):
+    with _lock:
+        return _chat_lists.get(str(user_id), {}).get((limit, after))
+
+
+def put_chat_page(user_id, limit: int, after: str | None, page):
+    with _lock:
+        pages = _chat_lists.get(str(user_id))
+        if pages is None:
+            pages = _chat_lists[str(user_id)] = {}
+        pages[(limit, after)] = page
+
+
+def invalidate_user_chats(user_id):
+    with _lock:
+        _chat_lists.pop(str(user_id), None)
@@ -1,39 +1,199 @@
+from threading import Lock
 from bson import ObjectId
-from src.config.db import db
+from cachetools import TTLCache
+from pymongo import DESCENDING
+from pymongo.errors import OperationFailure
+from src.config import MESSAGE_STORAGE, SEARCH_BACKEND
+from src.config.db import causal_session, collection_for, get_db
+from src.repos.chat_archive import ARCHIVE_HEADER, decode_messages, load_archive
+from src.repos.chat_cache import invalidate_user_chats
+from src.repos.cursor import keyset_filter
+from src.repos.message_repo import MessageRepository
+from src.repos.migrations import drop_index_if_exists, hot_query, migration
+from src.utils.inverted_index import InvertedIndex, make_snippet, tokenize
+
+# Every projected field is in the sidebar index, so a page is served from the index alone
+CHAT_LIST_PROJECTION = {"title": 1, "updated_at": 1, "message_count": 1, "last_message_preview": 1, "last_model": 1}
+CHAT_LIST_SORT = [("updated_at", DESCENDING), ("_id", DESCENDING)]
+CHAT_LIST_INDEX = [("user_id", 1), ("updated_at", -1), ("_id", -1), ("title", 1), ("message_count", 1),
+                   ("last_message_preview", 1), ("last_model", 1)]
+
+# Search ranks a title match above a single message match
+TITLE_BOOST = 2.0
+TEXT_INDEX_MISSING = 27
+# Per-user fallback indexes for servers without $text support, shared by every session's searches
+_fallback_indexes = TTLCache(maxsize=256, ttl=60)
+_fallback_lock = Lock()
+
+
+def chat_list_query(user_id: str, after: str | None = None) -> dict:
+    return {"user_id": ObjectId(user_id), **keyset_filter("updated_at", after)}
+
+
+def chat_upsert(data: dict) -> tuple[dict, dict]:
+    """Filter and update for creating a chat. The write-behind queue may upsert the chat's counters
+    first, so creation must merge into that document instead of inserting."""
+    fields = {key: value for key, value in data.items() if key not in ("_id", "updated_at")}
+    update = {"$set": fields, "$setOnInsert": {"message_count": 0}}
+    if "updated_at" in data:
+        update["$max"] = {"updated_at": data["updated_at"]}
+    return {"_id": data["_id"]}, update
+
+
+def first_match(contents: list[str], terms: list[str]) -> str:
+    # A bucket or an archive matches as a whole; its snippet comes from the first message holding a query term
+    return next((text for text in contents if any(term in text.lower() for term in terms)), contents[0] if contents else "")
+
 
 class ChatRepository:
 
+    # Off for stand-ins without $text (SEARCH_BACKEND = "inverted"), and flipped off the first time
+    # the server reports a missing text index, so later searches go straight to the fallback
+    text_search_supported = SEARCH_BACKEND == "text"
+
     def __init__(self):
-        self.collection = db.get_collection("chats")
+        # Writes go through `collection`; search reads through `history`
+        self.collection = collection_for("chats", "turns")
+        self.history = collection_for("chats", "history")
+        self.message_repo = MessageRepository()
 
     def create_chat(self, data: dict):
-        result = self.collection.insert_one(data)
-        return str(result.inserted_id)
-
-    def chat_with_messages(self,chat_id: str):
-        pipeline = [
-            {"$match": {"_id": ObjectId(chat_id)}},  # select the chat
-            {
-                "$lookup": {
-                    "from": "messages",  # collection to join
-                    "localField": "_id",  # field in chats
-                    "foreignField": "chat_id",  # field in messages
-                    "as": "messages"  # output array
-                }
-            },
-            {"$unwind": {"path": "$messages", "preserveNullAndEmptyArrays": True}},
-            # {"$sort": {"messages.created_at": -1}},  # most recent first
-            {"$group": {
-                "_id": "$_id",
-                "title": {"$first": "$title"},
-                "created_at": {"$first": "$created_at"},
-                "updated_at": {"$first": "$updated_at"},
-                "messages": {"$push": "$messages"}
-            }}
-        ]
-
-        result = list(self.collection.aggregate(pipeline))
-        return result
-
-    def create_indexes(self):
-        self.collection.create_index([("user_id", 1)])
+        data.setdefault("_id", ObjectId())
+        with causal_session(get_db().client, writes=[data["user_id"]]) as session:
+            self.collection.update_one(*chat_upsert(data), upsert=True, session=session)
+        invalidate_user_chats(data["user_id"])
+        return str(data["_id"])
+
+    def search_chats(self, user_id: str, query: str, limit: int = 10, cursor: str | None = None):
+        """Ranked chats of one user whose title or messages match `query`, with snippets.
+
+        Returns a page of `{_id, title, snippet, score}` and a cursor for the next page.
+        """
+        offset = int(cursor or 0)
+        hits = None
+
+        # Reads may go to a secondary; the session makes them wait for the user's latest turn
+        with causal_session(get_db().client, user_id) as session:
+            if ChatRepository.text_search_supported:
+                try:
+                    hits = self._text_search(user_id, query, offset + limit + 1, session)
+                except OperationFailure as e:
+                    if e.code != TEXT_INDEX_MISSING:
+                        raise
+                    ChatRepository.text_search_supported = False
+
+            if hits is None:
+                hits = self._fallback_search(user_id, query, session)
+
+        next_cursor = str(offset + limit) if len(hits) > offset + limit else None
+        return hits[offset:offset + limit], next_cursor
+
+    def _text_search(self, user_id: str, query: str, window: int, session=None):
+        owner = ObjectId(user_id)
+        terms = tokenize(query)
+        text_match = {"user_id": owner, "$text": {"$search": query}}
+        results = {}
+
+        titles = self.history.find(
+            text_match, {"title": 1, "score": {"$meta": "textScore"}}, session=session
+        ).sort([("score", {"$meta": "textScore"})]).limit(window)
+        for chat in titles:
+            results[chat["_id"]] = {
+                "_id": str(chat["_id"]), "title": chat["title"], "snippet": chat["title"], "score": chat["score"] * TITLE_BOOST
+            }
+
+        messages = self.message_repo.collection.aggregate([
+            {"$match": text_match},
+            {"$project": {"chat_id": 1, "content": "$message.content", "score": {"$meta": "textScore"}}},
+            {"$sort": {"score": -1}},
+            {"$group": {"_id": "$chat_id", "score": {"$max": "$score"}, "content": {"$first": "$content"}}},
+            {"$sort": {"score": -1}},
+            {"$limit": window}
+        ], session=session)
+        for hit in messages:
+            result = results.setdefault(hit["_id"], {"_id": str(hit["_id"]), "title": None, "score": 0.0})
+            result["score"] += hit["score"]
+            result["snippet"] = make_snippet(hit["content"], terms)
+
+        buckets = self.message_repo.buckets.find(
+            text_match, {"chat_id": 1, "messages.message.content": 1, "score": {"$meta": "textScore"}}, session=session
+        ).sort([("score", {"$meta": "textScore"})]).limit(window) if MESSAGE_STORAGE == "buckets" else []
+        for bucket in buckets:
+            content = first_match([entry["message"]["content"] for entry in bucket["messages"]], terms)
+            result = results.setdefault(bucket["chat_id"], {"_id": str(bucket["chat_id"]), "title": None, "score": 0.0})
+            if "snippet" not in result or result["snippet"] == result["title"]:
+                result["snippet"] = make_snippet(content, terms)
+            result["score"] += bucket["score"]
+
+        # Archived chats match on their distinct words; the snippet comes from the decoded messages
+        archives = self.message_repo.archives.find(
+            text_match, {**ARCHIVE_HEADER, "score": {"$meta": "textScore"}}, session=session
+        ).sort([("score", {"$meta": "textScore"})]).limit(window)
+        for archive in archives:
+            _, messages = load_archive(self.message_repo.archives, archive["_id"], session)
+            content = first_match([message["message"]["content"] for message in messages], terms)
+            result = results.setdefault(archive["_id"], {"_id": str(archive["_id"]), "title": None, "score": 0.0})
+            if "snippet" not in result or result["snippet"] == result["title"]:
+                result["snippet"] = make_snippet(content, terms)
+            result["score"] += archive["score"]
+
+        untitled = [chat_id for chat_id, result in results.items() if result["title"] is None]
+        for chat in self.history.find({"_id": {"$in": untitled}, "user_id": owner}, {"title": 1}, session=session):
+            results[chat["_id"]]["title"] = chat["title"]
+
+        return sorted(results.values(), key=lambda result: result["score"], reverse=True)
+
+    def _fallback_search(self, user_id: str, query: str, session=None):
+        with _fallback_lock:
+            cached = _fallback_indexes.get(user_id)
+        if cached is None:
+            index = InvertedIndex()
+            titles = {}
+            owner = ObjectId(user_id)
+            for chat in self.history.find({"user_id": owner}, {"title": 1}, session=session):
+                titles[chat["_id"]] = chat["title"]
+                index.add(("chat", chat["_id"]), chat["_id"], chat["title"], weight=TITLE_BOOST)
+            messages = self.message_repo.collection.find({"user_id": owner}, {"chat_id": 1, "message": 1}, session=session)
+            for message in messages:
+                index.add(message["_id"], message["chat_id"], message["message"]["content"])
+            if MESSAGE_STORAGE == "buckets":
+                buckets = self.message_repo.buckets.find({"user_id": owner}, {"chat_id": 1, "messages": 1}, session=session)
+                for bucket in buckets:
+                    for entry in bucket["messages"]:
+                        index.add(entry["_id"], bucket["chat_id"], entry["message"]["content"])
+            for archive in self.message_repo.archives.find({"user_id": owner}, {"terms": 0}, session=session):
+                for message in decode_messages(archive):
+                    index.add(message["_id"], archive["_id"], message["message"]["content"])
+            cached = (index, titles)
+            with _fallback_lock:
+                _fallback_indexes[user_id] = cached
+
+        index, titles = cached
+        terms = tokenize(query)
+        return [{
+            "_id": str(hit["group"]),
+            "title": titles.get(hit["group"], ""),
+            "snippet": make_snippet(hit["text"], terms),
+            "score": hit["score"]
+        } for hit in index.search(query)]
+
+@migration(2, "chats(user_id, updated_at desc) replaces chats(user_id)")
+def _create_chat_indexes(db):
+    db.chats.create_index([("user_id", 1), ("updated_at", -1), ("_id", -1)])
+    drop_index_if_exists(db.chats, "user_id_1")
+
+
+@migration(7, "chats(user_id, title text) for search")
+def _create_chat_search_index(db):
+    db.chats.create_index([("user_id", 1), ("title", "text")], name="chat_search")
+
+
+@migration(11, "covering sidebar index with the denormalised chat summary fields")
+def _create_sidebar_index(db):
+    db.chats.create_index(CHAT_LIST_INDEX, name="chat_sidebar")
+    drop_index_if_exists(db.chats, "user_id_1_updated_at_-1__id_-1")
+
+
+@hot_query("sidebar listing", "chats", covered=True)
+def _sidebar_query(collection):
+    return collection.find(chat_list_query(str(ObjectId())), CHAT_LIST_PROJECTION).sort(CHAT_LIST_SORT).limit(21)
@@ -0,0 +1,36 @@
+from datetime import datetime, UTC
+from bson import ObjectId
+
+
+def encode_cursor(value: datetime, doc_id) -> str:
+    # Match what Mongo hands back: naive UTC at millisecond precision
+    if value.tzinfo:
+        value = value.astimezone(UTC).replace(tzinfo=None)
+    value = value.replace(microsecond=value.microsecond // 1000 * 1000)
+    return f"{value.isoformat()}|{doc_id}"
+
+
+def decode_cursor(cursor: str):
+    value, doc_id = cursor.rsplit("|", 1)
+    return datetime.fromisoformat(value), ObjectId(doc_id)
+
+
+def keyset_filter(field: str, cursor: str | None) -> dict:
+    # Everything strictly "before" the cursor when walking (field, _id) in descending order
+    if not cursor:
+        return {}
+
+    value, doc_id = decode_cursor(cursor)
+    return {"$or": [
+        {field: {"$lt": value}},
+        {field: value, "_id": {"$lt": doc_id}},
+    ]}
+
+
+def split_page(docs: list[dict], limit: int, field: str):
+    # Callers fetch limit + 1 rows; the extra one only tells us whether an older page exists
+    next_cursor = None
+    if len(docs) > limit:
+        docs = docs[:limit]
+        next_cursor = encode_cursor(docs[-1][field], docs[-1]["_id"])
+    return docs, next_cursor
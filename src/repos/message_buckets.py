@@ -0,0 +1,148 @@
+from datetime import datetime, UTC
+from bson import ObjectId
+from pymongo import UpdateOne
+from src.config import MESSAGE_BUCKET_SIZE
+from src.repos.cursor import decode_cursor, keyset_filter, split_page
+from src.repos.migrations import AggregateQuery, drop_index_if_exists, hot_query, migration
+
+# Stored once per bucket instead of once per message
+BUCKET_FIELDS = ("chat_id", "user_id")
+
+
+def bucket_entry(doc: dict) -> dict:
+    return {key: value for key, value in doc.items() if key not in BUCKET_FIELDS}
+
+
+def bucket_doc(chat_id, user_id, docs: list[dict]) -> dict:
+    return {
+        "_id": ObjectId(),
+        "chat_id": chat_id,
+        "user_id": user_id,
+        "count": len(docs),
+        "first_at": min(doc["created_at"] for doc in docs),
+        "last_at": max(doc["created_at"] for doc in docs),
+        "messages": [bucket_entry(doc) for doc in docs],
+    }
+
+
+def bucket_append_ops(docs: list[dict], size: int = MESSAGE_BUCKET_SIZE, namespace: str | None = None) -> list[UpdateOne]:
+    """One `$push`/`$inc` upsert per chat (per `size` messages), into any of its buckets with room for all of them."""
+    by_chat = {}
+    for doc in docs:
+        by_chat.setdefault(doc["chat_id"], []).append(doc)
+
+    ops = []
+    for chat_id, chat_docs in by_chat.items():
+        for start in range(0, len(chat_docs), size):
+            chunk = chat_docs[start:start + size]
+            ops.append(UpdateOne(
+                {"chat_id": chat_id, "count": {"$lte": size - len(chunk)}},
+                {
+                    "$push": {"messages": {"$each": [bucket_entry(doc) for doc in chunk]}},
+                    "$inc": {"count": len(chunk)},
+                    "$min": {"first_at": min(doc["created_at"] for doc in chunk)},
+                    "$max": {"last_at": max(doc["created_at"] for doc in chunk)},
+                    "$setOnInsert": {"user_id": chunk[0].get("user_id")},
+                },
+                upsert=True,
+                namespace=namespace
+            ))
+    return ops
+
+
+def bucketed_ids(collection, docs: list[dict]) -> set:
+    """Ids from `docs` that already sit in a bucket (scoped to their chats, so it stays on the chat index)."""
+    chat_ids = list({doc["chat_id"] for doc in docs})
+    wanted = {doc["_id"] for doc in docs}
+    found = set()
+    for bucket in collection.find({"chat_id": {"$in": chat_ids}, "messages._id": {"$in": list(wanted)}},
+                                  {"messages._id": 1}):
+        found.update(entry["_id"] for entry in bucket["messages"] if entry["_id"] in wanted)
+    return found
+
+
+def bucket_headers_query(chat_id: str, before: str | None) -> tuple[dict, dict]:
+    """Filter and projection for the headers of a chat's buckets; read newest `last_at` first, off the index alone."""
+    query = {"chat_id": ObjectId(chat_id)}
+    if before:
+        query["first_at"] = {"$lte": decode_cursor(before)[0]}
+    return query, {"_id": 0, "first_at": 1, "last_at": 1, "count": 1}
+
+
+class NewestBuckets:
+    """Picks the buckets a page needs from their headers, read newest `last_at` first.
+
+    Concurrent appends go to any bucket with room, so buckets can interleave and the newest by `last_at`
+    do not simply hold the newest messages. Reading stops at the first bucket whose messages are all older
+    than `limit + 1` already known to be newer, i.e. held by buckets that start after it ends.
+    """
+
+    def __init__(self, before: str | None, limit: int):
+        self.cursor_at = decode_cursor(before)[0] if before else None
+        self.limit = limit
+        self.since = None
+        self._kept = []
+
+    def add(self, header: dict) -> bool:
+        """Keeps `header`'s bucket, or returns False when neither it nor any later one is needed."""
+        newer = sum(count for first_at, count in self._kept if first_at > header["last_at"])
+        if newer >= self.limit + 1:
+            return False
+        # A bucket reaching past the cursor may hold none of the older messages, so it vouches for nothing
+        older = header["count"] if self.cursor_at is None or header["last_at"] < self.cursor_at else 0
+        self._kept.append((header["first_at"], older))
+        self.since = header["last_at"]
+        return True
+
+
+def bucket_page_pipeline(chat_id: str, before: str | None, limit: int, since=None) -> list[dict]:
+    """Up to `limit + 1` bucketed messages older than `before`, newest first, from the buckets whose
+    `last_at` is `since` or later (NewestBuckets), so the cost follows the page size, not the chat's length."""
+    match, _ = bucket_headers_query(chat_id, before)
+    if since is not None:
+        match["last_at"] = {"$gte": since}
+
+    return [
+        {"$match": match},
+        {"$unwind": "$messages"},
+        {"$set": {"messages.chat_id": "$chat_id", "messages.user_id": "$user_id"}},
+        {"$replaceRoot": {"newRoot": "$messages"}},
+        {"$match": keyset_filter("created_at", before)},
+        {"$sort": {"created_at": -1, "_id": -1}},
+        {"$limit": limit + 1},
+    ]
+
+
+def merge_message_pages(pages: list[list[dict]], limit: int):
+    """Newest-first merge of per-document and bucketed pages, dropping copies of the same message
+    (a message can briefly be in both while the migrator moves its chat)."""
+    merged = {}
+    for docs in pages:
+        for doc in docs:
+            merged.setdefault(doc["_id"], doc)
+    docs = sorted(merged.values(), key=lambda doc: (doc["created_at"], doc["_id"]), reverse=True)
+    return split_page(docs[:limit + 1], limit, "created_at")
+
+
+@migration(10, "message_buckets(chat_id, first_at), (last_at) and bucket text search")
+def _create_bucket_indexes(db):
+    db.message_buckets.create_index([("chat_id", 1), ("first_at", -1)])
+    db.message_buckets.create_index("last_at")
+    db.message_buckets.create_index([("user_id", 1), ("messages.message.content", "text")], name="bucket_search")
+
+
+@migration(14, "message_buckets(chat_id, last_at, first_at, count) for bucket pages, replacing (chat_id, first_at)")
+def _create_bucket_page_index(db):
+    db.message_buckets.create_index([("chat_id", 1), ("last_at", -1), ("first_at", -1), ("count", 1)])
+    drop_index_if_exists(db.message_buckets, "chat_id_1_first_at_-1")
+
+
+@hot_query("bucket headers", "message_buckets", covered=True)
+def _bucket_headers_query(collection):
+    return collection.find(*bucket_headers_query(str(ObjectId()), None)).sort("last_at", -1)
+
+
+@hot_query("bucket page", "message_buckets")
+def _bucket_page_query(collection):
+    # Only the bucket selection; the stages after it work on the few buckets it keeps
+    return AggregateQuery(collection, bucket_page_pipeline(str(ObjectId()), None, 50, datetime.now(UTC))[:1])
@@ -1,28 +1,106 @@
+import atexit
+import streamlit as st
 from bson import ObjectId
-from src.config.db import db
+from pymongo import DESCENDING
+from src.config import MESSAGE_STORAGE
+from src.config.db import causal_session, collection_for, get_db
+from src.repos.chat_archive import archive_page, load_archive
+from src.repos.chat_cache import invalidate_user_chats
+from src.repos.cursor import keyset_filter, split_page
+from src.repos.message_buckets import NewestBuckets, bucket_headers_query, bucket_page_pipeline, merge_message_pages
+from src.repos.migrations import drop_index_if_exists, hot_query, migration
+from src.repos.turn_writer import TurnWriter
+from src.repos.write_queue import WriteBehindQueue
+
+MESSAGE_PAGE_SORT = [("created_at", DESCENDING), ("_id", DESCENDING)]
+
+
+def message_page_query(chat_id: str, before: str | None = None) -> dict:
+    return {"chat_id": ObjectId(chat_id), **keyset_filter("created_at", before)}
+
+
+@st.cache_resource
+def get_message_write_queue():
+    # One queue per process, shared by every session; drained on interpreter shutdown
+    # Each batch also updates the chats' sidebar fields (updated_at, message_count, previews)
+    db = get_db()
+    write = TurnWriter(db, buckets=MESSAGE_STORAGE == "buckets")
+    write_queue = WriteBehindQueue(db.get_collection("messages"), on_flushed=invalidate_user_chats, write=write).start()
+    atexit.register(write_queue.shutdown)
+    return write_queue
+
 
 class MessageRepository:
 
     def __init__(self):
-        self.collection = db.get_collection("messages")
+        # Reads only; every write goes through the write queue's TurnWriter
+        self.collection = collection_for("messages", "history")
+        self.buckets = collection_for("message_buckets", "history")
+        self.archives = collection_for("archived_chats", "history")
+        self.write_queue = get_message_write_queue()
 
     def create_message(self, data: dict):
-        result = self.collection.insert_one(data)
-        return str(result.inserted_id)
-
-    def get_user(self, user_id: str):
-        user = self.collection.find_one({"_id": ObjectId(user_id)})
-        if user:
-            user["_id"] = str(user["_id"])
-        return user
-
-    async def list_users(self):
-        users = []
-        for doc in self.collection.find({}):
-            doc["_id"] = str(doc["_id"])
-            users.append(doc)
-        return users
-
-    def create_indexes(self):
-        self.collection.create_index("email", unique=True)
-        # self.collection.create_index([("book_id", 1)])
+        data.setdefault("_id", ObjectId())
+        self.write_queue.write([data])
+        return str(data["_id"])
+
+    def enqueue_messages(self, messages: list[dict], user_id: str):
+        """Write-behind insert; every message must already have an `_id`."""
+        self.write_queue.put(messages, key=user_id)
+
+    def list_messages(self, chat_id: str, limit: int = 50, before: str | None = None, user_id: str | None = None,
+                      archived: bool | None = None):
+        """Newest `limit` messages of a chat, returned oldest-first, plus a cursor for the next older page.
+
+        With `user_id`, the read waits for that user's latest turn even when a secondary serves it.
+        `archived` is the chat's flag when the caller has it; None looks for an archive as well.
+        """
+        pages = []
+        with causal_session(get_db().client, user_id) as session:
+            pages.append(self.collection.find(
+                message_page_query(chat_id, before), session=session
+            ).sort(MESSAGE_PAGE_SORT).limit(limit + 1).to_list())
+            if MESSAGE_STORAGE == "buckets":
+                # Chats the migrator has not reached yet still have per-message documents
+                newest = NewestBuckets(before, limit)
+                headers = self.buckets.find(*bucket_headers_query(chat_id, before), session=session)
+                for header in headers.sort("last_at", -1):
+                    if not newest.add(header):
+                        break
+                pages.append(self.buckets.aggregate(
+                    bucket_page_pipeline(chat_id, before, limit, newest.since), session=session
+                ).to_list())
+            if archived is not False:
+                _, archived_messages = load_archive(self.archives, ObjectId(chat_id), session)
+                pages.append(archive_page(archived_messages, before, limit))
+        if len(pages) > 1:
+            docs, next_cursor = merge_message_pages(pages, limit)
+        else:
+            docs, next_cursor = split_page(pages[0], limit, "created_at")
+        docs.reverse()
+        return docs, next_cursor
+
+
+@migration(3, "messages(chat_id, created_at, _id); drop copied email index")
+def _create_message_indexes(db):
+    drop_index_if_exists(db.messages, "email_1")
+    db.messages.create_index([("chat_id", 1), ("created_at", -1), ("_id", -1)])
+
+
+@migration(5, "backfill messages.user_id from their chat")
+def _backfill_message_user_ids(db):
+    for chat in db.chats.find({}, {"user_id": 1}).batch_size(500):
+        db.messages.update_many(
+            {"chat_id": chat["_id"], "user_id": {"$exists": False}},
+            {"$set": {"user_id": chat["user_id"]}}
+        )
+
+
+@migration(6, "messages(user_id, message.content text) for search")
+def _create_message_search_index(db):
+    db.messages.create_index([("user_id", 1), ("message.content", "text")], name="message_search")
+
+
+@hot_query("message page", "messages")
+def _message_page_query(collection):
+    return collection.find(message_page_query(str(ObjectId()))).sort(MESSAGE_PAGE_SORT).limit(51)
@@ -0,0 +1,109 @@
+from collections import namedtuple
+from datetime import datetime, UTC
+from pymongo.errors import DuplicateKeyError, OperationFailure
+
+Migration = namedtuple("Migration", ["version", "description", "apply"])
+HotQuery = namedtuple("HotQuery", ["name", "collection", "build", "covered"])
+
+MIGRATIONS_COLLECTION = "schema_migrations"
+# Plan stages that mean a hot query is not served by an index
+BAD_STAGES = {"COLLSCAN", "SORT"}
+
+_migrations = {}
+_hot_queries = []
+
+
+class IndexCheckError(RuntimeError):
+    pass
+
+
+class AggregateQuery:
+    """An aggregate for `hot_query`, explained like a find cursor."""
+
+    def __init__(self, collection, pipeline: list[dict]):
+        self.collection = collection
+        self.pipeline = pipeline
+
+    def explain(self) -> dict:
+        return self.collection.database.command({
+            "explain": {"aggregate": self.collection.name, "pipeline": self.pipeline, "cursor": {}},
+            "verbosity": "queryPlanner",
+        })
+
+
+def migration(version: int, description: str):
+    """Registers `fn(db)` to be applied once, in version order."""
+    def decorator(fn):
+        if version in _migrations:
+            raise ValueError(f"Migration {version} is already registered by {_migrations[version].apply.__name__}")
+        _migrations[version] = Migration(version, description, fn)
+        return fn
+    return decorator
+
+
+def hot_query(name: str, collection: str, covered: bool = False):
+    """Registers `fn(collection) -> cursor` (or an AggregateQuery) whose plan must stay index-backed
+    (and never FETCH when `covered`)."""
+    def decorator(fn):
+        _hot_queries.append(HotQuery(name, collection, fn, covered))
+        return fn
+    return decorator
+
+
+def drop_index_if_exists(collection, name: str):
+    try:
+        collection.drop_index(name)
+    except OperationFailure:
+        pass
+
+
+def run_migrations(db):
+    applied_collection = db.get_collection(MIGRATIONS_COLLECTION)
+    applied = {doc["_id"] for doc in applied_collection.find({}, {"_id": 1})}
+
+    for version in sorted(_migrations):
+        if version in applied:
+            continue
+
+        migration_ = _migrations[version]
+        migration_.apply(db)
+        try:
+            applied_collection.insert_one({
+                "_id": version,
+                "description": migration_.description,
+                "applied_at": datetime.now(UTC)
+            })
+        except DuplicateKeyError:
+            # Another replica applied it concurrently; index builds are idempotent
+            pass
+
+
+def _plan_stages(plan):
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            yield plan["stage"]
+        for value in plan.values():
+            yield from _plan_stages(value)
+    elif isinstance(plan, list):
+        for item in plan:
+            yield from _plan_stages(item)
+
+
+def _winning_plans(explain: dict) -> list:
+    # A find (or a pipeline pushed down whole) has one planner; other pipelines start with a $cursor stage
+    if "queryPlanner" in explain:
+        return [explain["queryPlanner"]["winningPlan"]]
+    return [stage["$cursor"]["queryPlanner"]["winningPlan"] for stage in explain.get("stages", []) if "$cursor" in stage]
+
+
+def check_hot_queries(db):
+    failures = []
+    for query in _hot_queries:
+        explain = query.build(db.get_collection(query.collection)).explain()
+        bad_stages = BAD_STAGES | {"FETCH"} if query.covered else BAD_STAGES
+        bad = bad_stages.intersection(_plan_stages(_winning_plans(explain)))
+        if bad:
+            failures.append(f"{query.name} ({query.collection}): {', '.join(sorted(bad))}")
+
+    if failures:
+        raise IndexCheckError("Hot queries are not index-backed: " + "; ".join(failures))
@@ -0,0 +1,159 @@
+import hashlib
+import json
+import threading
+from datetime import datetime, timedelta, UTC
+import streamlit as st
+from cachetools import TTLCache
+from pymongo.errors import PyMongoError
+from src.config.async_runtime import log_failure, submit
+from src.config.db import get_async_db, get_db
+from src.repos.migrations import drop_index_if_exists, migration
+from src.utils.simhash import bands, from_int64, hamming_distance, normalise, simhash, to_int64
+
+CACHE_TTL_SECONDS = 24 * 60 * 60
+MEMORY_ENTRIES = 2048
+MAX_NEAR_DISTANCE = 3
+
+
+def history_key(model: str, turns: list[dict], system_instruction: str | None) -> str:
+    payload = [model, normalise(system_instruction or ""), [[t["role"], normalise(t["content"])] for t in turns]]
+    return hashlib.sha256(json.dumps(payload, separators=(",", ":")).encode("utf-8")).hexdigest()
+
+
+def single_turn_prompt(turns: list[dict], system_instruction: str | None) -> str | None:
+    # Near-duplicate matching only makes sense for an opening question with no earlier context
+    user_turns = [t for t in turns if t["role"] == "user"]
+    if system_instruction or len(user_turns) != 1 or turns[-1]["role"] != "user":
+        return None
+    return user_turns[0]["content"]
+
+
+class ResponseCache:
+    """Two-tier cache in front of the model.
+
+    Tier one matches a hash of the whole normalised request, for any user: the same conversation
+    gets the same answer. Tier two matches single-turn prompts whose SimHash is within
+    MAX_NEAR_DISTANCE bits, among one user's own prompts only; a few bits can be a negation, so a
+    near match never crosses users. Both sit in an in-process TTL LRU backed by the `response_cache`
+    collection so replicas share hits. Lookups read `collection`; stores go through `async_collection`
+    on the shared loop, off the turn.
+    """
+
+    def __init__(self, collection, async_collection, ttl: int = CACHE_TTL_SECONDS, maxsize: int = MEMORY_ENTRIES):
+        self.collection = collection
+        self.async_collection = async_collection
+        self.ttl = ttl
+        self._exact = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._near = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._lock = threading.Lock()
+        self._stats = {"exact_hits": 0, "near_hits": 0, "misses": 0, "saved_seconds": 0.0}
+
+    def lookup(self, model: str, turns: list[dict], system_instruction: str | None = None, user_id=None):
+        key = history_key(model, turns, system_instruction)
+        entry = self._lookup_exact(key)
+        tier = "exact_hits"
+
+        if entry is None:
+            prompt = single_turn_prompt(turns, system_instruction)
+            entry = self._lookup_near(model, str(user_id), simhash(prompt)) if prompt and user_id else None
+            tier = "near_hits"
+
+        with self._lock:
+            if entry is None:
+                self._stats["misses"] += 1
+            else:
+                self._stats[tier] += 1
+                self._stats["saved_seconds"] += entry["latency"]
+        return entry
+
+    def store(self, model: str, turns: list[dict], system_instruction: str | None, text: str, latency: float,
+              user_id=None):
+        if not text.strip():
+            return
+        key = history_key(model, turns, system_instruction)
+        now = datetime.now(UTC)
+        entry = {"_id": key, "model": model, "text": text, "latency": latency,
+                 "created_at": now, "expires_at": now + timedelta(seconds=self.ttl)}
+
+        prompt = single_turn_prompt(turns, system_instruction)
+        if prompt and user_id:
+            fingerprint = simhash(prompt)
+            entry["user_id"] = str(user_id)
+            entry["simhash"] = to_int64(fingerprint)
+            entry["bands"] = bands(fingerprint)
+            with self._lock:
+                self._near[(model, str(user_id), fingerprint)] = entry
+
+        with self._lock:
+            self._exact[key] = entry
+
+        saved = submit(self.async_collection.replace_one({"_id": key}, entry, upsert=True))
+        saved.add_done_callback(log_failure(f"response_cache store {key[:12]}"))
+
+    def _lookup_exact(self, key: str):
+        with self._lock:
+            entry = self._exact.get(key)
+        if entry is not None:
+            return entry
+
+        try:
+            entry = self.collection.find_one({"_id": key, "expires_at": {"$gt": datetime.now(UTC)}})
+        except PyMongoError:
+            return None
+
+        if entry is not None:
+            with self._lock:
+                self._exact[key] = entry
+        return entry
+
+    def _lookup_near(self, model: str, user_id: str, fingerprint: int):
+        with self._lock:
+            for (entry_model, entry_user, other), entry in self._near.items():
+                if (entry_model, entry_user) == (model, user_id) and hamming_distance(fingerprint, other) <= MAX_NEAR_DISTANCE:
+                    return entry
+
+        try:
+            candidates = self.collection.find(
+                {"model": model, "user_id": user_id, "bands": {"$in": bands(fingerprint)},
+                 "expires_at": {"$gt": datetime.now(UTC)}},
+                {"text": 1, "latency": 1, "simhash": 1, "model": 1}
+            ).limit(50)
+            for entry in candidates:
+                other = from_int64(entry["simhash"])
+                if hamming_distance(fingerprint, other) <= MAX_NEAR_DISTANCE:
+                    with self._lock:
+                        self._near[(model, user_id, other)] = entry
+                    return entry
+        except PyMongoError:
+            pass
+        return None
+
+    def metrics(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+        lookups = stats["exact_hits"] + stats["near_hits"] + stats["misses"]
+        stats["hit_rate"] = (stats["exact_hits"] + stats["near_hits"]) / lookups if lookups else 0.0
+        return stats
+
+
+@st.cache_resource
+def get_response_cache():
+    return ResponseCache(get_db().get_collection("response_cache"), get_async_db().get_collection("response_cache"))
+
+
+def replay_chunks(text: str, size: int = 64):
+    """Feeds a cached answer through the normal streaming path."""
+    for start in range(0, len(text), size):
+        yield text[start:start + size]
+
+
+@migration(4, "response_cache TTL and SimHash band indexes")
+def _create_response_cache_indexes(db):
+    db.response_cache.create_index("expires_at", expireAfterSeconds=0)
+    db.response_cache.create_index([("model", 1), ("bands", 1)])
+
+
+@migration(13, "response_cache(model, user_id, bands) scopes near matches per user")
+def _scope_near_matches(db):
+    db.response_cache.create_index([("model", 1), ("user_id", 1), ("bands", 1)])
+    drop_index_if_exists(db.response_cache, "model_1_bands_1")
@@ -0,0 +1,54 @@
+import secrets
+import threading
+from datetime import datetime, timedelta, UTC
+from cachetools import TTLCache
+from src.config.db import collection_for
+from src.repos.migrations import migration
+
+SESSION_TTL = timedelta(days=7)
+# Lookups are served from here; a revoked session can live at most this long on other replicas
+SESSION_CACHE_SECONDS = 60
+
+_sessions = TTLCache(maxsize=10_000, ttl=SESSION_CACHE_SECONDS)
+_lock = threading.Lock()
+
+
+class SessionRepository:
+
+    def __init__(self):
+        self.collection = collection_for("sessions", "auth")
+
+    def create_session(self, user: dict) -> str:
+        session_id = secrets.token_urlsafe(32)
+        now = datetime.now(UTC)
+        session = {"_id": session_id, "user": user, "created_at": now, "expires_at": now + SESSION_TTL}
+        self.collection.insert_one(session)
+        with _lock:
+            _sessions[session_id] = session
+        return session_id
+
+    def get_session(self, session_id: str):
+        with _lock:
+            session = _sessions.get(session_id)
+
+        if session is None:
+            session = self.collection.find_one({"_id": session_id, "expires_at": {"$gt": datetime.now(UTC)}})
+            if session is None:
+                return None
+            with _lock:
+                _sessions[session_id] = session
+
+        expires_at = session["expires_at"]
+        if expires_at.tzinfo is None:
+            expires_at = expires_at.replace(tzinfo=UTC)
+        return session if expires_at > datetime.now(UTC) else None
+
+    def revoke_session(self, session_id: str):
+        with _lock:
+            _sessions.pop(session_id, None)
+        self.collection.delete_one({"_id": session_id})
+
+
+@migration(8, "sessions TTL index")
+def _create_session_indexes(db):
+    db.sessions.create_index("expires_at", expireAfterSeconds=0)
@@ -0,0 +1,116 @@
+from pymongo import InsertOne, UpdateOne
+from pymongo.errors import BulkWriteError, ClientBulkWriteException, InvalidOperation
+from src.config.db import ACCESS, causal_session, collection_for
+from src.repos.message_buckets import bucket_append_ops, bucketed_ids
+
+DUPLICATE_KEY = 11000
+PREVIEW_CHARS = 120
+# Message ids kept per chat to count each message once, however often its batch is retried
+COUNTED_IDS = 64
+
+
+def chat_summary_ops(docs: list[dict], namespace: str | None = None) -> list[UpdateOne]:
+    """Updates for the denormalised sidebar fields of each chat in the batch.
+
+    Every message is counted once: its update only matches while its id is not among the chat's last
+    COUNTED_IDS counted ones, and a miss on an existing chat fails the upsert with a duplicate key (already
+    counted). The last-message fields only move forward: their update matches while the chat's
+    `last_message_at` is older than the batch, so a late batch, or one from a replica with a skewed clock,
+    still counts without rolling them back. It runs after the counts, which create a chat whose insert
+    is still in flight.
+    """
+    by_chat = {}
+    for doc in docs:
+        by_chat.setdefault(doc["chat_id"], []).append(doc)
+
+    ops = []
+    for chat_id, chat_docs in by_chat.items():
+        chat_docs.sort(key=lambda doc: (doc["created_at"], doc["_id"]))
+        for doc in chat_docs:
+            ops.append(UpdateOne(
+                {"_id": chat_id, "counted_ids": {"$ne": doc["_id"]}},
+                {
+                    "$inc": {"message_count": 1},
+                    "$push": {"counted_ids": {"$each": [doc["_id"]], "$slice": -COUNTED_IDS}},
+                    "$setOnInsert": {"user_id": doc.get("user_id")},
+                },
+                upsert=True,
+                namespace=namespace
+            ))
+
+        newest = chat_docs[-1]
+        summary = {"last_message_preview": newest["message"]["content"][:PREVIEW_CHARS], "last_message_id": newest["_id"]}
+        models = [doc["model"] for doc in chat_docs if doc.get("model")]
+        if models:
+            summary["last_model"] = models[-1]
+        ops.append(UpdateOne(
+            {"_id": chat_id, "last_message_at": {"$not": {"$gte": newest["created_at"]}}},
+            {"$set": summary, "$max": {"updated_at": newest["created_at"], "last_message_at": newest["created_at"]}},
+            namespace=namespace
+        ))
+    return ops
+
+
+def _only_duplicates(errors: list[dict]) -> bool:
+    return all(error["code"] == DUPLICATE_KEY for error in errors)
+
+
+class TurnWriter:
+    """Write-behind writer for messages and the summary fields of their chats.
+
+    On MongoDB 8.0+ both go out in one client-level bulk write. Older servers reject that, and the
+    writer falls back for the rest of the process to a bulk write per collection.
+    """
+
+    client_bulk_write_supported = True
+
+    def __init__(self, db, buckets: bool = False):
+        self.db = db
+        self.buckets = buckets
+        self.messages = collection_for("message_buckets" if buckets else "messages", "turns", db)
+        self.chats = collection_for("chats", "turns", db)
+
+    def __call__(self, docs: list[dict], retry: bool = False):
+        message_docs = docs
+        if self.buckets and retry:
+            # $push is not idempotent; drop what a partial earlier attempt already wrote
+            present = bucketed_ids(self.messages, docs)
+            message_docs = [doc for doc in docs if doc["_id"] not in present]
+
+        # Each user's next history read waits for this batch, even on a secondary
+        with causal_session(self.db.client, writes=[doc.get("user_id") for doc in docs]) as session:
+            if TurnWriter.client_bulk_write_supported:
+                try:
+                    self._client_write(message_docs, docs, session)
+                    return
+                except InvalidOperation:
+                    TurnWriter.client_bulk_write_supported = False
+
+            self._collection_write(message_docs, docs, session)
+
+    def _message_ops(self, docs: list[dict], namespace: str | None = None) -> list:
+        if self.buckets:
+            return bucket_append_ops(docs, namespace=namespace)
+        return [InsertOne(doc, namespace=namespace) for doc in docs]
+
+    def _client_write(self, message_docs: list[dict], docs: list[dict], session=None):
+        prefix = f"{self.db.name}."
+        ops = self._message_ops(message_docs, prefix + self.messages.name) + chat_summary_ops(docs, prefix + "chats")
+        try:
+            self.db.client.bulk_write(ops, ordered=False, session=session, write_concern=ACCESS["turns"]["write_concern"])
+        except ClientBulkWriteException as e:
+            if not _only_duplicates(e.write_errors or []) or e.write_concern_errors:
+                raise
+
+    def _collection_write(self, message_docs: list[dict], docs: list[dict], session=None):
+        for collection, ops, ordered in (
+            (self.messages, self._message_ops(message_docs), self.buckets),
+            (self.chats, chat_summary_ops(docs), False),
+        ):
+            if not ops:
+                continue
+            try:
+                collection.bulk_write(ops, ordered=ordered, session=session)
+            except BulkWriteError as e:
+                if not _only_duplicates(e.details.get("writeErrors", [])) or e.details.get("writeConcernErrors"):
+                    raise
@@ -1,28 +1,38 @@
 from bson import ObjectId
-from src.config.db import db
+from src.config.db import collection_for
+from src.repos.migrations import hot_query, migration
 
 class UserRepository:
 
     def __init__(self):
-        self.collection = db.get_collection("users")
+        self.collection = collection_for("users", "auth")
 
     def create_user(self, data: dict):
         result = self.collection.insert_one(data)
         return str(result.inserted_id)
 
+    def update_password(self, user_id: str, hashed_password: bytes):
+        self.collection.update_one({"_id": ObjectId(user_id)}, {"$set": {"password": hashed_password}})
+
     def get_user(self, user_id: str):
         user = self.collection.find_one({"_id": ObjectId(user_id)})
         if user:
             user["_id"] = str(user["_id"])
         return user
 
-    async def list_users(self):
+    def list_users(self):
         users = []
         for doc in self.collection.find({}):
             doc["_id"] = str(doc["_id"])
             users.append(doc)
         return users
 
-    def create_indexes(self):
-        self.collection.create_index("email", unique=True)
-        # self.collection.create_index([("book_id", 1)])
+
+@migration(1, "users(email) unique")
+def _create_user_indexes(db):
+    db.users.create_index("email", unique=True)
+
+
+@hot_query("login by email", "users")
+def _login_query(collection):
+    return collection.find({"email": ""}).limit(1)
@@ -0,0 +1,174 @@
+import logging
+import queue
+import threading
+import time
+from bson.errors import InvalidDocument
+from pymongo.errors import (BulkWriteError, ClientBulkWriteException, ConnectionFailure, ExecutionTimeout,
+                            PyMongoError, WriteConcernError)
+from tenacity import Retrying, retry_if_exception, stop_after_attempt, wait_exponential_jitter
+
+DUPLICATE_KEY = 11000
+_STOP = object()
+
+logger = logging.getLogger(__name__)
+
+
+def is_transient(error: Exception) -> bool:
+    """Errors a later attempt at the same batch can get past: lost connections, elections, timeouts and
+    unsatisfied write concerns. Validation errors, oversized documents and the like are permanent."""
+    if not isinstance(error, PyMongoError):
+        return False
+    if isinstance(error, (ConnectionFailure, ExecutionTimeout, WriteConcernError)) or error.has_error_label("RetryableWriteError"):
+        return True
+    if isinstance(error, BulkWriteError):
+        write_errors, concern_errors = error.details.get("writeErrors", []), error.details.get("writeConcernErrors")
+    elif isinstance(error, ClientBulkWriteException):
+        if error.error is not None and is_transient(error.error):
+            return True
+        write_errors, concern_errors = error.write_errors or [], error.write_concern_errors
+    else:
+        return False
+    # Duplicates are writes that already landed; anything else in the batch is permanent
+    return bool(concern_errors) and all(item["code"] == DUPLICATE_KEY for item in write_errors)
+
+
+class WriteBehindQueue:
+    """Coalesces inserts from every session into `insert_many(ordered=False)` batches on one worker.
+
+    Documents must carry their own `_id` so a retried batch is idempotent: duplicate-key errors
+    from a partially applied attempt count as written. `put` blocks once `max_pending` documents
+    are waiting, which bounds memory when Mongo is slow.
+
+    `write(docs, retry)` replaces the insert for other layouts; it must make retries safe itself.
+    """
+
+    def __init__(self, collection, batch_size: int = 500, flush_interval: float = 0.05,
+                 max_pending: int = 10_000, max_attempts: int = 6, on_flushed=None, write=None):
+        self.collection = collection
+        self.write = write or self._insert
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_attempts = max_attempts
+        self.on_flushed = on_flushed
+
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._worker = threading.Thread(target=self._run, name="write-behind", daemon=True)
+        self._lock = threading.Lock()
+        self._metrics = {
+            "batches": 0, "written": 0, "dropped": 0, "retries": 0,
+            "last_flush_seconds": 0.0, "total_flush_seconds": 0.0, "max_enqueue_to_write_seconds": 0.0,
+        }
+
+    def start(self):
+        self._worker.start()
+        return self
+
+    def put(self, docs: list[dict], key=None):
+        enqueued_at = time.perf_counter()
+        for doc in docs:
+            self._queue.put((doc, key, enqueued_at))
+
+    def shutdown(self, timeout: float = 10.0):
+        """Drains everything already queued, then stops the worker."""
+        self._queue.put(_STOP)
+        self._worker.join(timeout)
+
+    def depth(self) -> int:
+        return self._queue.qsize()
+
+    def metrics(self) -> dict:
+        with self._lock:
+            metrics = dict(self._metrics)
+        metrics["depth"] = self.depth()
+        metrics["avg_flush_seconds"] = metrics["total_flush_seconds"] / metrics["batches"] if metrics["batches"] else 0.0
+        return metrics
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            item = self._queue.get()
+            if item is _STOP:
+                break
+
+            batch = [item]
+            deadline = time.perf_counter() + self.flush_interval
+            while len(batch) < self.batch_size:
+                try:
+                    item = self._queue.get(timeout=max(0.0, deadline - time.perf_counter()))
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+
+            self._flush(batch)
+
+        # Anything still queued behind the stop marker is written before exiting
+        leftover = []
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not _STOP:
+                leftover.append(item)
+        for start in range(0, len(leftover), self.batch_size):
+            self._flush(leftover[start:start + self.batch_size])
+
+    def _flush(self, batch):
+        started = time.perf_counter()
+        dropped = self._write([doc for doc, _, _ in batch])
+
+        finished = time.perf_counter()
+        with self._lock:
+            self._metrics["batches"] += 1
+            self._metrics["written"] += len(batch) - dropped
+            self._metrics["last_flush_seconds"] = finished - started
+            self._metrics["total_flush_seconds"] += finished - started
+            self._metrics["max_enqueue_to_write_seconds"] = max(
+                self._metrics["max_enqueue_to_write_seconds"], finished - min(at for _, _, at in batch)
+            )
+
+        if self.on_flushed:
+            for key in {key for _, key, _ in batch if key is not None}:
+                self.on_flushed(key)
+
+    def _write(self, docs: list[dict], retry: bool = False) -> int:
+        """Writes `docs`, retrying transient errors; returns how many documents had to be dropped.
+
+        A permanent error splits the batch in halves, so only the documents that cause it are dropped.
+        """
+        try:
+            for attempt in Retrying(
+                stop=stop_after_attempt(self.max_attempts),
+                wait=wait_exponential_jitter(initial=0.1, max=5),
+                retry=retry_if_exception(is_transient),
+                reraise=True
+            ):
+                with attempt:
+                    if attempt.retry_state.attempt_number > 1:
+                        self._bump("retries", 1)
+                    self.write(docs, retry or attempt.retry_state.attempt_number > 1)
+            return 0
+        except (PyMongoError, InvalidDocument) as e:
+            if len(docs) > 1 and not is_transient(e):
+                # Parts of the failed attempt may have landed, so both halves are written as retries
+                middle = len(docs) // 2
+                return self._write(docs[:middle], retry=True) + self._write(docs[middle:], retry=True)
+            logger.error("Dropped %d queued writes: %s - %s", len(docs), type(e).__name__, e)
+            self._bump("dropped", len(docs))
+            return len(docs)
+
+    def _insert(self, docs, retry: bool = False):
+        try:
+            self.collection.insert_many(docs, ordered=False)
+        except BulkWriteError as e:
+            if any(error["code"] != DUPLICATE_KEY for error in e.details.get("writeErrors", [])):
+                raise
+            if e.details.get("writeConcernErrors"):
+                raise
+
+    def _bump(self, name: str, amount: int):
+        with self._lock:
+            self._metrics[name] += amount
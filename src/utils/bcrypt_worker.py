@@ -0,0 +1,70 @@
+import io
+import os
+from multiprocessing import context, reduction, resource_tracker, spawn, util
+from multiprocessing.popen_spawn_posix import Popen as SpawnPopen
+import bcrypt
+
+# Kept free of Streamlit imports: this module is what spawned pool workers load
+
+
+def hash_password(password: str, rounds: int) -> bytes:
+    return bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt(rounds))
+
+
+def verify_password(plain_password: str, hashed_password: bytes) -> bool:
+    return bcrypt.checkpw(plain_password.encode("utf-8"), hashed_password)
+
+
+def ready() -> bool:
+    return True
+
+
+class _WorkerPopen(SpawnPopen):
+    """Spawn launch without the parent's `__main__`.
+
+    A spawned child normally re-runs the parent's `__main__` before its first task; under Streamlit that
+    is the app script, so every worker would run the whole app. The workers only need this module, which
+    the child imports to unpickle its process object.
+    """
+
+    def _launch(self, process_obj):
+        # Same as SpawnPopen._launch, minus the main module in the preparation data
+        tracker_fd = resource_tracker.getfd()
+        self._fds.append(tracker_fd)
+        prep_data = spawn.get_preparation_data(process_obj._name)
+        prep_data.pop("init_main_from_path", None)
+        prep_data.pop("init_main_from_name", None)
+        fp = io.BytesIO()
+        context.set_spawning_popen(self)
+        try:
+            reduction.dump(prep_data, fp)
+            reduction.dump(process_obj, fp)
+        finally:
+            context.set_spawning_popen(None)
+
+        parent_r = child_w = child_r = parent_w = None
+        try:
+            parent_r, child_w = os.pipe()
+            child_r, parent_w = os.pipe()
+            cmd = spawn.get_command_line(tracker_fd=tracker_fd, pipe_handle=child_r)
+            self._fds.extend([child_r, child_w])
+            self.pid = util.spawnv_passfds(spawn.get_executable(), cmd, self._fds)
+            self.sentinel = parent_r
+            with open(parent_w, "wb", closefd=False) as f:
+                f.write(fp.getbuffer())
+        finally:
+            self.finalizer = util.Finalize(self, util.close_fds, [fd for fd in (parent_r, parent_w) if fd is not None])
+            for fd in (child_r, child_w):
+                if fd is not None:
+                    os.close(fd)
+
+
+class WorkerProcess(context.SpawnProcess):
+    @staticmethod
+    def _Popen(process_obj):
+        return _WorkerPopen(process_obj)
+
+
+class WorkerContext(context.SpawnContext):
+    """Spawn context for the bcrypt pool: fresh interpreters that load only this module."""
+    Process = WorkerProcess
@@ -0,0 +1,53 @@
+from google.genai import types
+from src.utils.context_window import ContextWindow, message_cursor
+
+
+def to_content(message: dict) -> types.Content:
+    role = message["role"] if message["role"] != "assistant" else "model"
+    return types.Content(role=role, parts=[types.Part.from_text(text=message["content"])])
+
+
+class ChatHistory:
+    """Display dicts and their message ids, kept side by side in session state.
+
+    Messages the context window keeps are converted to `types.Content` once, when they are appended;
+    the history is only rebuilt when a different chat is loaded.
+    """
+
+    def __init__(self, window: ContextWindow):
+        self.messages = []
+        self.ids = []
+        self.window = window
+
+    @classmethod
+    def from_docs(cls, docs: list[dict], window: ContextWindow):
+        history = cls(window)
+        for doc in docs:
+            if window.covers(doc):
+                history.messages.append(doc["message"])
+                history.ids.append(str(doc["_id"]))
+            else:
+                history.append(doc["message"], message_cursor(doc), str(doc["_id"]))
+        return history
+
+    def append(self, message: dict, cursor: str | None = None, message_id: str | None = None):
+        self.messages.append(message)
+        self.ids.append(message_id)
+        self.window.add(message["role"], message["content"], cursor, to_content(message))
+
+    def append_doc(self, doc: dict) -> bool:
+        """Appends a message written elsewhere (another tab or replica) unless it is already here."""
+        if str(doc["_id"]) in self.ids:
+            return False
+        self.append(doc["message"], message_cursor(doc), str(doc["_id"]))
+        return True
+
+    def prepend_docs(self, docs: list[dict]):
+        # Older pages are display-only: a loaded chat's window reaches back to its summary, which covers them
+        self.messages[:0] = [doc["message"] for doc in docs]
+        self.ids[:0] = [str(doc["_id"]) for doc in docs]
+
+    def request_contents(self, turns: list[dict] | None = None) -> list[types.Content]:
+        if turns is None:
+            turns = self.window.request_turns()
+        return [turn["built"] or to_content(turn) for turn in turns]
@@ -0,0 +1,106 @@
+from collections import deque
+from src.repos.cursor import decode_cursor, encode_cursor
+
+CHARS_PER_TOKEN = 4
+MESSAGE_OVERHEAD_TOKENS = 4
+
+SUMMARY_PROMPT = """You maintain a running summary of a conversation between a user and an AI assistant.
+Update the summary with the new turns below. Keep facts, names, decisions, open questions and the
+user's preferences; drop pleasantries. Reply with the updated summary only.
+
+Current summary:
+{summary}
+
+New turns:
+{turns}"""
+
+
+def estimate_tokens(text: str) -> int:
+    # Local heuristic (~4 chars per token for English) so budgeting never needs count_tokens
+    return len(text) // CHARS_PER_TOKEN + MESSAGE_OVERHEAD_TOKENS
+
+
+def message_cursor(doc: dict) -> str:
+    return encode_cursor(doc["created_at"], doc["_id"])
+
+
+class ContextWindow:
+    """Keeps a Gemini request under a token budget.
+
+    The last `keep_turns` messages are sent verbatim. Older messages move to `pending` and are folded
+    into `summary` a batch at a time, so the summary is only ever extended, never rebuilt. The model call
+    happens elsewhere: the caller summarizes a copy of `pending` and hands the result to `folded`.
+    """
+
+    def __init__(self, keep_turns: int = 12, token_budget: int = 8000, fold_tokens: int = 1500,
+                 summary: str = "", summary_cursor: str | None = None):
+        self.keep_turns = keep_turns
+        self.token_budget = token_budget
+        self.fold_tokens = fold_tokens
+        self.summary = summary
+        self.summary_cursor = summary_cursor
+        self.pending = []
+        self.recent = deque()
+
+    def covers(self, doc: dict) -> bool:
+        """Whether a persisted message is already folded into the summary."""
+        if not self.summary_cursor:
+            return False
+        return (doc["created_at"], doc["_id"]) <= decode_cursor(self.summary_cursor)
+
+    def add(self, role: str, content: str, cursor: str | None = None, built=None):
+        self.recent.append({
+            "role": role, "content": content, "cursor": cursor, "built": built, "tokens": estimate_tokens(content)
+        })
+        while len(self.recent) > self.keep_turns:
+            self.pending.append(self.recent.popleft())
+
+    def needs_fold(self) -> bool:
+        pending_tokens = sum(turn["tokens"] for turn in self.pending)
+        return pending_tokens >= self.fold_tokens or self.total_tokens() > self.token_budget
+
+    def total_tokens(self) -> int:
+        turns = [*self.pending, *self.recent]
+        return estimate_tokens(self.summary) + sum(turn["tokens"] for turn in turns)
+
+    def fold_cursor(self, turns: list[dict]) -> str | None:
+        """The summary cursor once `turns` are folded in."""
+        cursors = [turn["cursor"] for turn in turns if turn["cursor"]]
+        return cursors[-1] if cursors else self.summary_cursor
+
+    def folded(self, summary: str, turns: list[dict]):
+        """Takes `summary` of `turns`, the oldest pending turns when the fold started; newer ones stay pending."""
+        self.summary_cursor = self.fold_cursor(turns)
+        self.summary = summary
+        del self.pending[:len(turns)]
+
+    def request_turns(self) -> list[dict]:
+        """Newest turns that fit in the budget left after the summary, oldest first."""
+        remaining = self.token_budget - estimate_tokens(self.summary)
+        selected = []
+
+        for turn in reversed([*self.pending, *self.recent]):
+            if selected and turn["tokens"] > remaining:
+                break
+            selected.append(turn)
+            remaining -= turn["tokens"]
+
+        selected.reverse()
+        return selected
+
+    def system_instruction(self) -> str | None:
+        if not self.summary:
+            return None
+        return f"Summary of the earlier conversation:\n{self.summary}"
+
+
+def model_summarizer(generate_content, model: str):
+    """`generate_content(**request)` is the client's method or a scheduler-bound equivalent."""
+    def summarize(summary: str, turns: list[dict]) -> str:
+        transcript = "\n".join(f"{turn['role']}: {turn['content']}" for turn in turns)
+        response = generate_content(
+            model=model,
+            contents=SUMMARY_PROMPT.format(summary=summary or "(empty)", turns=transcript)
+        )
+        return response.text or summary
+    return summarize
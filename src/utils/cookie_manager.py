@@ -19,4 +19,23 @@ class CookieManger:
 
     def delete(self, key: str):
         self.manager[key] = ""
-        self.manager.save()
\ No newline at end of file
+        self.manager.save()
+
+
+class MemoryCookieManager:
+    """Same interface as CookieManger, kept in memory; for AppTest-driven benchmarks, which have no browser."""
+
+    def __init__(self, prefix: str = "", password: str = ""):
+        self.cookies = {}
+
+    def ready(self):
+        return True
+
+    def set(self, key: str, value: any):
+        self.cookies[key] = value
+
+    def get(self, key: str):
+        return self.cookies.get(key, "")
+
+    def delete(self, key: str):
+        self.cookies[key] = ""
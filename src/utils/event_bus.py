@@ -0,0 +1,71 @@
+from collections import deque
+from threading import Lock
+from weakref import WeakSet
+import streamlit as st
+
+
+class Subscription:
+    """Events of one topic, buffered until the session that holds it drains them on its next run.
+
+    Only the newest `maxlen` are kept; `drain` reports when older ones were dropped so the session
+    can reload instead of applying a partial stream.
+    """
+
+    def __init__(self, topic: str, maxlen: int):
+        self.topic = topic
+        self._events = deque(maxlen=maxlen)
+        self._overflowed = False
+        self._lock = Lock()
+
+    def push(self, event: dict):
+        with self._lock:
+            if len(self._events) == self._events.maxlen:
+                self._overflowed = True
+            self._events.append(event)
+
+    def drain(self) -> tuple[list[dict], bool]:
+        with self._lock:
+            events, overflowed = list(self._events), self._overflowed
+            self._events.clear()
+            self._overflowed = False
+        return events, overflowed
+
+
+class EventBus:
+    """In-process publish/subscribe by topic (a user id).
+
+    Subscribers are held weakly: a subscription lives in its session's state and goes away with it.
+    """
+
+    def __init__(self):
+        self._topics = {}
+        self._lock = Lock()
+
+    def subscribe(self, topic, maxlen: int = 256) -> Subscription:
+        subscription = Subscription(str(topic), maxlen)
+        with self._lock:
+            self._topics.setdefault(subscription.topic, WeakSet()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            subscribers = self._topics.get(subscription.topic)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._topics[subscription.topic]
+
+    def publish(self, topic, event: dict) -> int:
+        with self._lock:
+            subscribers = list(self._topics.get(str(topic), ()))
+            if not subscribers:
+                # Every session of this topic has gone away
+                self._topics.pop(str(topic), None)
+        for subscription in subscribers:
+            subscription.push(event)
+        return len(subscribers)
+
+
+@st.cache_resource
+def get_event_bus():
+    return EventBus()
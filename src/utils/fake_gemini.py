@@ -0,0 +1,85 @@
+import asyncio
+import random
+import time
+from types import SimpleNamespace
+from google.genai import errors
+
+DEFAULT_REPLY = "This is a canned reply from the local fake Gemini client. " * 8
+
+
+class FakeModels:
+    def __init__(self, owner):
+        self.owner = owner
+
+    def _maybe_fail(self):
+        owner = self.owner
+        if owner.rng.random() < owner.error_rate:
+            code = owner.rng.choice(owner.error_codes)
+            raise errors.APIError(code, {"error": {"code": code, "message": "injected by FakeGeminiClient",
+                                                   "status": "RESOURCE_EXHAUSTED" if code == 429 else "UNAVAILABLE"}})
+
+    def _chunks(self):
+        owner = self.owner
+        text = owner.reply
+        for start in range(0, len(text), owner.chunk_size):
+            yield text[start:start + owner.chunk_size]
+
+    def _usage(self):
+        return SimpleNamespace(prompt_token_count=0, candidates_token_count=len(self.owner.reply) // 4,
+                               total_token_count=len(self.owner.reply) // 4)
+
+    def generate_content_stream(self, model: str, contents, config=None):
+        owner = self.owner
+        owner.calls += 1
+        time.sleep(owner.first_token_latency)
+        self._maybe_fail()
+
+        chunks = list(self._chunks())
+        for i, text in enumerate(chunks):
+            if i:
+                time.sleep(owner.chunk_delay)
+            usage = self._usage() if i == len(chunks) - 1 else None
+            yield SimpleNamespace(text=text, usage_metadata=usage)
+
+    def generate_content(self, model: str, contents, config=None):
+        owner = self.owner
+        owner.calls += 1
+        time.sleep(owner.first_token_latency)
+        self._maybe_fail()
+        return SimpleNamespace(text=owner.reply, usage_metadata=self._usage())
+
+
+class AsyncFakeModels(FakeModels):
+
+    async def generate_content_stream(self, model: str, contents, config=None):
+        owner = self.owner
+        owner.calls += 1
+
+        async def stream():
+            await asyncio.sleep(owner.first_token_latency)
+            self._maybe_fail()
+            chunks = list(self._chunks())
+            for i, text in enumerate(chunks):
+                if i:
+                    await asyncio.sleep(owner.chunk_delay)
+                usage = self._usage() if i == len(chunks) - 1 else None
+                yield SimpleNamespace(text=text, usage_metadata=usage)
+
+        return stream()
+
+
+class FakeGeminiClient:
+    """Local stand-in for `genai.Client` with configurable latency, chunking and error injection."""
+
+    def __init__(self, reply: str = DEFAULT_REPLY, chunk_size: int = 16, first_token_latency: float = 0.3,
+                 chunk_delay: float = 0.02, error_rate: float = 0.0, error_codes=(429, 503), seed: int | None = None):
+        self.reply = reply
+        self.chunk_size = chunk_size
+        self.first_token_latency = first_token_latency
+        self.chunk_delay = chunk_delay
+        self.error_rate = error_rate
+        self.error_codes = list(error_codes)
+        self.rng = random.Random(seed)
+        self.calls = 0
+        self.models = FakeModels(self)
+        self.aio = SimpleNamespace(models=AsyncFakeModels(self))
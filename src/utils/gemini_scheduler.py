@@ -0,0 +1,190 @@
+import heapq
+import itertools
+import threading
+import time
+from tenacity import Retrying, retry_if_exception, stop_after_attempt, wait_random_exponential
+from src.config.async_runtime import iterate
+from src.utils.instrumentation import model_trace, registry
+
+RETRYABLE_CODES = {429, 503}
+
+
+def is_retryable(error: BaseException) -> bool:
+    # Imported here so that building the scheduler does not load the SDK
+    from google.genai import errors
+    return isinstance(error, errors.APIError) and error.code in RETRYABLE_CODES
+
+
+class TokenBucket:
+    def __init__(self, per_minute: float, capacity: float | None = None):
+        self.rate = per_minute / 60
+        self.capacity = capacity or per_minute
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def delay(self, amount: float) -> float:
+        """Seconds until `amount` can be taken (0 when it can be taken now)."""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        amount = min(amount, self.capacity)
+        return 0.0 if self.tokens >= amount else (amount - self.tokens) / self.rate
+
+    def take(self, amount: float):
+        self.tokens -= min(amount, self.capacity)
+
+
+class Ticket:
+    def __init__(self, user_id: str, tokens: int, round_: int, seq: int):
+        self.user_id = user_id
+        self.tokens = tokens
+        self.key = (round_, seq)
+        self.enqueued_at = time.monotonic()
+
+    def __lt__(self, other):
+        return self.key < other.key
+
+
+class GeminiScheduler:
+    """Admission control for every model call in the process.
+
+    Calls wait in a fair queue: each user's n-th waiting request is ordered by n, so one user
+    with a burst of requests cannot starve others. A ticket is admitted once it is at the head
+    of the queue, a concurrency slot is free, and both the requests-per-minute and
+    tokens-per-minute buckets can cover it. 429/503 responses are retried with jittered backoff;
+    each retry keeps its slot but is charged to both buckets again, since the provider counts it.
+    """
+
+    def __init__(self, client, max_concurrency: int = 8, requests_per_minute: int = 60,
+                 tokens_per_minute: int = 1_000_000, max_attempts: int = 4, poll_interval: float = 0.25):
+        self.client = client
+        self.max_concurrency = max_concurrency
+        self.max_attempts = max_attempts
+        self.poll_interval = poll_interval
+
+        self._cond = threading.Condition()
+        self._queue = []
+        self._seq = itertools.count()
+        self._user_rounds = {}
+        self._served_round = 0
+        self._active = 0
+        self._requests = TokenBucket(requests_per_minute)
+        self._tokens = TokenBucket(tokens_per_minute)
+
+    def acquire(self, user_id: str, tokens: int = 0, on_wait=None) -> Ticket:
+        """Blocks until admitted; `on_wait(position, waited_seconds)` is called while queued."""
+        with self._cond:
+            round_ = max(self._user_rounds.get(user_id, self._served_round), self._served_round)
+            self._user_rounds[user_id] = round_ + 1
+            ticket = Ticket(user_id, tokens, round_, next(self._seq))
+            heapq.heappush(self._queue, ticket)
+
+        try:
+            while True:
+                with self._cond:
+                    delay = self._admit(ticket)
+                    if delay == 0:
+                        registry.observe("model_queue_wait_seconds", time.monotonic() - ticket.enqueued_at)
+                        return ticket
+                    position = sum(1 for other in self._queue if other.key < ticket.key) + 1
+                    self._cond.wait(min(delay, self.poll_interval))
+
+                if on_wait:
+                    on_wait(position, time.monotonic() - ticket.enqueued_at)
+        except BaseException:
+            with self._cond:
+                if ticket in self._queue:
+                    self._queue.remove(ticket)
+                    heapq.heapify(self._queue)
+                    self._cond.notify_all()
+            raise
+
+    def release(self, ticket: Ticket):
+        with self._cond:
+            self._active -= 1
+            self._cond.notify_all()
+
+    def _admit(self, ticket: Ticket) -> float:
+        if self._queue[0] is not ticket or self._active >= self.max_concurrency:
+            return self.poll_interval
+
+        delay = max(self._requests.delay(1), self._tokens.delay(ticket.tokens))
+        if delay:
+            return delay
+
+        heapq.heappop(self._queue)
+        self._requests.take(1)
+        self._tokens.take(ticket.tokens)
+        self._active += 1
+        self._served_round = ticket.key[0]
+        # A user whose next round is not ahead of the served one queues as if new, so the entry can go
+        self._user_rounds = {user: round_ for user, round_ in self._user_rounds.items() if round_ > self._served_round}
+        self._cond.notify_all()
+        return 0
+
+    def _charge_retry(self, ticket: Ticket):
+        """Blocks until the buckets cover another attempt for an admitted ticket, then takes it."""
+        with self._cond:
+            while delay := max(self._requests.delay(1), self._tokens.delay(ticket.tokens)):
+                self._cond.wait(delay)
+            self._requests.take(1)
+            self._tokens.take(ticket.tokens)
+        registry.inc("model_retries_total")
+
+    def _attempts(self, ticket: Ticket):
+        for attempt in self._retrying():
+            if attempt.retry_state.attempt_number > 1:
+                self._charge_retry(ticket)
+            yield attempt
+
+    def _retrying(self):
+        return Retrying(
+            retry=retry_if_exception(is_retryable),
+            wait=wait_random_exponential(multiplier=0.5, max=8),
+            stop=stop_after_attempt(self.max_attempts),
+            reraise=True
+        )
+
+    def generate_content_stream_aio(self, user_id: str, tokens: int = 0, on_wait=None, **request):
+        """A streamed reply, admitted like `generate_content`; the HTTP stream is driven by `client.aio` on
+        the shared event loop instead of holding a sync connection on the caller's thread."""
+        return self._stream(user_id, tokens, on_wait, lambda: iterate(self._aio_stream(request)), request.get("model"))
+
+    def _stream(self, user_id: str, tokens: int, on_wait, open_stream, model: str):
+        ticket = self.acquire(user_id, tokens, on_wait)
+        try:
+            with model_trace(model, "stream") as trace:
+                # Provider errors surface on the first chunk, so only that part is retried
+                for attempt in self._attempts(ticket):
+                    with attempt:
+                        stream = open_stream()
+                        first = next(stream, None)
+
+                if first is not None:
+                    trace.chunk(first)
+                    yield first
+                for chunk in stream:
+                    trace.chunk(chunk)
+                    yield chunk
+        finally:
+            self.release(ticket)
+
+    async def _aio_stream(self, request: dict):
+        async for chunk in await self.client.aio.models.generate_content_stream(**request):
+            yield chunk
+
+    def generate_content(self, user_id: str, tokens: int = 0, on_wait=None, **request):
+        ticket = self.acquire(user_id, tokens, on_wait)
+        try:
+            with model_trace(request.get("model"), "generate") as trace:
+                for attempt in self._attempts(ticket):
+                    with attempt:
+                        response = self.client.models.generate_content(**request)
+                trace.chunk(response)
+                return response
+        finally:
+            self.release(ticket)
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {"queued": len(self._queue), "active": self._active, "max_concurrency": self.max_concurrency}
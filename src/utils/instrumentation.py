@@ -0,0 +1,279 @@
+import json
+import logging
+import threading
+import time
+from bisect import bisect_left
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime, UTC
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import streamlit as st
+from pymongo import monitoring
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+from src.config import SLOW_QUERY_MS
+from src.config.warmup import warmup
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+RATE_BUCKETS = (1, 5, 10, 25, 50, 100, 200, 400, 800, 1600, 3200)
+METRIC_BUCKETS = {"model_tokens_per_second": RATE_BUCKETS}
+
+logger = logging.getLogger(__name__)
+
+
+class Histogram:
+    def __init__(self, buckets: tuple):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> float | None:
+        """Estimated from the buckets, interpolating linearly inside the bucket that holds the rank."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            if count and seen + count >= rank:
+                lower = self.buckets[i - 1] if i else 0.0
+                upper = self.buckets[i] if i < len(self.buckets) else self.buckets[-1]
+                return lower + (upper - lower) * (rank - seen) / count
+            seen += count
+        return self.buckets[-1]
+
+
+def _labels_text(labels: tuple, extra: str = "") -> str:
+    parts = [f'{key}="{value}"' for key, value in labels]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _le(bound) -> str:
+    return f'le="{bound}"'
+
+
+class MetricsRegistry:
+    """In-process histograms and counters keyed by name and labels.
+
+    Recording is a dict lookup and a few additions under one lock, so it can sit on every Mongo
+    command and model chunk without measurable cost.
+    """
+
+    def __init__(self, slow_log_size: int = 200):
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._counters = {}
+        self.slow_queries = deque(maxlen=slow_log_size)
+
+    def observe(self, name: str, value: float, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(METRIC_BUCKETS.get(name, LATENCY_BUCKETS))
+            histogram.observe(value)
+
+    def inc(self, name: str, amount: float = 1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def record_slow_query(self, entry: dict):
+        self.slow_queries.append(entry)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            histograms = [
+                {"name": name, "labels": dict(labels), "count": h.count, "sum": h.sum,
+                 "p50": h.quantile(0.5), "p95": h.quantile(0.95), "p99": h.quantile(0.99)}
+                for (name, labels), h in self._histograms.items()
+            ]
+            counters = [{"name": name, "labels": dict(labels), "value": value}
+                        for (name, labels), value in self._counters.items()]
+        return {"histograms": histograms, "counters": counters, "slow_queries": list(self.slow_queries)}
+
+    def to_json(self) -> str:
+        return json.dumps(self.snapshot(), default=str)
+
+    def prometheus_text(self) -> str:
+        lines = []
+        with self._lock:
+            typed = set()
+            for (name, labels), h in sorted(self._histograms.items()):
+                if name not in typed:
+                    lines.append(f"# TYPE {name} histogram")
+                    typed.add(name)
+                cumulative = 0
+                for bound, count in zip(h.buckets, h.counts):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{_labels_text(labels, _le(bound))} {cumulative}")
+                lines.append(f"{name}_bucket{_labels_text(labels, _le('+Inf'))} {h.count}")
+                lines.append(f"{name}_sum{_labels_text(labels)} {h.sum}")
+                lines.append(f"{name}_count{_labels_text(labels)} {h.count}")
+            for (name, labels), value in sorted(self._counters.items()):
+                if name not in typed:
+                    lines.append(f"# TYPE {name} counter")
+                    typed.add(name)
+                lines.append(f"{name}{_labels_text(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+
+@st.cache_resource
+def get_metrics_registry():
+    return MetricsRegistry()
+
+
+registry = get_metrics_registry()
+
+
+def _collection_of(command_name: str, command) -> str:
+    target = command.get("collection") if command_name == "getMore" else command.get(command_name)
+    return target if isinstance(target, str) else ""
+
+
+class MongoCommandListener(monitoring.CommandListener):
+    """Per-command, per-collection latency histograms, plus a slow-query log above `slow_ms`."""
+
+    def __init__(self, registry: MetricsRegistry, slow_ms: float = 0):
+        self.registry = registry
+        self.slow_ms = slow_ms
+        self._pending = {}
+
+    def started(self, event):
+        command = event.command
+        # Only the filter is kept (by reference) for the slow log; documents being written are never copied
+        self._pending[(event.connection_id, event.request_id)] = (
+            _collection_of(event.command_name, command),
+            command.get("filter") or command.get("pipeline") if self.slow_ms else None
+        )
+
+    def _finish(self, event, status: str):
+        collection, query = self._pending.pop((event.connection_id, event.request_id), ("", None))
+        seconds = event.duration_micros / 1_000_000
+        self.registry.observe("mongo_command_seconds", seconds, command=event.command_name, collection=collection)
+        if status != "ok":
+            self.registry.inc("mongo_command_errors_total", command=event.command_name, collection=collection)
+
+        if self.slow_ms and seconds * 1000 >= self.slow_ms:
+            entry = {"at": datetime.now(UTC), "command": event.command_name, "collection": collection,
+                     "ms": round(seconds * 1000, 1), "status": status, "query": str(query)[:500]}
+            self.registry.record_slow_query(entry)
+            logger.warning("Slow query: %s %s %sms %s", entry["command"], entry["collection"], entry["ms"], entry["query"])
+
+    def succeeded(self, event):
+        self._finish(event, "ok")
+
+    def failed(self, event):
+        self._finish(event, "error")
+
+
+@st.cache_resource
+def get_mongo_listener():
+    return MongoCommandListener(registry, SLOW_QUERY_MS)
+
+
+class ModelTrace:
+    def __init__(self, model: str, kind: str):
+        self.model = model
+        self.kind = kind
+        self.started = time.perf_counter()
+        self.first_token_at = None
+        self.output_tokens = 0
+
+    def chunk(self, chunk):
+        if self.first_token_at is None:
+            self.first_token_at = time.perf_counter()
+        usage = getattr(chunk, "usage_metadata", None)
+        if usage:
+            self.output_tokens = usage.candidates_token_count or 0
+
+    def record(self, status: str):
+        now = time.perf_counter()
+        labels = {"model": self.model, "kind": self.kind, "status": status}
+        registry.observe("model_total_seconds", now - self.started, **labels)
+        if self.first_token_at is not None:
+            registry.observe("model_ttft_seconds", self.first_token_at - self.started, **labels)
+            # Streams are rated over the generation phase; single responses arrive whole, so over the full call
+            generating_since = self.first_token_at if self.kind == "stream" else self.started
+            if self.output_tokens and now > generating_since:
+                registry.observe("model_tokens_per_second", self.output_tokens / (now - generating_since), **labels)
+
+
+@contextmanager
+def model_trace(model: str, kind: str = "stream"):
+    """Times a model call; feed each streamed chunk (or the single response) to `trace.chunk`."""
+    trace = ModelTrace(model, kind)
+    status = "ok"
+    try:
+        yield trace
+    except GeneratorExit:
+        status = "cancelled"
+        raise
+    except Exception:
+        status = "error"
+        raise
+    finally:
+        trace.record(status)
+
+
+@contextmanager
+def span(name: str, **labels):
+    """Records the block's wall time in the `<name>_seconds` histogram.
+
+    st.rerun/st.stop raise BaseException subclasses; those still count as a completed span.
+    """
+    started = time.perf_counter()
+    status = "ok"
+    try:
+        yield
+    except Exception:
+        status = "error"
+        raise
+    finally:
+        registry.observe(f"{name}_seconds", time.perf_counter() - started, status=status, **labels)
+
+
+def fragment_span(name: str):
+    """`span("fragment")` for an `st.fragment` body, labelled with whether the fragment reran alone
+    (scope="fragment") or as part of a full app rerun (scope="app")."""
+    ctx = get_script_run_ctx()
+    scope = "fragment" if ctx and ctx.fragment_ids_this_run else "app"
+    return span("fragment", fragment=name, scope=scope)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        status = 200
+        if self.path == "/metrics":
+            body, content_type = registry.prometheus_text(), "text/plain; version=0.0.4"
+        elif self.path == "/metrics.json":
+            body, content_type = registry.to_json(), "application/json"
+        elif self.path == "/ready":
+            # Readiness probe: 503 until the warm-up has finished without errors
+            body, content_type = json.dumps(warmup.status()), "application/json"
+            status = 200 if warmup.healthy() else 503
+        else:
+            self.send_error(404)
+            return
+        payload = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@st.cache_resource
+def start_metrics_server(port: int, host: str = "127.0.0.1"):
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    return server
@@ -0,0 +1,70 @@
+import math
+import re
+from collections import Counter, defaultdict
+
+SNIPPET_RADIUS = 60
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+_token = re.compile(r"\w+")
+
+
+def tokenize(text: str) -> list[str]:
+    return _token.findall(text.lower())
+
+
+def make_snippet(text: str, terms: list[str], radius: int = SNIPPET_RADIUS) -> str:
+    lowered = text.lower()
+    positions = [lowered.find(term) for term in terms if term in lowered]
+    if not positions:
+        return text[:radius * 2].strip() + ("…" if len(text) > radius * 2 else "")
+
+    centre = min(positions)
+    start, end = max(0, centre - radius), min(len(text), centre + radius)
+    return ("…" if start else "") + text[start:end].strip() + ("…" if end < len(text) else "")
+
+
+class InvertedIndex:
+    """Small BM25 index for environments without Mongo text-index support.
+
+    Documents belong to a group (a chat); search ranks groups by the summed score of their matching
+    documents and returns the best-scoring document's text for the snippet.
+    """
+
+    def __init__(self):
+        self.postings = defaultdict(dict)
+        self.docs = {}
+        self.total_length = 0
+
+    def add(self, key, group, text: str, weight: float = 1.0):
+        terms = Counter(tokenize(text))
+        length = sum(terms.values())
+        self.docs[key] = (group, text, weight, length)
+        self.total_length += length
+        for term, count in terms.items():
+            self.postings[term][key] = count
+
+    def search(self, query: str) -> list[dict]:
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms or not self.docs:
+            return []
+
+        avg_length = self.total_length / len(self.docs) or 1
+        scores = defaultdict(float)
+        for term in terms:
+            postings = self.postings.get(term, {})
+            idf = math.log(1 + (len(self.docs) - len(postings) + 0.5) / (len(postings) + 0.5))
+            for key, tf in postings.items():
+                length = self.docs[key][3]
+                scores[key] += idf * tf * (BM25_K1 + 1) / (tf + BM25_K1 * (1 - BM25_B + BM25_B * length / avg_length))
+
+        groups = {}
+        for key, score in scores.items():
+            group, text, weight, _ = self.docs[key]
+            hit = groups.setdefault(group, {"group": group, "score": 0.0, "text": text, "best": 0.0})
+            hit["score"] += score * weight
+            # Snippets come from the most relevant text, regardless of boosts like the title weight
+            if score > hit["best"]:
+                hit["text"], hit["best"] = text, score
+
+        return sorted(groups.values(), key=lambda hit: hit["score"], reverse=True)
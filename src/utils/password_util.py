@@ -1,11 +1,114 @@
-import bcrypt
+import math
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import streamlit as st
+from cachetools import TTLCache
+from src.utils import bcrypt_worker
+from src.utils.instrumentation import span
+
+MIN_ROUNDS = 10
+MAX_ROUNDS = 15
+TARGET_HASH_SECONDS = 0.25
+
+
+class PasswordServiceBusy(RuntimeError):
+    pass
+
+
+def hash_rounds(hashed_password: bytes) -> int:
+    # bcrypt hashes carry their cost: $2b$<rounds>$<salt+hash>
+    return int(hashed_password.split(b"$")[2])
+
+
+def calibrate_rounds(target_seconds: float = TARGET_HASH_SECONDS) -> int:
+    """Highest cost whose hash takes about `target_seconds` on this host (each round doubles the work)."""
+    started = time.perf_counter()
+    bcrypt_worker.hash_password("calibration", MIN_ROUNDS)
+    elapsed = time.perf_counter() - started
+    rounds = MIN_ROUNDS + math.floor(math.log2(target_seconds / elapsed)) if elapsed > 0 else MAX_ROUNDS
+    return max(MIN_ROUNDS, min(MAX_ROUNDS, rounds))
+
+
+class AttemptLimiter:
+    """Sliding-window limit on login attempts per email.
+
+    Keys come from whoever is logging in, so they are kept in a bounded TTL cache: an entry goes away
+    a window after its newest attempt, and the oldest go first if `max_keys` is reached.
+    """
+
+    def __init__(self, max_attempts: int = 5, window_seconds: float = 300, max_keys: int = 100_000):
+        self.max_attempts = max_attempts
+        self.window_seconds = window_seconds
+        self._attempts = TTLCache(maxsize=max_keys, ttl=window_seconds)
+        self._lock = threading.Lock()
+
+    def allow(self, key: str) -> bool:
+        now = time.monotonic()
+        with self._lock:
+            attempts = self._attempts.setdefault(key, deque())
+            while attempts and now - attempts[0] > self.window_seconds:
+                attempts.popleft()
+            if len(attempts) >= self.max_attempts:
+                return False
+            attempts.append(now)
+            # Re-set so the entry lives a full window past its newest attempt
+            self._attempts[key] = attempts
+            return True
+
+    def reset(self, key: str):
+        with self._lock:
+            self._attempts.pop(key, None)
+
+
+class PasswordService:
+    """Runs bcrypt in a bounded process pool so hashing never occupies the Streamlit script threads
+    or competes for the GIL. At most `max_pending` hashes may be queued; beyond that callers get
+    PasswordServiceBusy instead of piling up behind a login storm."""
+
+    def __init__(self, rounds: int, workers: int, max_pending: int | None = None):
+        self.rounds = rounds
+        self.pool = ProcessPoolExecutor(max_workers=workers, mp_context=bcrypt_worker.WorkerContext())
+        # One task per worker, submitted back to back, starts every worker now instead of on first use
+        for future in [self.pool.submit(bcrypt_worker.ready) for _ in range(workers)]:
+            future.result()
+        self._slots = threading.BoundedSemaphore(max_pending or workers * 4)
+
+    def _run(self, fn, *args):
+        if not self._slots.acquire(timeout=5):
+            raise PasswordServiceBusy("Too many password checks in flight")
+        try:
+            with span("bcrypt", op=fn.__name__):
+                return self.pool.submit(fn, *args).result()
+        finally:
+            self._slots.release()
+
+    def hash_password(self, password: str) -> bytes:
+        return self._run(bcrypt_worker.hash_password, password, self.rounds)
+
+    def verify_password(self, plain_password: str, hashed_password: bytes) -> bool:
+        return self._run(bcrypt_worker.verify_password, plain_password, hashed_password)
+
+    def needs_rehash(self, hashed_password: bytes) -> bool:
+        return hash_rounds(hashed_password) < self.rounds
+
+
+@st.cache_resource
+def get_password_service():
+    rounds = st.secrets.get("BCRYPT_ROUNDS") or calibrate_rounds(float(st.secrets.get("BCRYPT_TARGET_SECONDS", TARGET_HASH_SECONDS)))
+    return PasswordService(int(rounds), workers=int(st.secrets.get("BCRYPT_WORKERS", os.cpu_count() or 2)))
+
+
+@st.cache_resource
+def get_login_limiter():
+    return AttemptLimiter()
+
 
 def hash_password(password: str) -> bytes:
-    # Encode the password to bytes and generate a salted hash
-    salt = bcrypt.gensalt()  # Default rounds=12
-    hashed = bcrypt.hashpw(password.encode("utf-8"), salt)
-    return hashed
+    return get_password_service().hash_password(password)
 
 
 def verify_password(plain_password: str, hashed_password: bytes) -> bool:
-    return bcrypt.checkpw(plain_password.encode("utf-8"), hashed_password)
+    return get_password_service().verify_password(plain_password, hashed_password)
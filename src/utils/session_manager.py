@@ -0,0 +1,92 @@
+import hashlib
+import hmac
+import streamlit as st
+from src.config import COOKIE_BACKEND, COOKIE_PREFIX, SECRET_KEY
+from src.repos.session_repo import SessionRepository
+from src.utils.cookie_manager import CookieManger, MemoryCookieManager
+
+SESSION_COOKIE = "session"
+
+
+def sign(session_id: str) -> str:
+    signature = hmac.new(SECRET_KEY.encode("utf-8"), session_id.encode("utf-8"), hashlib.sha256).hexdigest()
+    return f"{session_id}.{signature}"
+
+
+def unsign(value: str) -> str | None:
+    session_id, _, signature = value.rpartition(".")
+    if session_id and hmac.compare_digest(sign(session_id), value):
+        return session_id
+    return None
+
+
+class SessionManager:
+    """Keeps an opaque, signed session id in the cookie and the session itself in Mongo.
+
+    The cookie component is rendered on every run, since its value only arrives on a later rerun;
+    only the resolved session id is kept in `state` (the browser session's `st.session_state`),
+    so the cookie is read once per browser session, not on every page switch.
+    """
+
+    def __init__(self, state):
+        self.state = state
+        if COOKIE_BACKEND == "memory":
+            # No browser to hold the cookie; it lives with the rest of the browser session's state
+            self.cookies = state.setdefault("memory_cookies", MemoryCookieManager(COOKIE_PREFIX, SECRET_KEY))
+        else:
+            self.cookies = CookieManger(COOKIE_PREFIX, SECRET_KEY)
+        self.repo = SessionRepository()
+
+    @property
+    def session_id(self) -> str | None:
+        return self.state.get("session_id")
+
+    @session_id.setter
+    def session_id(self, value: str | None):
+        self.state["session_id"] = value
+
+    def ready(self) -> bool:
+        if "pending_cookie" in self.state and self.cookies.ready():
+            self._save_cookie(self.state.pop("pending_cookie"))
+        if "session_id" in self.state:
+            return True
+        if not self.cookies.ready():
+            return False
+
+        self.session_id = unsign(self.cookies.get(SESSION_COOKIE))
+        return True
+
+    def current_user(self):
+        if not self.session_id:
+            return None
+        # Looked up on every call (through the repository's cache), so a revoked session ends here too
+        session = self.repo.get_session(self.session_id)
+        if session is None:
+            self.session_id = None
+            return None
+        return session["user"]
+
+    def login(self, user: dict):
+        self.session_id = self.repo.create_session(user)
+        self._save_cookie(sign(self.session_id))
+
+    def logout(self):
+        if self.session_id:
+            self.repo.revoke_session(self.session_id)
+        self.session_id = None
+        self._save_cookie("")
+
+    def _save_cookie(self, value: str):
+        # `ready` stops waiting for the component once the session is resolved, so on a freshly switched
+        # page it may not have reported back yet; the write then waits in `state` for a run where it has
+        if not self.cookies.ready():
+            self.state["pending_cookie"] = value
+            return
+        if value:
+            self.cookies.set(SESSION_COOKIE, value)
+        else:
+            self.cookies.delete(SESSION_COOKIE)
+
+
+def get_session_manager() -> SessionManager:
+    return SessionManager(st.session_state)
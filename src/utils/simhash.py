@@ -0,0 +1,46 @@
+import hashlib
+import re
+
+HASH_BITS = 64
+BANDS = 4
+BAND_BITS = HASH_BITS // BANDS
+
+_word = re.compile(r"\w+")
+
+
+def normalise(text: str) -> str:
+    return " ".join(text.lower().split())
+
+
+def _features(text: str) -> list[str]:
+    words = _word.findall(normalise(text))
+    return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+
+def simhash(text: str) -> int:
+    weights = [0] * HASH_BITS
+    for feature in _features(text):
+        value = int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "big")
+        for bit in range(HASH_BITS):
+            weights[bit] += 1 if value >> bit & 1 else -1
+
+    return sum(1 << bit for bit, weight in enumerate(weights) if weight > 0)
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+
+def bands(value: int) -> list[str]:
+    # Two fingerprints within BANDS - 1 bits of each other always share at least one band
+    mask = (1 << BAND_BITS) - 1
+    return [f"{band}:{value >> band * BAND_BITS & mask}" for band in range(BANDS)]
+
+
+def to_int64(value: int) -> int:
+    # Mongo stores signed 64-bit integers
+    return value - (1 << HASH_BITS) if value >= 1 << HASH_BITS - 1 else value
+
+
+def from_int64(value: int) -> int:
+    return value + (1 << HASH_BITS) if value < 0 else value